@@ -1,32 +1,585 @@
+import asyncio
+import json
 import os
-from typing import Dict, Any
-from fastapi import APIRouter, HTTPException, Query, Path, UploadFile, File, Response
-from fastapi.responses import FileResponse
+import time
+import zipfile
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Literal, Optional, Tuple, Union
+from fastapi import (
+    APIRouter, HTTPException, Query, Path, UploadFile, File, Response, Header, Request,
+    WebSocket, WebSocketDisconnect, Depends
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
 
-from app.models.composition import CompositionRequest, CompositionResponse, CompositionList
+from app.models.composition import (
+    CompositionData, CompositionRequest, CompositionResponse, CompositionList,
+    CompositionSelection, BulkDeleteResponse, LiveSessionStart, LiveNoteBatch, RenderWindow,
+    NoteWindowResponse, TransformRequest, MergeRequest, CompositionAnalysis, PianoRollSelection,
+    SimilarCompositions
+)
+from app.utils.analysis import load_analysis
 from app.utils.midi_generator import MidiGenerator
+from app.utils.live_session import LiveSession
+from app.utils.note_arrays import (
+    PackedComposition, StartIndex, beats_per_bar, clip_to_window, pack_composition, window_beats
+)
+from app.utils.note_validation import NoteValidationError, NoteValidator
+from app.utils.note_store import StoredNotes, load_notes
+from app.utils.transforms import apply_transforms
+from app.utils.groove import apply_render_options
+from app.utils.merge import MergeError, merge_midi
+from app.utils.synth import duration_seconds, iter_wav, preview_notes
+from app.utils.similarity import feature_index
+from app.utils.piano_roll import (
+    decoded_roll_notes, frame_count, npy_bytes, npz_bytes, piano_roll, stored_roll_notes
+)
+from app.utils import smf
+from app.utils.http_cache import RangeNotSatisfiable, etag_matches, parse_range, quote_etag
+from app.utils.zip_stream import ZipStream
+from app.utils.dataset_export import ExportStats, advance_cursor, batches, build_shard, map_shards
+from app.utils.compression import compress_body
+from app.utils.streaming_ingest import IngestError, parse_composition_stream
 from app.core.storage import CompositionStorage
+from app.core.cache import audio_cache, midi_cache, notes_cache, roll_cache
+from app.core.admission import admission, check_limits, estimate_cost, OverCapacity, RequestTooLarge
 from app.core.config import settings
+from app.core.metrics import time_stage, timed
 
 router = APIRouter()
 storage = CompositionStorage()
 
 
-@router.post("/generate", response_model=CompositionResponse, status_code=201)
-async def generate_composition(request: CompositionRequest) -> Dict[str, Any]:
+def _note_validator(composition: CompositionData) -> NoteValidator:
+    return NoteValidator(
+        composition.length_bars * beats_per_bar(composition.time_signature),
+        check_overlaps=settings.VALIDATE_NOTE_OVERLAPS,
+        max_errors=settings.VALIDATION_MAX_ERRORS,
+        loc=("body", "composition")
+    )
+
+
+async def _body_received(request: Request) -> Optional[float]:
+    """When the request body was received in full, as recorded by BodyTimingMiddleware"""
+    return getattr(request.state, "body_received", None)
+
+
+def _render_input(request: CompositionRequest, body_received: Optional[float] = None) -> PackedComposition:
     """
-    Generate a MIDI file from composition data
+    The composition to render, with the request's quantize, humanize and window options applied
+
+    Notes are checked track by track while packing; failures are answered with a 422 summary.
+    The parse stage is timed from body_received, so it includes FastAPI's JSON parsing and
+    validation of the request.
     """
+    with time_stage("parse", since=body_received):
+        validator = _note_validator(request.composition)
+        # Packing also expands chords and scale degrees, so admission sees the real note count
+        packed = pack_composition(request.composition, validator)
+        try:
+            validator.raise_if_invalid()
+        except NoteValidationError as e:
+            raise HTTPException(status_code=422, detail=e.summary)
+        if request.window is None and request.quantize is None and request.humanize is None:
+            return packed
+        return apply_render_options(packed, request.window, request.quantize, request.humanize)
+
+
+def _shape(composition: Union[CompositionData, PackedComposition]) -> Tuple[int, int, int]:
+    """Note, track and section counts of a composition"""
+    if isinstance(composition, PackedComposition):
+        return composition.note_count, composition.track_count, len(composition.sections)
+    sections = composition.sections
+    tracks = sum(len(section.tracks) for section in sections)
+    notes = sum(len(track.notes) for section in sections for track in section.tracks)
+    return notes, tracks, len(sections)
+
+
+async def _admit(notes: int, tracks: int, sections: int) -> int:
+    """Run admission control and return the reserved cost"""
+    # Estimate the cost before rendering so heavy requests can't starve everyone else
+    try:
+        check_limits(notes, tracks, sections)
+    except RequestTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    cost = estimate_cost(notes, tracks, sections)
+    try:
+        await admission.acquire(cost)
+    except OverCapacity as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return cost
+
+
+async def _admit_and_generate(composition: Union[CompositionData, PackedComposition]) -> Dict[str, Any]:
+    """Run admission control, render the composition and store its metadata"""
+    cost = await _admit(*_shape(composition))
     try:
         # Generate the MIDI file
-        composition_data = MidiGenerator.generate_midi_file(request.composition)
+        composition_data = await run_in_threadpool(MidiGenerator.generate_midi_file, composition)
         
         # Store the composition metadata
-        composition = storage.add_composition(composition_data)
-        
-        return composition
+        return await run_in_threadpool(storage.add_composition, composition_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating MIDI file: {str(e)}")
+    finally:
+        admission.release(cost)
+
+
+@router.post("/generate", response_model=CompositionResponse, status_code=201)
+async def generate_composition(
+    request: CompositionRequest,
+    body_received: Optional[float] = Depends(_body_received)
+) -> Dict[str, Any]:
+    """
+    Generate a MIDI file from composition data
+    
+    With a `window`, only the notes sounding in it are rendered, clipped to its edges.
+    """
+    return await _admit_and_generate(_render_input(request, body_received))
+
+
+@router.post(
+    "/generate/stream",
+    response_model=CompositionResponse,
+    status_code=201,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"$ref": "#/components/schemas/CompositionRequest"}}}
+        }
+    }
+)
+async def generate_composition_stream(request: Request) -> Dict[str, Any]:
+    """
+    Generate a MIDI file from a large composition, parsing the body incrementally
+    
+    Large /generate requests are routed here automatically.
+    """
+    try:
+        with time_stage("parse"):
+            composition = await parse_composition_stream(
+                request.stream(),
+                max_notes=settings.ADMISSION_MAX_NOTES,
+                check_overlaps=settings.VALIDATE_NOTE_OVERLAPS,
+                max_errors=settings.VALIDATION_MAX_ERRORS
+            )
+    except RequestTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestError as e:
+        raise RequestValidationError(e.errors)
+    except NoteValidationError as e:
+        raise HTTPException(status_code=422, detail=e.summary)
+    
+    return await _admit_and_generate(composition)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/generate/progress")
+async def generate_composition_progress(
+    request: CompositionRequest,
+    body_received: Optional[float] = Depends(_body_received)
+):
+    """
+    Generate a MIDI file, streaming render progress as Server-Sent Events
+    
+    Emits `progress` events while rendering and closes with a `complete` event
+    carrying the CompositionResponse (or an `error` event).
+    """
+    composition = _render_input(request, body_received)
+    cost = await _admit(*_shape(composition))
+    
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    last_sent = [0.0]
+    
+    def on_progress(progress):
+        # Called from the render thread; throttle so updates stay cheap
+        now = time.monotonic()
+        if now - last_sent[0] >= settings.PROGRESS_MIN_INTERVAL or progress.stage == "done":
+            last_sent[0] = now
+            loop.call_soon_threadsafe(queue.put_nowait, ("progress", progress.as_dict()))
+    
+    async def render():
+        try:
+            composition_data = await run_in_threadpool(
+                MidiGenerator.generate_midi_file, composition, on_progress
+            )
+            stored = await run_in_threadpool(storage.add_composition, composition_data)
+            await queue.put(("complete", CompositionResponse.model_validate(stored).model_dump()))
+        except Exception as e:
+            await queue.put(("error", {"detail": f"Error generating MIDI file: {str(e)}"}))
+        finally:
+            admission.release(cost)
+    
+    # Rendering starts right away and finishes even if the client goes away
+    task = asyncio.ensure_future(render())
+    
+    async def events():
+        while True:
+            event, data = await queue.get()
+            yield _sse(event, data)
+            if event != "progress":
+                break
+        await task
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+async def _receive_message(websocket: WebSocket) -> Dict[str, Any]:
+    """Receive a JSON object message; raises ValueError on anything else, including binary frames"""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    if frame.get("text") is None:
+        raise ValueError("Messages must be text frames")
+    message = json.loads(frame["text"])
+    if not isinstance(message, dict):
+        raise ValueError("Messages must be JSON objects")
+    return message
+
+
+async def _send_error(websocket: WebSocket, detail: Any):
+    await websocket.send_json({"type": "error", "detail": jsonable_encoder(detail)})
+
+
+@router.websocket("/live")
+async def live_session(websocket: WebSocket):
+    """
+    Live composition session
+    
+    The client opens the session with a `start` message (title, tempo, time_signature),
+    then sends `notes` batches per track. A `snapshot` message returns the current MIDI
+    file as a binary frame, `save` stores it as a composition and `close` ends the session.
+    Invalid messages are answered with an `error` message and the session stays open.
+    """
+    await websocket.accept()
+    try:
+        try:
+            message = await _receive_message(websocket)
+            if message.get("type") != "start":
+                raise ValueError("The first message must be of type 'start'")
+            start = LiveSessionStart.model_validate(message)
+        except (ValueError, ValidationError) as e:
+            await _send_error(websocket, e.errors(include_url=False) if isinstance(e, ValidationError) else str(e))
+            await websocket.close(code=1008)
+            return
+        
+        session = LiveSession(start.title, start.tempo, start.time_signature)
+        await websocket.send_json({"type": "started", **start.model_dump()})
+        
+        while True:
+            try:
+                message = await _receive_message(websocket)
+            except ValueError as e:
+                await _send_error(websocket, str(e))
+                continue
+            
+            kind = message.get("type")
+            if kind == "notes":
+                try:
+                    batch = LiveNoteBatch.model_validate(message)
+                except ValidationError as e:
+                    await _send_error(websocket, e.errors(include_url=False))
+                    continue
+                new_track = not session.has_track(batch.instrument, batch.midi_program)
+                try:
+                    check_limits(session.note_count + len(batch.notes), session.track_count + new_track, 0)
+                except RequestTooLarge as e:
+                    await _send_error(websocket, str(e))
+                    continue
+                notes = batch.notes
+                track = session.add_notes(
+                    batch.instrument,
+                    batch.midi_program,
+                    [note.pitch for note in notes],
+                    [note.start_time for note in notes],
+                    [note.duration for note in notes],
+                    [note.velocity for note in notes]
+                )
+                await websocket.send_json({
+                    "type": "ack",
+                    "instrument": batch.instrument,
+                    "midi_program": batch.midi_program,
+                    "track_notes": len(track),
+                    "notes": session.note_count
+                })
+            elif kind == "snapshot":
+                midi_bytes = await run_in_threadpool(session.snapshot)
+                await websocket.send_json({
+                    "type": "snapshot",
+                    "size": len(midi_bytes),
+                    "notes": session.note_count,
+                    "tracks": session.track_count
+                })
+                await websocket.send_bytes(midi_bytes)
+            elif kind == "save":
+                try:
+                    midi_bytes = await run_in_threadpool(session.snapshot)
+                    composition_data = await run_in_threadpool(MidiGenerator.save_midi_bytes, session.title, midi_bytes)
+                    composition = await run_in_threadpool(storage.add_composition, composition_data)
+                except Exception as e:
+                    await _send_error(websocket, f"Error saving MIDI file: {str(e)}")
+                    continue
+                await websocket.send_json({
+                    "type": "saved",
+                    "composition": CompositionResponse.model_validate(composition).model_dump()
+                })
+            elif kind == "close":
+                await websocket.close()
+                return
+            else:
+                await _send_error(websocket, f"Unknown message type: {kind!r}")
+    except WebSocketDisconnect:
+        pass
+
+
+def _select(selection: CompositionSelection):
+    """Resolve a selection against storage"""
+    return storage.select_compositions(
+        ids=selection.ids,
+        created_after=selection.created_after.isoformat() if selection.created_after else None,
+        created_before=selection.created_before.isoformat() if selection.created_before else None
+    )
+
+
+@router.post("/delete/bulk", response_model=BulkDeleteResponse)
+async def bulk_delete_compositions(selection: CompositionSelection) -> Dict[str, Any]:
+    """
+    Delete compositions by ID list and/or creation time range
+    """
+    selected = _select(selection)
+    removed = await run_in_threadpool(storage.delete_compositions, [c["id"] for c in selected])
+    for composition in removed:
+        midi_cache.invalidate(composition["id"])
+        notes_cache.invalidate(composition["id"])
+        audio_cache.invalidate_prefix(f"{composition['id']}:")
+        roll_cache.invalidate_prefix(f"{composition['id']}:")
+
+    missing = []
+    if selection.ids is not None:
+        removed_ids = {c["id"] for c in removed}
+        missing = [composition_id for composition_id in selection.ids if composition_id not in removed_ids]
+
+    return {"deleted": len(removed), "missing": missing}
+
+
+def _iter_bulk_zip(compositions: List[Dict[str, Any]], missing_ids: List[str]) -> Iterator[bytes]:
+    """Stream the MIDI files of the given compositions as a ZIP archive with a manifest"""
+    archive = ZipStream()
+    manifest = {
+        "included": [],
+        "missing": [{"id": composition_id, "reason": "Composition not found"} for composition_id in missing_ids]
+    }
+    
+    for composition in compositions:
+        filename = os.path.basename(composition["file_path"])
+        try:
+            f = open(composition["file_path"], "rb")
+        except OSError:
+            manifest["missing"].append({"id": composition["id"], "reason": "MIDI file not found"})
+            continue
+        with f:
+            yield from archive.add(filename, iter(lambda: f.read(settings.ZIP_CHUNK_SIZE), b""))
+        manifest["included"].append({"id": composition["id"], "title": composition["title"], "filename": filename})
+    
+    yield from archive.add("manifest.json", [json.dumps(manifest, indent=2).encode()])
+    yield archive.close()
+
+
+@router.post("/download/bulk")
+async def download_bulk(selection: CompositionSelection):
+    """
+    Download the MIDI files of many compositions as a streamed ZIP archive
+    """
+    selected = _select(selection)
+    missing_ids = []
+    if selection.ids is not None:
+        selected_ids = {c["id"] for c in selected}
+        missing_ids = [composition_id for composition_id in selection.ids if composition_id not in selected_ids]
+    
+    return StreamingResponse(
+        _iter_bulk_zip(selected, missing_ids),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="compositions.zip"'}
+    )
+
+
+def _iter_roll_zip(compositions: List[Dict[str, Any]], missing_ids: List[str], fs: float, dtype: str) -> Iterator[bytes]:
+    """Stream piano rolls as members of an .npz archive, one composition at a time"""
+    archive = ZipStream()
+    manifest = {
+        "fs": fs,
+        "dtype": dtype,
+        "included": [],
+        "missing": [{"id": composition_id, "reason": "Composition not found"} for composition_id in missing_ids]
+    }
+    
+    for composition in compositions:
+        try:
+            roll = _piano_roll(composition["id"], composition, fs, dtype)
+        except HTTPException as e:
+            manifest["missing"].append({"id": composition["id"], "reason": e.detail})
+            continue
+        yield from archive.add(f"{composition['id']}.npy", [npy_bytes(roll)])
+        manifest["included"].append({"id": composition["id"], "title": composition["title"], "frames": roll.shape[1]})
+    
+    yield from archive.add("manifest.json", [json.dumps(manifest, indent=2).encode()])
+    yield archive.close()
+
+
+@router.post("/pianoroll/bulk")
+async def download_piano_rolls(selection: PianoRollSelection):
+    """
+    Download the piano rolls of many compositions as one streamed .npz archive
+    
+    Each roll is stored as "<id>.npy"; "manifest.json" lists included and missing compositions.
+    """
+    selected = _select(selection)
+    missing_ids = []
+    if selection.ids is not None:
+        selected_ids = {c["id"] for c in selected}
+        missing_ids = [composition_id for composition_id in selection.ids if composition_id not in selected_ids]
+    
+    return StreamingResponse(
+        _iter_roll_zip(selected, missing_ids, selection.fs, selection.dtype),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="pianorolls.npz"'}
+    )
+
+
+def _iter_midi_files(compositions: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """Read MIDI files one at a time, preferring cached copies"""
+    for composition in compositions:
+        content = midi_cache.get(composition["id"])
+        if content is None:
+            with open(composition["file_path"], "rb") as f:
+                content = f.read()
+        yield content
+
+
+@router.post("/merge", response_model=CompositionResponse, status_code=201)
+async def merge_compositions(request: MergeRequest) -> Dict[str, Any]:
+    """
+    Create a new composition by layering or concatenating stored ones
+    
+    Encoded tracks are spliced rather than re-rendered; tracks sharing a MIDI program
+    are merged into one.
+    """
+    if len(request.ids) > settings.MERGE_MAX_INPUTS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.MERGE_MAX_INPUTS} compositions can be merged")
+    
+    compositions = [storage.get_composition(composition_id) for composition_id in request.ids]
+    missing = [composition_id for composition_id, c in zip(request.ids, compositions) if c is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Compositions not found: {', '.join(missing)}")
+    
+    # Around three bytes per event and two events per note
+    size = sum(c.get("size") or 0 for c in compositions)
+    cost = await _admit(size // 6, 0, 0)
+    try:
+        merged = await run_in_threadpool(
+            merge_midi, _iter_midi_files(compositions), request.mode, request.align_bars
+        )
+        composition_data = await run_in_threadpool(MidiGenerator.save_midi_bytes, request.title, merged)
+        return await run_in_threadpool(storage.add_composition, composition_data)
+    except MergeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="MIDI file not found")
+    finally:
+        admission.release(cost)
+
+
+_SEEN_IDS_DESCRIPTION = (
+    "IDs already exported that were created exactly at `since`; other compositions created at that time are included"
+)
+
+
+def _iter_ndjson(since: Optional[str], seen: Optional[List[str]]) -> Iterator[bytes]:
+    """Encode metadata records as newline-delimited JSON in bounded batches"""
+    batch = []
+    for composition in storage.iter_compositions(since, seen):
+        batch.append(json.dumps(composition))
+        if len(batch) >= settings.EXPORT_BATCH_SIZE:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+
+@router.get("/export.ndjson")
+async def export_compositions(
+    since: Optional[datetime] = Query(None, description="Only export compositions created after this time"),
+    seen_ids: Optional[List[str]] = Query(None, description=_SEEN_IDS_DESCRIPTION)
+):
+    """
+    Stream every composition metadata record (oldest first) as newline-delimited JSON
+    """
+    return StreamingResponse(
+        _iter_ndjson(since.isoformat() if since else None, seen_ids),
+        media_type="application/x-ndjson"
+    )
+
+
+def _iter_note_dataset(since: Optional[str], seen: Optional[List[str]], shard_size: int) -> Iterator[bytes]:
+    """Build note shards across worker processes and stream them as ZIP members, in order"""
+    # Shards are compressed .npz files already
+    archive = ZipStream(compression=zipfile.ZIP_STORED)
+    stats = ExportStats()
+    shards = []
+    last_created_at, last_ids = since, list(seen or ())
+    arguments = ((batch,) for batch in batches(storage.iter_compositions(since, seen), shard_size))
+    for number, (data, shard) in enumerate(map_shards(build_shard, arguments, settings.EXPORT_PROCESSES)):
+        filename = f"part-{number:05d}.npz"
+        yield from archive.add(filename, [data])
+        stats.add(shard)
+        shards.append({"file": filename, **{key: shard[key] for key in ("compositions", "notes", "bytes")}})
+        last_created_at, last_ids = advance_cursor(last_created_at, last_ids, shard)
+    
+    manifest = {
+        "shards": shards, "last_created_at": last_created_at, "last_ids": last_ids, "stats": stats.as_dict()
+    }
+    yield from archive.add("manifest.json", [json.dumps(manifest, indent=2).encode()])
+    yield archive.close()
+
+
+def _export_size(since: Optional[str], seen: Optional[List[str]]) -> int:
+    """Total file size of the compositions an export covers"""
+    return sum(c.get("size") or 0 for c in storage.iter_compositions(since, seen))
+
+
+@router.get("/export/notes")
+async def export_note_dataset(
+    since: Optional[datetime] = Query(None, description="Only export compositions created after this time"),
+    seen_ids: Optional[List[str]] = Query(None, description=_SEEN_IDS_DESCRIPTION),
+    shard_size: int = Query(settings.EXPORT_SHARD_SIZE, ge=1, description="Compositions per shard")
+):
+    """
+    Stream the notes of every composition as sharded columnar .npz files in a ZIP archive
+    
+    manifest.json lists the shards, throughput statistics and the created_at and IDs to pass
+    as `since` and `seen_ids` for the next incremental export.
+    """
+    since_key = since.isoformat() if since else None
+    # Around three bytes per event and two events per note, as for merges; the
+    # estimate is capped so that large libraries can be exported at all
+    size = await run_in_threadpool(_export_size, since_key, seen_ids)
+    cost = await _admit(min(size // 6, settings.ADMISSION_MAX_NOTES), 0, 0)
+    # Released once the response is over, even if the client left before the stream started
+    return StreamingResponse(
+        _iter_note_dataset(since_key, seen_ids, shard_size),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="notes.zip"'},
+        background=BackgroundTask(admission.release, cost)
+    )
 
 
 @router.get("/{composition_id}", response_model=CompositionResponse)
@@ -43,20 +596,128 @@ async def get_composition(
     return composition
 
 
+@router.get("/{composition_id}/analysis", response_model=CompositionAnalysis)
+async def get_analysis(
+    composition_id: str = Path(..., description="The ID of the composition to analyze")
+) -> Dict[str, Any]:
+    """
+    Get the musical statistics computed when the composition was generated
+    """
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    # Older records keep their analysis inline
+    analysis = composition.get("analysis")
+    analysis_path = composition.get("analysis_path")
+    if analysis is None and analysis_path:
+        try:
+            analysis = await run_in_threadpool(load_analysis, analysis_path)
+        except FileNotFoundError:
+            pass
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Analysis not available for this composition")
+    
+    return {"id": composition_id, **analysis}
+
+
+@router.get("/{composition_id}/similar", response_model=SimilarCompositions)
+async def get_similar(
+    composition_id: str = Path(..., description="The ID of the composition to compare against"),
+    k: int = Query(10, ge=1, le=100, description="Number of similar compositions to return")
+) -> Dict[str, Any]:
+    """
+    Find the compositions most similar in pitch content and rhythm
+    
+    Feature vectors are computed when compositions are generated or imported and
+    compared by an exact, blocked scan of the memory-mapped feature matrix.
+    """
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    
+    index = feature_index(settings.MIDI_FILES_DIR)
+    try:
+        # Deleted compositions keep their rows, so results are checked against storage
+        matches = await run_in_threadpool(
+            index.similar, composition_id, k, lambda match_id: storage.get_composition(match_id) is not None
+        )
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Features not available for this composition")
+    
+    return {
+        "id": composition_id,
+        "similar": [
+            {"id": match_id, "title": storage.get_composition(match_id)["title"], "score": score}
+            for match_id, score in matches
+        ]
+    }
+
+
+@router.delete("/{composition_id}", status_code=204)
+async def delete_composition(
+    composition_id: str = Path(..., description="The ID of the composition to delete")
+):
+    """
+    Delete a composition and its MIDI file
+    """
+    if not storage.delete_composition(composition_id):
+        raise HTTPException(status_code=404, detail="Composition not found")
+    midi_cache.invalidate(composition_id)
+    notes_cache.invalidate(composition_id)
+    audio_cache.invalidate_prefix(f"{composition_id}:")
+    roll_cache.invalidate_prefix(f"{composition_id}:")
+
+    return Response(status_code=204)
+
+
 @router.get("", response_model=CompositionList)
 async def list_compositions(
+    request: Request,
     skip: int = Query(0, ge=0, description="Number of compositions to skip"),
-    limit: int = Query(100, ge=1, le=1000, description="Maximum number of compositions to return")
-) -> Dict[str, Any]:
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of compositions to return"),
+    fields: Optional[str] = Query(None, description="Comma-separated composition fields to include (e.g. 'id,title')")
+):
     """
     List all generated compositions with pagination
     """
-    return storage.list_compositions(skip, limit)
+    if fields:
+        selected_fields = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected_fields if field not in CompositionResponse.model_fields]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+        
+        page = storage.list_compositions(skip, limit)
+        fragments = [
+            json.dumps({field: composition.get(field) for field in selected_fields}).encode()
+            for composition in page["compositions"]
+        ]
+        total = page["total"]
+    else:
+        # Compositions are pre-encoded at insert time, so a page is just byte concatenation
+        fragments, total = storage.list_composition_fragments(skip, limit)
+    
+    body = b"".join([
+        b'{"compositions":[', b",".join(fragments),
+        b'],"total":%d,"page":%d,"size":%d}' % (total, skip // limit + 1, limit)
+    ])
+    
+    body, content_encoding = compress_body(
+        body, request.headers.get("accept-encoding"), settings.COMPRESSION_MIN_SIZE
+    )
+    headers = {"Vary": "Accept-Encoding"}
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
+# Measures the handler; bodies too large for the cache are streamed after it returns
 @router.get("/{composition_id}/download")
+@timed("download")
 async def download_midi(
-    composition_id: str = Path(..., description="The ID of the composition to download")
+    composition_id: str = Path(..., description="The ID of the composition to download"),
+    if_none_match: Optional[str] = Header(None),
+    if_range: Optional[str] = Header(None),
+    range_header: Optional[str] = Header(None, alias="Range")
 ):
     """
     Download a generated MIDI file
@@ -66,11 +727,356 @@ async def download_midi(
         raise HTTPException(status_code=404, detail="Composition not found")
     
     file_path = composition["file_path"]
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="MIDI file not found")
+    filename = os.path.basename(file_path)
+    
+    # Generated files never change, so they can be cached for as long as clients like
+    headers = {"Accept-Ranges": "bytes"}
+    etag = composition.get("etag")
+    if etag:
+        etag = quote_etag(etag)
+        headers["ETag"] = etag
+        headers["Cache-Control"] = settings.DOWNLOAD_CACHE_CONTROL
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    
+    # Hot files are served from memory without touching the filesystem
+    content = midi_cache.get(composition_id)
+    if content is None:
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="MIDI file not found")
+        
+        size = composition.get("size") or os.path.getsize(file_path)
+        if size <= midi_cache.max_bytes:
+            with open(file_path, "rb") as f:
+                content = f.read()
+            midi_cache.put(composition_id, content)
+    else:
+        size = len(content)
+    
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    byte_range = _requested_range(range_header, if_range, etag, size, headers)
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        if content is None:
+            with open(file_path, "rb") as f:
+                f.seek(start)
+                partial = f.read(end - start + 1)
+        else:
+            partial = content[start:end + 1]
+        return Response(content=partial, status_code=206, headers=headers, media_type="audio/midi")
+    
+    if content is None:
+        # Too large for the in-memory cache: stream it from disk
+        del headers["Content-Disposition"]
+        return FileResponse(
+            path=file_path,
+            filename=filename,
+            media_type="audio/midi",
+            headers=headers
+        )
+    
+    return Response(content=content, headers=headers, media_type="audio/midi")
+
+
+def _load_midi(composition_id: str, composition: Dict[str, Any]) -> bytes:
+    """Read a stored MIDI file, going through the hot-file cache"""
+    content = midi_cache.get(composition_id)
+    if content is None:
+        file_path = composition["file_path"]
+        if not os.path.exists(file_path):
+            raise HTTPException(status_code=404, detail="MIDI file not found")
+        with open(file_path, "rb") as f:
+            content = f.read()
+        midi_cache.put(composition_id, content)
+    return content
+
+
+def _slice_midi(content: bytes, window: RenderWindow) -> bytes:
+    """Re-encode the notes of a MIDI file sounding in the window, clipped and shifted to start at zero"""
+    decoded = smf.read_midi(content)
+    numerator, denominator = decoded.time_signature
+    window_start, window_end = smf.beats_to_ticks(window_beats(window, f"{numerator}/{denominator}"), decoded.resolution)
+    
+    chunks = [smf.meta_track(decoded.microseconds_per_beat, decoded.time_signature)]
+    for track in decoded.tracks:
+        index = StartIndex.build(track.start_ticks, track.end_ticks)
+        selected = index.overlapping(track.start_ticks, track.end_ticks, window_start, window_end)
+        if not len(selected):
+            continue
+        start_ticks, end_ticks = clip_to_window(
+            track.start_ticks[selected], track.end_ticks[selected], window_start, window_end
+        )
+        chunks.append(smf.note_track(
+            track.name, track.program, track.channel,
+            track.pitch[selected], start_ticks, end_ticks, track.velocity[selected]
+        ))
+    return smf.midi_file(chunks, decoded.resolution)
+
+
+@router.get("/{composition_id}/slice")
+async def slice_midi(
+    composition_id: str = Path(..., description="The ID of the composition to slice"),
+    start: float = Query(..., ge=0, description="Window start"),
+    end: float = Query(..., gt=0, description="Window end (exclusive)"),
+    unit: Literal["bar", "beat"] = Query("bar", description="Unit of start and end"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Download the part of a stored composition sounding in a bar or beat window
+    
+    Notes crossing the window edges are clipped and the slice starts at time zero.
+    """
+    try:
+        window = RenderWindow(start=start, end=end, unit=unit)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    
+    headers = {}
+    if composition.get("etag"):
+        etag = quote_etag(f"{composition['etag']}-{unit}-{start:g}-{end:g}")
+        headers["ETag"] = etag
+        headers["Cache-Control"] = settings.DOWNLOAD_CACHE_CONTROL
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    
+    content = await run_in_threadpool(_load_midi, composition_id, composition)
+    sliced = await run_in_threadpool(_slice_midi, content, window)
     
-    return FileResponse(
-        path=file_path,
-        filename=os.path.basename(file_path),
-        media_type="audio/midi"
-    )
\ No newline at end of file
+    stem = os.path.splitext(os.path.basename(composition["file_path"]))[0]
+    headers["Content-Disposition"] = f'attachment; filename="{stem}_slice.mid"'
+    return Response(content=sliced, headers=headers, media_type="audio/midi")
+
+
+def _preview_notes(composition_id: str, composition: Dict[str, Any]):
+    """Decode a composition's notes for a preview, rejecting previews that would run too long"""
+    notes = preview_notes(smf.read_midi(_load_midi(composition_id, composition)))
+    if duration_seconds(notes) > settings.PREVIEW_MAX_SECONDS:
+        raise HTTPException(
+            status_code=422, detail=f"Preview would exceed {settings.PREVIEW_MAX_SECONDS:g} seconds"
+        )
+    return notes
+
+
+def _iter_preview(cache_key: str, notes, sample_rate: int) -> Iterator[bytes]:
+    """Render a WAV preview block by block, caching it once it is complete if it fits the cache"""
+    rendered, size = [], 0
+    for piece in iter_wav(notes, sample_rate):
+        size += len(piece)
+        if size > audio_cache.max_bytes:
+            rendered = None
+        elif rendered is not None:
+            rendered.append(piece)
+        yield piece
+    if rendered is not None:
+        audio_cache.put(cache_key, b"".join(rendered))
+
+
+@router.get("/{composition_id}/preview.wav")
+async def preview_audio(
+    composition_id: str = Path(..., description="The ID of the composition to preview"),
+    sample_rate: int = Query(
+        settings.PREVIEW_SAMPLE_RATE,
+        ge=settings.PREVIEW_MIN_SAMPLE_RATE,
+        le=settings.PREVIEW_MAX_SAMPLE_RATE,
+        description="Samples per second"
+    ),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Listen to a stored composition as a mono 16-bit WAV file
+    
+    The audio is synthesized from wavetables and streamed while it is rendered;
+    finished previews are served from memory.
+    """
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    
+    headers = {}
+    if composition.get("etag"):
+        etag = quote_etag(f"{composition['etag']}-wav-{sample_rate}")
+        headers["ETag"] = etag
+        headers["Cache-Control"] = settings.DOWNLOAD_CACHE_CONTROL
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    
+    stem = os.path.splitext(os.path.basename(composition["file_path"]))[0]
+    headers["Content-Disposition"] = f'inline; filename="{stem}.wav"'
+    cache_key = f"{composition_id}:{sample_rate}"
+    audio = audio_cache.get(cache_key)
+    if audio is not None:
+        return Response(content=audio, headers=headers, media_type="audio/wav")
+    
+    notes = await run_in_threadpool(_preview_notes, composition_id, composition)
+    return StreamingResponse(
+        _iter_preview(cache_key, notes, sample_rate), headers=headers, media_type="audio/wav"
+    )
+
+
+def _piano_roll(composition_id: str, composition: Dict[str, Any], fs: float, dtype: str):
+    """Build a composition's piano roll, going through the roll cache"""
+    cache_key = f"{composition_id}:{fs:g}:{dtype}"
+    roll = roll_cache.get(cache_key)
+    if roll is None:
+        # Stored source notes avoid parsing MIDI; merged and live compositions only have the file
+        notes_path = composition.get("notes_path")
+        if notes_path and os.path.exists(notes_path):
+            notes = stored_roll_notes(_load_notes(composition_id, composition))
+        else:
+            notes = decoded_roll_notes(smf.read_midi(_load_midi(composition_id, composition)))
+        if frame_count(notes, fs) > settings.PIANOROLL_MAX_FRAMES:
+            raise HTTPException(
+                status_code=422, detail=f"Piano roll would exceed {settings.PIANOROLL_MAX_FRAMES} frames"
+            )
+        roll = piano_roll(notes, fs, dtype)
+        roll_cache.put(cache_key, roll, roll.nbytes)
+    return roll
+
+
+@router.get("/{composition_id}/pianoroll")
+async def get_piano_roll(
+    request: Request,
+    composition_id: str = Path(..., description="The ID of the composition"),
+    fs: float = Query(100.0, gt=0, le=10000, description="Frames per second"),
+    dtype: Literal["uint8", "int16", "float32", "float64", "bool"] = Query(
+        "float64", description="Element type of the roll"
+    ),
+    format: Literal["npy", "npz"] = Query("npy", description="npy, or compressed npz holding piano_roll and fs"),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Get a composition's piano roll as a (128, frames) array of summed velocities
+    
+    The roll matches pretty_midi's get_piano_roll for the stored file. .npy
+    responses are compressed according to Accept-Encoding.
+    """
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    
+    headers = {"Vary": "Accept-Encoding"}
+    if composition.get("etag"):
+        etag = quote_etag(f"{composition['etag']}-roll-{fs:g}-{dtype}-{format}")
+        headers["ETag"] = etag
+        headers["Cache-Control"] = settings.DOWNLOAD_CACHE_CONTROL
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    
+    roll = await run_in_threadpool(_piano_roll, composition_id, composition, fs, dtype)
+    stem = os.path.splitext(os.path.basename(composition["file_path"]))[0]
+    headers["Content-Disposition"] = f'attachment; filename="{stem}_pianoroll.{format}"'
+    if format == "npz":
+        body = await run_in_threadpool(npz_bytes, roll, fs)
+        return Response(content=body, headers=headers, media_type="application/octet-stream")
+    
+    body, content_encoding = await run_in_threadpool(
+        compress_body, npy_bytes(roll), request.headers.get("accept-encoding"), settings.COMPRESSION_MIN_SIZE
+    )
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, headers=headers, media_type="application/octet-stream")
+
+
+def _load_notes(composition_id: str, composition: Dict[str, Any]) -> StoredNotes:
+    """Load a composition's source notes, going through the notes cache"""
+    stored = notes_cache.get(composition_id)
+    if stored is None:
+        notes_path = composition.get("notes_path")
+        if not notes_path or not os.path.exists(notes_path):
+            raise HTTPException(status_code=404, detail="Note data not available for this composition")
+        stored = load_notes(notes_path)
+        notes_cache.put(composition_id, stored, stored.nbytes)
+    return stored
+
+
+@router.get("/{composition_id}/notes", response_model=NoteWindowResponse)
+async def get_notes(
+    composition_id: str = Path(..., description="The ID of the composition"),
+    window_start: Optional[float] = Query(None, alias="from", description="Window start in beats"),
+    window_end: Optional[float] = Query(None, alias="to", description="Window end in beats (exclusive)"),
+    track: Optional[str] = Query(None, description="Track index, or instrument name")
+):
+    """
+    Get the source notes sounding in a time window, without parsing MIDI
+    
+    Notes are answered from the stored columnar note data through its interval index.
+    """
+    if window_start is not None and window_end is not None and window_end <= window_start:
+        raise HTTPException(status_code=422, detail="'to' must be after 'from'")
+    
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    stored = await run_in_threadpool(_load_notes, composition_id, composition)
+    
+    tracks = list(enumerate(stored.tracks))
+    if track is not None:
+        if track.isdigit():
+            tracks = tracks[int(track):int(track) + 1]
+        else:
+            tracks = [(index, stored_track) for index, stored_track in tracks if stored_track.notes.instrument == track]
+        if not tracks:
+            raise HTTPException(status_code=404, detail="Track not found")
+    
+    result = []
+    for index, stored_track in tracks:
+        notes = stored_track.notes
+        selected = stored_track.window(window_start, window_end)
+        result.append({
+            "index": index,
+            "section": stored_track.section,
+            "instrument": notes.instrument,
+            "midi_program": notes.midi_program,
+            "notes": [
+                {"pitch": pitch, "start_time": start, "duration": duration, "velocity": velocity}
+                for pitch, start, duration, velocity in zip(
+                    notes.pitch[selected].tolist(),
+                    notes.start[selected].tolist(),
+                    notes.duration[selected].tolist(),
+                    notes.velocity[selected].tolist()
+                )
+            ]
+        })
+    
+    body = json.dumps({"id": composition_id, "start": window_start, "end": window_end, "tracks": result})
+    return Response(content=body, media_type="application/json")
+
+
+@router.post("/{composition_id}/transform", response_model=CompositionResponse, status_code=201)
+async def transform_composition(
+    request: TransformRequest,
+    composition_id: str = Path(..., description="The ID of the composition to transform")
+) -> Dict[str, Any]:
+    """
+    Create a new composition by transforming a stored one
+    
+    Operations (transpose, tempo, velocity, stretch, filter_tracks) are applied in order
+    to the stored source notes, as array operations, and the result is rendered.
+    """
+    composition = storage.get_composition(composition_id)
+    if not composition:
+        raise HTTPException(status_code=404, detail="Composition not found")
+    stored = await run_in_threadpool(_load_notes, composition_id, composition)
+    
+    transformed = await run_in_threadpool(apply_transforms, stored.to_packed(), request.operations)
+    if not transformed.track_count:
+        raise HTTPException(status_code=422, detail="The operations leave no tracks")
+    if request.title is not None:
+        transformed.title = request.title
+    return await _admit_and_generate(transformed)
+
+
+def _requested_range(range_header, if_range, etag, size, headers):
+    """Resolve the byte range to serve, honouring If-Range only for the current representation"""
+    if not range_header or (if_range and if_range.strip() != etag):
+        return None
+    try:
+        return parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        headers["Content-Range"] = f"bytes */{size}"
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers=headers)
@@ -0,0 +1,109 @@
+"""
+Command line tools for managing the composition library
+
+Run with ``python -m app.cli <command> --help``.
+"""
+import argparse
+import os
+import sys
+
+from app.core.config import settings
+from app.core.storage import CompositionStorage
+from app.utils.dataset_export import export_dataset
+from app.utils.midi_import import import_directory
+
+
+def _export_notes(args: argparse.Namespace) -> int:
+    storage = CompositionStorage()
+
+    def report(shard, stats):
+        totals = stats.as_dict()
+        print(
+            f"{shard['file']}: {shard['compositions']} compositions, {shard['notes']} notes "
+            f"({totals['notes_per_second']:,.0f} notes/s, {totals['compositions_per_second']:,.1f} compositions/s)",
+            file=sys.stderr
+        )
+
+    manifest = export_dataset(
+        storage.iter_compositions,
+        args.output_dir,
+        shard_size=args.shard_size,
+        processes=args.processes,
+        incremental=args.incremental,
+        on_shard=report
+    )
+    stats = manifest["stats"]
+    print(
+        f"Exported {stats['notes']} notes of {stats['compositions']} compositions in {stats['shards']} shards, "
+        f"{stats['elapsed_seconds']:.1f}s ({stats['notes_per_second']:,.0f} notes/s)",
+        file=sys.stderr
+    )
+    for skipped in stats["skipped"]:
+        print(f"Skipped {skipped['id']}: {skipped['reason']}", file=sys.stderr)
+    return 0
+
+
+def _import_midi(args: argparse.Namespace) -> int:
+    storage = CompositionStorage()
+    os.makedirs(settings.MIDI_FILES_DIR, exist_ok=True)
+
+    def report(stats):
+        totals = stats.as_dict()
+        print(
+            f"Committed {stats.imported} of {stats.found - stats.already_imported} files "
+            f"({totals['files_per_second']:,.0f} files/s)",
+            file=sys.stderr
+        )
+
+    stats = import_directory(
+        args.directory,
+        storage,
+        str(settings.MIDI_FILES_DIR),
+        link=not args.copy,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        on_batch=report
+    )
+    totals = stats.as_dict()
+    print(
+        f"Imported {stats.imported} files, skipped {stats.already_imported} already imported, "
+        f"{len(stats.failed)} failed, {totals['elapsed_seconds']:.1f}s ({totals['files_per_second']:,.0f} files/s)",
+        file=sys.stderr
+    )
+    for failure in stats.failed:
+        print(f"Failed {failure['source_path']}: {failure['error']}", file=sys.stderr)
+    return 1 if stats.failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="notemint library tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export-notes", help="Export every composition's notes as sharded .npz files")
+    export.add_argument("output_dir", help="Directory for the shards and manifest.json")
+    export.add_argument("--shard-size", type=int, default=settings.EXPORT_SHARD_SIZE, help="Compositions per shard")
+    export.add_argument("--processes", type=int, default=settings.EXPORT_PROCESSES, help="Worker processes")
+    export.add_argument(
+        "--incremental", action="store_true",
+        help="Only export compositions created after the last export in output_dir"
+    )
+    export.set_defaults(handler=_export_notes)
+
+    importer = commands.add_parser("import", help="Import every MIDI file under a directory into the library")
+    importer.add_argument("directory", help="Directory to search for .mid/.midi files")
+    importer.add_argument("--copy", action="store_true", help="Copy files instead of hard-linking them")
+    importer.add_argument("--processes", type=int, default=settings.IMPORT_PROCESSES, help="Worker processes")
+    importer.add_argument(
+        "--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE, help="Compositions per metadata commit"
+    )
+    importer.set_defaults(handler=_import_midi)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
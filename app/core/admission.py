@@ -0,0 +1,83 @@
+import asyncio
+import math
+import threading
+import time
+
+from app.core.config import settings
+
+# Relative cost of per-track and per-section overhead, in notes
+TRACK_COST = 50
+SECTION_COST = 10
+
+
+class RequestTooLarge(Exception):
+    """Raised when a single request exceeds the per-request limits"""
+
+
+class OverCapacity(Exception):
+    """Raised when the in-flight cost budget stays exhausted for the whole queue timeout"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_cost(notes: int, tracks: int, sections: int) -> int:
+    """Estimate the rendering cost of a composition from its shape"""
+    return notes + TRACK_COST * tracks + SECTION_COST * sections
+
+
+def check_limits(notes: int, tracks: int, sections: int):
+    """
+    Enforce the configured per-request maximums
+
+    Raises:
+        RequestTooLarge: If any count exceeds its limit
+    """
+    for name, count, limit in (
+        ("notes", notes, settings.ADMISSION_MAX_NOTES),
+        ("tracks", tracks, settings.ADMISSION_MAX_TRACKS),
+        ("sections", sections, settings.ADMISSION_MAX_SECTIONS),
+    ):
+        if count > limit:
+            raise RequestTooLarge(f"Composition has {count} {name}, the maximum is {limit}")
+
+
+# Global budget of estimated cost being rendered at once
+class AdmissionController:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.inflight_cost = 0
+        self.inflight_requests = 0
+
+    def try_acquire(self, cost: int) -> bool:
+        """Reserve budget without waiting; a lone request is always admitted"""
+        with self._lock:
+            if self.inflight_requests and self.inflight_cost + cost > settings.ADMISSION_MAX_INFLIGHT_COST:
+                return False
+            self.inflight_cost += cost
+            self.inflight_requests += 1
+            return True
+
+    async def acquire(self, cost: int):
+        """
+        Reserve budget, queueing for up to ADMISSION_QUEUE_TIMEOUT seconds
+
+        Raises:
+            OverCapacity: If the budget did not free up in time
+        """
+        deadline = time.monotonic() + settings.ADMISSION_QUEUE_TIMEOUT
+        while not self.try_acquire(cost):
+            if time.monotonic() >= deadline:
+                retry_after = max(1, math.ceil(self.inflight_cost / settings.ADMISSION_NOTES_PER_SECOND))
+                raise OverCapacity("Server is at rendering capacity, retry later", retry_after)
+            await asyncio.sleep(settings.ADMISSION_POLL_INTERVAL)
+
+    def release(self, cost: int):
+        """Return budget reserved by acquire"""
+        with self._lock:
+            self.inflight_cost -= cost
+            self.inflight_requests -= 1
+
+
+admission = AdmissionController()
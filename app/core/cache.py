@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CallbackMetric, registry
+
+
+# In-process LRU cache for small immutable payloads, bounded by total bytes
+class ByteLRUCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a payload and mark it as most recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any, size: Optional[int] = None) -> bool:
+        """
+        Insert a payload, evicting least recently used entries to stay within budget
+        
+        The size defaults to len(value); pass it explicitly for non-bytes payloads.
+        """
+        if size is None:
+            size = len(value)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+            while self._entries and self._size + size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (value, size)
+            self._size += size
+            return True
+
+    def invalidate(self, key: str):
+        """Drop a payload if cached"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._size -= entry[1]
+
+    def invalidate_prefix(self, prefix: str):
+        """Drop every payload whose key starts with prefix"""
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._size -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """Drop all payloads"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Counters and occupancy of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes
+            }
+
+
+# MIDI payloads by composition ID
+midi_cache = ByteLRUCache(settings.MIDI_CACHE_MAX_BYTES)
+
+# Loaded source note stores by composition ID
+notes_cache = ByteLRUCache(settings.NOTES_CACHE_MAX_BYTES)
+
+# Rendered WAV previews by "<composition ID>:<sample rate>"
+audio_cache = ByteLRUCache(settings.AUDIO_CACHE_MAX_BYTES)
+
+# Piano-roll arrays by "<composition ID>:<fs>:<dtype>"
+roll_cache = ByteLRUCache(settings.PIANOROLL_CACHE_MAX_BYTES)
+
+_caches = {"midi": midi_cache, "notes": notes_cache, "audio": audio_cache, "pianoroll": roll_cache}
+
+
+def _cache_samples(name: str):
+    return lambda: [({"cache": cache_name}, cache.stats()[name]) for cache_name, cache in _caches.items()]
+
+
+# Read from the caches' own counters at scrape time
+for _name, _type, _documentation in (
+    ("hits", "counter", "Cache lookups that found their entry"),
+    ("misses", "counter", "Cache lookups that missed"),
+    ("evictions", "counter", "Entries evicted to stay within the memory budget"),
+    ("bytes", "gauge", "Bytes held in the cache"),
+):
+    registry.register(CallbackMetric(
+        f"notemint_cache_{_name}" + ("_total" if _type == "counter" else ""),
+        _documentation,
+        _type,
+        _cache_samples(_name)
+    ))
@@ -12,8 +12,77 @@ class Settings(BaseSettings):
     # CORS settings
     CORS_ORIGINS: List[str] = ["*"]
     
+    # Admission control for render requests (cost is measured in notes)
+    ADMISSION_MAX_NOTES: int = 1000000
+    ADMISSION_MAX_TRACKS: int = 1000
+    ADMISSION_MAX_SECTIONS: int = 1000
+    ADMISSION_MAX_INFLIGHT_COST: int = 2000000
+    ADMISSION_QUEUE_TIMEOUT: float = 5.0
+    ADMISSION_POLL_INTERVAL: float = 0.01
+    ADMISSION_NOTES_PER_SECOND: int = 200000
+    
+    # /generate bodies at least this large (or chunked) are parsed incrementally
+    STREAMING_INGEST_MIN_BYTES: int = 1024 * 1024
+    
+    # Reject overlapping notes of the same pitch, and how many semantic errors are reported with positions
+    VALIDATE_NOTE_OVERLAPS: bool = False
+    VALIDATION_MAX_ERRORS: int = 20
+    
+    # Maximum number of compositions in one merge request
+    MERGE_MAX_INPUTS: int = 10000
+    
+    # Minimum seconds between render progress events
+    PROGRESS_MIN_INTERVAL: float = 0.1
+    
     # File storage settings
     MIDI_FILES_DIR: Path = Path("./midi_files")
+    FILE_IO_WORKERS: int = 8
+    
+    # Total bytes of MIDI payloads kept in memory for downloads
+    MIDI_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    
+    # Total bytes of decompressed source note data kept in memory for note queries
+    NOTES_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    
+    # Total bytes of rendered audio previews kept in memory
+    AUDIO_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    
+    # Total bytes of piano-roll tensors kept in memory
+    PIANOROLL_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    
+    # Longest piano roll, in frames, that is rendered
+    PIANOROLL_MAX_FRAMES: int = 200000
+    
+    # Default and allowed sample rates of audio previews
+    PREVIEW_SAMPLE_RATE: int = 22050
+    PREVIEW_MIN_SAMPLE_RATE: int = 8000
+    PREVIEW_MAX_SAMPLE_RATE: int = 48000
+    
+    # Longest audio preview, in seconds, that is rendered
+    PREVIEW_MAX_SECONDS: float = 600.0
+    
+    # Read size used when streaming files into bulk ZIP downloads
+    ZIP_CHUNK_SIZE: int = 64 * 1024
+    
+    # JSON list responses at least this large are gzip/brotli compressed
+    COMPRESSION_MIN_SIZE: int = 4096
+    
+    # Records per chunk when streaming the NDJSON export
+    EXPORT_BATCH_SIZE: int = 500
+    
+    # Compositions per shard, and worker processes, of note dataset exports
+    EXPORT_SHARD_SIZE: int = 1000
+    EXPORT_PROCESSES: int = 4
+    
+    # Worker processes, and compositions per metadata commit, of MIDI corpus imports
+    IMPORT_PROCESSES: int = 4
+    IMPORT_BATCH_SIZE: int = 5000
+    
+    # Cache-Control sent with MIDI downloads (generated files are immutable)
+    DOWNLOAD_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+    
+    # Additions and deletions journaled before the metadata file is compacted
+    METADATA_JOURNAL_MAX_ENTRIES: int = 100000
     
     # Ensure the MIDI files directory exists
     def __init__(self, **kwargs):
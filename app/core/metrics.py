@@ -0,0 +1,208 @@
+import bisect
+import functools
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# (name suffix, labels, value) of one exposed sample
+Sample = Tuple[str, Dict[str, str], float]
+
+# Request stages with a duration histogram
+STAGES = ("parse", "build", "encode", "write", "add_composition", "save_metadata", "download")
+
+# Upper bounds, in seconds, of the stage duration buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class Metric(ABC):
+    """A named metric; metrics sharing a name are exposed as one family"""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels or {}
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        """(name suffix, labels, value) of each sample exposed for the metric"""
+
+
+class Counter(Metric):
+    """Monotonically increasing total"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Optional[Dict[str, str]] = None):
+        super().__init__(name, documentation, labels)
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self) -> Iterable[Sample]:
+        return [("", self.labels, self._value)]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their count and sum"""
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Optional[Dict[str, str]] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def time(self, since: Optional[float] = None) -> "_Timer":
+        """
+        Context manager observing the duration of its block, in seconds
+
+        Args:
+            since: time.perf_counter() value to measure from instead of the start of the block
+        """
+        return _Timer(self, since)
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            samples.append(("_bucket", {**self.labels, "le": _format_value(bound)}, cumulative))
+        samples.append(("_count", self.labels, cumulative))
+        samples.append(("_sum", self.labels, total))
+        return samples
+
+
+class _Timer:
+    # A plain class rather than @contextmanager, which costs several times more per use
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: Histogram, since: Optional[float] = None):
+        self._histogram = histogram
+        self._started = since
+
+    def __enter__(self):
+        if self._started is None:
+            self._started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+
+class CallbackMetric(Metric):
+    """Values read when metrics are collected, so keeping them costs nothing in between"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        metric_type: str,
+        callback: Callable[[], Iterable[Tuple[Dict[str, str], float]]]
+    ):
+        super().__init__(name, documentation)
+        self.type = metric_type
+        self._callback = callback
+
+    def samples(self) -> Iterable[Sample]:
+        return [("", labels, value) for labels, value in self._callback()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+        families: Dict[str, List[Metric]] = {}
+        for metric in metrics:
+            families.setdefault(metric.name, []).append(metric)
+
+        lines = []
+        for name, family in families.items():
+            lines.append(f"# HELP {name} {family[0].documentation}")
+            lines.append(f"# TYPE {name} {family[0].type}")
+            for metric in family:
+                for suffix, labels, value in metric.samples():
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+stage_seconds = {
+    stage: registry.register(Histogram(
+        "notemint_stage_duration_seconds", "Time spent in each request stage", labels={"stage": stage}
+    ))
+    for stage in STAGES
+}
+
+notes_rendered = registry.register(Counter("notemint_notes_rendered_total", "Notes encoded into MIDI files"))
+
+bytes_written = registry.register(Counter("notemint_midi_bytes_written_total", "Bytes of MIDI files written"))
+
+
+def time_stage(stage: str, since: Optional[float] = None):
+    """Context manager observing the duration of a stage, optionally measured from an earlier time.perf_counter()"""
+    return stage_seconds[stage].time(since)
+
+
+def timed(stage: str):
+    """Decorator observing the duration of each call of an async handler as a stage"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            with time_stage(stage):
+                return await handler(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,57 @@
+import time
+
+from app.core.config import settings
+
+
+class StreamingIngestMiddleware:
+    """
+    Route oversized generate requests to the incremental ingest endpoint
+
+    Bodies of at least STREAMING_INGEST_MIN_BYTES, or of unknown length, are
+    sent to `stream_path` so they are parsed as they arrive instead of being
+    buffered and turned into a full object tree first.
+    """
+
+    def __init__(self, app, path: str, stream_path: str):
+        self.app = app
+        self.path = path
+        self.stream_path = stream_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == self.path:
+            headers = dict(scope["headers"])
+            content_length = headers.get(b"content-length")
+            if content_length is None:
+                oversized = b"chunked" in headers.get(b"transfer-encoding", b"")
+            else:
+                oversized = content_length.isdigit() and int(content_length) >= settings.STREAMING_INGEST_MIN_BYTES
+            if oversized:
+                scope = dict(scope, path=self.stream_path, raw_path=self.stream_path.encode())
+        await self.app(scope, receive, send)
+
+
+class BodyTimingMiddleware:
+    """
+    Record when each request body has been received in full
+
+    The time.perf_counter() value is kept as ``request.state.body_received``,
+    so handlers can time the JSON parsing and validation FastAPI does before
+    calling them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        state = scope.setdefault("state", {})
+
+        async def timed_receive():
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                state["body_received"] = time.perf_counter()
+            return message
+
+        await self.app(scope, timed_receive, send)
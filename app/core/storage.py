@@ -1,66 +1,394 @@
+import bisect
+import fcntl
 import json
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Any, Tuple
 
 from app.core.config import settings
+from app.core.metrics import CallbackMetric, registry, time_stage
+from app.models.composition import CompositionResponse
+
+
+class _Snapshot(NamedTuple):
+    """Immutable view of the store; writers replace it, readers never lock"""
+    version: int
+    compositions: Mapping[str, Dict[str, Any]]
+    # Compositions sorted by creation time (oldest first), their sort keys
+    # and their pre-encoded CompositionResponse JSON
+    ordered: Tuple[Dict[str, Any], ...]
+    keys: Tuple[str, ...]
+    fragments: Tuple[bytes, ...]
+
+
+def _order_key(composition: Dict[str, Any]) -> str:
+    return composition["created_at"]
+
+
+def _encode_fragment(composition: Dict[str, Any]) -> bytes:
+    return CompositionResponse.model_validate(composition).model_dump_json().encode()
+
+
+def _build_snapshot(version: int, compositions: Dict[str, Dict[str, Any]]) -> _Snapshot:
+    ordered = tuple(sorted(compositions.values(), key=_order_key))
+    keys = tuple(_order_key(c) for c in ordered)
+    fragments = tuple(_encode_fragment(c) for c in ordered)
+    return _Snapshot(version, MappingProxyType(compositions), ordered, keys, fragments)
+
+
+_EMPTY_SNAPSHOT = _build_snapshot(0, {})
+
+
+def _remove_file(file_path: str) -> bool:
+    try:
+        os.remove(file_path)
+        return True
+    except FileNotFoundError:
+        return False
+
 
 # Simple file-based storage for composition metadata
 class CompositionStorage:
     _instance = None
-    _compositions = {}
+    _snapshot = _EMPTY_SNAPSHOT
     _lock = threading.Lock()
-    
+
     def __new__(cls, metadata_file=None):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(CompositionStorage, cls).__new__(cls)
                 cls._instance._metadata_file = metadata_file or os.path.join(settings.MIDI_FILES_DIR, "metadata.json")
+                cls._instance._journal_file = cls._instance._metadata_file + ".journal"
+                cls._instance._lock_file = cls._instance._metadata_file + ".lock"
+                cls._instance._journal_entries = 0
                 cls._instance._instance_lock = threading.Lock()
                 cls._instance._load_metadata()
             return cls._instance
-    
+
+    @property
+    def _compositions(self) -> Mapping[str, Dict[str, Any]]:
+        """Read-only mapping of the currently published snapshot"""
+        return self._snapshot.compositions
+
+    @property
+    def version(self) -> int:
+        """Version of the currently published snapshot"""
+        return self._snapshot.version
+
+    def _file_state(self) -> Tuple[Optional[Tuple[int, int, int]], int]:
+        """Identity of the metadata file and size of the journal, which change with every write"""
+        try:
+            stat = os.stat(self._metadata_file)
+            metadata = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            metadata = None
+        try:
+            journal = os.path.getsize(self._journal_file)
+        except FileNotFoundError:
+            journal = 0
+        return metadata, journal
+
+    @contextmanager
+    def _writing(self):
+        """
+        Serialize writers across threads and processes
+
+        Other processes, such as `python -m app.cli import`, may have written
+        since this one last loaded the files; their changes are loaded first so
+        the next write builds on them instead of overwriting them.
+        """
+        with self._instance_lock, open(self._lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self._file_state() != self._loaded_state:
+                self._load_metadata()
+            try:
+                yield
+            finally:
+                self._loaded_state = self._file_state()
+
+    def _current(self) -> _Snapshot:
+        """
+        The published snapshot, reloaded first if another process has written since
+
+        Checking costs two stat calls, so a running server sees compositions
+        added by `python -m app.cli import` without writing anything itself.
+        """
+        if self._file_state() != self._loaded_state:
+            with self._instance_lock:
+                # Writers in this process update the loaded state before releasing the lock
+                if self._file_state() != self._loaded_state:
+                    self._load_metadata()
+        return self._snapshot
+
     def _load_metadata(self):
         """Load composition metadata from file"""
+        # Taken before reading, so a write racing with the load is noticed by the next writer
+        self._loaded_state = self._file_state()
+        compositions = {}
         if os.path.exists(self._metadata_file):
             try:
                 with open(self._metadata_file, "r") as f:
-                    self._compositions = json.load(f)
+                    compositions = json.load(f)
             except json.JSONDecodeError:
-                self._compositions = {}
-    
-    def _save_metadata(self):
-        """Save composition metadata to file"""
-        with open(self._metadata_file, "w") as f:
-            json.dump(self._compositions, f, indent=2)
-    
+                compositions = {}
+
+        # Replay changes recorded since the last full save
+        self._journal_entries = 0
+        if os.path.exists(self._journal_file):
+            with open(self._journal_file, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Torn write at the end of the journal
+                    for composition in entry.get("added", []):
+                        compositions[composition["id"]] = composition
+                    for composition_id in entry.get("deleted", []):
+                        compositions.pop(composition_id, None)
+                    self._journal_entries += len(entry.get("added", [])) + len(entry.get("deleted", []))
+
+        self._snapshot = _build_snapshot(self._snapshot.version + 1, compositions)
+
+    def _save_metadata(self, compositions: Mapping[str, Dict[str, Any]]):
+        """Save composition metadata to file atomically, compacting the journal"""
+        temp_file = self._metadata_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(dict(compositions), f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        # Restarts see either the old file or the new one, never a truncated one
+        os.replace(temp_file, self._metadata_file)
+        if self._journal_entries:
+            open(self._journal_file, "w").close()
+            self._journal_entries = 0
+
+    def _record_changes(
+        self,
+        compositions: Mapping[str, Dict[str, Any]],
+        added: Optional[List[Dict[str, Any]]] = None,
+        deleted: Optional[List[str]] = None
+    ):
+        """Append added records and deleted IDs to the journal instead of rewriting the whole store"""
+        entry = {}
+        if added:
+            entry["added"] = added
+        if deleted:
+            entry["deleted"] = deleted
+        # Appended before any compaction, so replaying the journal over a compacted file is harmless
+        with time_stage("save_metadata"):
+            with open(self._journal_file, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+            self._journal_entries += len(added or ()) + len(deleted or ())
+            if self._journal_entries > settings.METADATA_JOURNAL_MAX_ENTRIES:
+                self._save_metadata(compositions)
+
     def add_composition(self, composition_data: Dict[str, Any]) -> Dict[str, Any]:
         """Add a new composition to storage"""
-        with self._instance_lock:
+        with time_stage("add_composition"), self._writing():
+            current = self._snapshot
             composition_id = composition_data["id"]
-            self._compositions[composition_id] = composition_data
-            self._save_metadata()
+
+            # Copy-on-write: build the next version and publish it in one assignment
+            compositions = dict(current.compositions)
+            previous = compositions.get(composition_id)
+            compositions[composition_id] = composition_data
+
+            ordered = list(current.ordered)
+            keys = list(current.keys)
+            fragments = list(current.fragments)
+            if previous is not None:
+                index = ordered.index(previous)
+                del ordered[index], keys[index], fragments[index]
+            key = _order_key(composition_data)
+            index = bisect.bisect_right(keys, key)
+            ordered.insert(index, composition_data)
+            keys.insert(index, key)
+            fragments.insert(index, _encode_fragment(composition_data))
+
+            self._record_changes(compositions, added=[composition_data])
+            self._snapshot = _Snapshot(
+                current.version + 1, MappingProxyType(compositions),
+                tuple(ordered), tuple(keys), tuple(fragments)
+            )
             return composition_data
-    
+
+    def add_compositions(self, compositions_data: Iterable[Dict[str, Any]]) -> int:
+        """
+        Add many compositions with one journal append
+        
+        Only the new compositions are encoded; the published order is rebuilt by
+        merging them into the existing one. Returns the number added.
+        """
+        # The last record wins when an ID repeats
+        batch = list({c["id"]: c for c in compositions_data}.values())
+        if not batch:
+            return 0
+        with self._writing():
+            current = self._snapshot
+            compositions = dict(current.compositions)
+            replaced = set()
+            for composition_data in batch:
+                previous = compositions.get(composition_data["id"])
+                if previous is not None:
+                    replaced.add(id(previous))
+                compositions[composition_data["id"]] = composition_data
+
+            entries = [
+                entry for entry in zip(current.keys, current.ordered, current.fragments)
+                if id(entry[1]) not in replaced
+            ]
+            entries += [(_order_key(c), c, _encode_fragment(c)) for c in batch]
+            # Stable, so new entries go after existing ones with the same key, as in add_composition
+            entries.sort(key=lambda entry: entry[0])
+
+            self._record_changes(compositions, added=batch)
+            self._snapshot = _Snapshot(
+                current.version + 1, MappingProxyType(compositions),
+                tuple(entry[1] for entry in entries),
+                tuple(entry[0] for entry in entries),
+                tuple(entry[2] for entry in entries)
+            )
+            return len(batch)
+
     def get_composition(self, composition_id: str) -> Optional[Dict[str, Any]]:
         """Get a composition by ID"""
-        return self._compositions.get(composition_id)
-    
+        return self._current().compositions.get(composition_id)
+
     def list_compositions(self, skip: int = 0, limit: int = 100) -> Dict[str, Any]:
         """List compositions with pagination"""
-        compositions_list = list(self._compositions.values())
-        total = len(compositions_list)
-        
-        # Sort by creation time (newest first)
-        compositions_list.sort(key=lambda c: c["created_at"], reverse=True)
-        
-        # Apply pagination
-        paginated_compositions = compositions_list[skip:skip + limit]
-        
+        snapshot = self._current()
+        ordered = snapshot.ordered
+        total = len(ordered)
+
+        # Newest first: take the page from the end of the ascending order
+        end = max(total - skip, 0)
+        start = max(end - limit, 0)
+        paginated_compositions = list(reversed(ordered[start:end]))
+
         return {
             "compositions": paginated_compositions,
             "total": total,
             "page": skip // limit + 1 if limit > 0 else 1,
             "size": limit
-        }
\ No newline at end of file
+        }
+
+    def list_composition_fragments(self, skip: int = 0, limit: int = 100) -> Tuple[List[bytes], int]:
+        """List pre-encoded compositions (newest first) with pagination, plus the total count"""
+        fragments = self._current().fragments
+        total = len(fragments)
+        end = max(total - skip, 0)
+        start = max(end - limit, 0)
+        return list(fragments[start:end][::-1]), total
+
+    def iter_compositions(
+        self, since: Optional[str] = None, seen: Optional[Iterable[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate compositions oldest first, optionally only those created after `since`
+        
+        With `seen`, compositions created exactly at `since` are included unless
+        their ID is in it. Passing the IDs already returned at that time resumes an
+        iteration without skipping compositions that share its last created_at.
+        """
+        snapshot = self._current()
+        if not since:
+            start = 0
+        elif seen is None:
+            start = bisect.bisect_right(snapshot.keys, since)
+        else:
+            start = bisect.bisect_left(snapshot.keys, since)
+        seen = set(seen or ())
+        for index in range(start, len(snapshot.ordered)):
+            composition = snapshot.ordered[index]
+            if seen and snapshot.keys[index] == since and composition["id"] in seen:
+                continue
+            yield composition
+
+    def select_compositions(
+        self,
+        ids: Optional[Iterable[str]] = None,
+        created_after: Optional[str] = None,
+        created_before: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Select compositions by ID and/or a created_at range [created_after, created_before)"""
+        snapshot = self._current()
+        start = bisect.bisect_left(snapshot.keys, created_after) if created_after else 0
+        end = bisect.bisect_left(snapshot.keys, created_before) if created_before else len(snapshot.keys)
+
+        if ids is None:
+            return list(snapshot.ordered[start:end])
+
+        selected = []
+        for composition_id in ids:
+            composition = snapshot.compositions.get(composition_id)
+            if composition is None:
+                continue
+            key = _order_key(composition)
+            if (created_after and key < created_after) or (created_before and key >= created_before):
+                continue
+            selected.append(composition)
+        return selected
+
+    def delete_compositions(self, composition_ids: Iterable[str], remove_files: bool = True) -> List[Dict[str, Any]]:
+        """Delete compositions (and their MIDI, note and analysis files) by ID, returning the removed entries"""
+        with self._writing():
+            current = self._snapshot
+            compositions = dict(current.compositions)
+            removed = []
+            for composition_id in composition_ids:
+                composition = compositions.pop(composition_id, None)
+                if composition is not None:
+                    removed.append(composition)
+            if not removed:
+                return []
+
+            removed_ids = {id(c) for c in removed}
+            kept = [i for i, c in enumerate(current.ordered) if id(c) not in removed_ids]
+            ordered = tuple(current.ordered[i] for i in kept)
+            keys = tuple(current.keys[i] for i in kept)
+            fragments = tuple(current.fragments[i] for i in kept)
+
+            self._record_changes(compositions, deleted=[c["id"] for c in removed])
+            self._snapshot = _Snapshot(
+                current.version + 1, MappingProxyType(compositions), ordered, keys, fragments
+            )
+
+        if remove_files:
+            file_paths = [c["file_path"] for c in removed]
+            file_paths += [c["notes_path"] for c in removed if c.get("notes_path")]
+            file_paths += [c["analysis_path"] for c in removed if c.get("analysis_path")]
+            if len(file_paths) == 1:
+                _remove_file(file_paths[0])
+            else:
+                with ThreadPoolExecutor(max_workers=settings.FILE_IO_WORKERS) as executor:
+                    list(executor.map(_remove_file, file_paths))
+        return removed
+
+    def delete_composition(self, composition_id: str) -> Optional[Dict[str, Any]]:
+        """Delete a composition (and its MIDI file) by ID"""
+        removed = self.delete_compositions([composition_id])
+        return removed[0] if removed else None
+
+
+def _storage_samples():
+    storage = CompositionStorage._instance
+    return [] if storage is None else [({}, len(storage._compositions))]
+
+
+def _metadata_file_samples():
+    storage = CompositionStorage._instance
+    if storage is None or not os.path.exists(storage._metadata_file):
+        return []
+    return [({}, os.path.getsize(storage._metadata_file))]
+
+
+registry.register(CallbackMetric(
+    "notemint_storage_compositions", "Compositions in the metadata store", "gauge", _storage_samples
+))
+registry.register(CallbackMetric(
+    "notemint_storage_metadata_bytes", "Size of the metadata file", "gauge", _metadata_file_samples
+))
@@ -1,9 +1,11 @@
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.router import router as api_router
 from app.core.config import settings
+from app.core.metrics import registry
+from app.core.middleware import BodyTimingMiddleware, StreamingIngestMiddleware
 
 app = FastAPI(
     title="notemint API",
@@ -20,7 +22,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(
+    StreamingIngestMiddleware,
+    path="/api/v1/compositions/generate",
+    stream_path="/api/v1/compositions/generate/stream",
+)
+
+app.add_middleware(BodyTimingMiddleware)
+
 app.include_router(api_router, prefix="/api/v1")
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Stage timings, counters and cache and storage gauges in the Prometheus text format"""
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -1,5 +1,8 @@
-from typing import List, Optional, Literal
-from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Annotated, List, Optional, Literal, Union
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from app.utils import harmony
 
 
 class Note(BaseModel):
@@ -9,10 +12,39 @@ class Note(BaseModel):
     velocity: int = Field(..., ge=0, le=127, description="Note velocity (0-127)")
 
 
+class Chord(BaseModel):
+    symbol: str = Field(..., description="Chord symbol (e.g. 'Cmaj7', 'F#m7b5', 'G7/B')")
+    start_time: float = Field(..., description="Start time in beats")
+    duration: float = Field(..., description="Duration in beats")
+    velocity: int = Field(..., ge=0, le=127, description="Velocity of the chord's notes (0-127)")
+    octave: int = Field(4, ge=-1, le=9, description="Octave of the root (4 puts C at middle C, 60)")
+    inversion: int = Field(0, ge=0, le=24, description="Number of lowest chord tones moved up an octave")
+    voicing: Literal["close", "open", "drop2", "drop3"] = Field("close", description="How the chord tones are spread")
+
+    @field_validator("symbol")
+    @classmethod
+    def check_symbol(cls, symbol: str) -> str:
+        harmony.parse_chord(symbol)
+        return symbol
+
+
+class ScaleDegreeNote(BaseModel):
+    degree: int = Field(..., ge=1, description="Scale degree (1 is the tonic; degrees past the scale go up an octave)")
+    start_time: float = Field(..., description="Start time in beats")
+    duration: float = Field(..., description="Duration in beats")
+    velocity: int = Field(..., ge=0, le=127, description="Note velocity (0-127)")
+    octave: int = Field(4, ge=-1, le=9, description="Octave of the tonic (4 puts C at middle C, 60)")
+    accidental: int = Field(0, ge=-2, le=2, description="Chromatic alteration in semitones")
+
+
 class Track(BaseModel):
     instrument: str = Field(..., description="Instrument name")
     midi_program: int = Field(..., ge=0, le=127, description="MIDI program number (0-127)")
-    notes: List[Note] = Field(..., description="List of notes in the track")
+    notes: List[Note] = Field(default_factory=list, description="List of notes in the track")
+    chords: List[Chord] = Field(default_factory=list, description="Chord events, expanded into notes")
+    degrees: List[ScaleDegreeNote] = Field(
+        default_factory=list, description="Notes given as scale degrees of the composition's key and scale"
+    )
 
 
 class Section(BaseModel):
@@ -30,9 +62,45 @@ class CompositionData(BaseModel):
     length_bars: int = Field(..., gt=0, description="Total length in bars")
     sections: List[Section] = Field(..., description="List of composition sections")
 
+    @model_validator(mode="after")
+    def check_key_and_scale(self):
+        # Only scale degrees depend on the key and scale, which are free-form otherwise
+        if any(track.degrees for section in self.sections for track in section.tracks):
+            harmony.key_pitch_class(self.key)
+            harmony.scale_steps(self.scale)
+        return self
+
+
+class RenderWindow(BaseModel):
+    start: float = Field(..., ge=0, description="Window start, in units from the beginning")
+    end: float = Field(..., gt=0, description="Window end (exclusive)")
+    unit: Literal["bar", "beat"] = Field("bar", description="Unit of start and end")
+
+    @model_validator(mode="after")
+    def check_order(self):
+        if self.end <= self.start:
+            raise ValueError("Window end must be after its start")
+        return self
+
+
+class QuantizeOptions(BaseModel):
+    grid: float = Field(..., gt=0, description="Grid spacing in beats (e.g. 0.25 for sixteenths)")
+    strength: float = Field(1.0, ge=0, le=1, description="How far notes move towards the grid (0-1)")
+    swing: float = Field(0.0, ge=0, lt=1, description="Delay of every second grid position, as a fraction of the grid")
+    durations: bool = Field(False, description="Also quantize durations to whole grid steps")
+
+
+class HumanizeOptions(BaseModel):
+    timing: float = Field(0.0, ge=0, description="Maximum timing offset in beats (uniform, +/-)")
+    velocity: int = Field(0, ge=0, le=127, description="Maximum velocity offset (uniform, +/-)")
+    seed: int = Field(0, ge=0, description="Random seed; the same seed gives the same result")
+
 
 class CompositionRequest(BaseModel):
     composition: CompositionData = Field(..., description="Composition data")
+    window: Optional[RenderWindow] = Field(None, description="Only render notes sounding in this window")
+    quantize: Optional[QuantizeOptions] = Field(None, description="Snap note starts to a grid before rendering")
+    humanize: Optional[HumanizeOptions] = Field(None, description="Add seeded timing and velocity variation")
 
 
 class CompositionResponse(BaseModel):
@@ -46,4 +114,151 @@ class CompositionList(BaseModel):
     compositions: List[CompositionResponse] = Field(..., description="List of compositions")
     total: int = Field(..., description="Total number of compositions")
     page: int = Field(..., description="Current page number")
-    size: int = Field(..., description="Page size")
\ No newline at end of file
+    size: int = Field(..., description="Page size")
+
+
+class CompositionSelection(BaseModel):
+    ids: Optional[List[str]] = Field(None, description="Composition IDs to select")
+    created_after: Optional[datetime] = Field(None, description="Select compositions created at or after this time")
+    created_before: Optional[datetime] = Field(None, description="Select compositions created before this time")
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.ids is None and self.created_after is None and self.created_before is None:
+            raise ValueError("Provide ids and/or a created_at range")
+        return self
+
+
+class BulkDeleteResponse(BaseModel):
+    deleted: int = Field(..., description="Number of compositions deleted")
+    missing: List[str] = Field(..., description="Requested IDs that were not found")
+
+
+class TransposeOperation(BaseModel):
+    op: Literal["transpose"]
+    semitones: int = Field(..., ge=-127, le=127, description="Semitones to shift; notes leaving 0-127 are dropped")
+
+
+class TempoOperation(BaseModel):
+    op: Literal["tempo"]
+    tempo: int = Field(..., gt=0, description="New tempo in beats per minute")
+
+
+class VelocityOperation(BaseModel):
+    op: Literal["velocity"]
+    gamma: float = Field(1.0, gt=0, description="Curve exponent applied to velocity / 127")
+    scale: float = Field(1.0, ge=0, description="Multiplier applied after the curve")
+    offset: int = Field(0, ge=-127, le=127, description="Added last; results are clipped to 0-127")
+
+
+class StretchOperation(BaseModel):
+    op: Literal["stretch"]
+    factor: float = Field(..., gt=0, description="Multiplier for note start times and durations")
+
+
+class TrackFilterOperation(BaseModel):
+    op: Literal["filter_tracks"]
+    instruments: Optional[List[str]] = Field(None, description="Instrument names to match")
+    programs: Optional[List[int]] = Field(None, description="MIDI programs to match")
+    exclude: bool = Field(False, description="Drop matching tracks instead of keeping them")
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.instruments is None and self.programs is None:
+            raise ValueError("Provide instruments and/or programs")
+        return self
+
+
+TransformOperation = Annotated[
+    Union[TransposeOperation, TempoOperation, VelocityOperation, StretchOperation, TrackFilterOperation],
+    Field(discriminator="op")
+]
+
+
+class TransformRequest(BaseModel):
+    operations: List[TransformOperation] = Field(..., min_length=1, description="Operations, applied in order")
+    title: Optional[str] = Field(None, description="Title of the new composition (defaults to the source title)")
+
+
+class MergeRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, description="Compositions to merge, in order")
+    mode: Literal["layer", "concat"] = Field("concat", description="Play together (layer) or one after another (concat)")
+    align_bars: bool = Field(True, description="When concatenating, start each composition on a bar boundary")
+    title: str = Field("Merged composition", description="Title of the new composition")
+
+
+class TrackNotes(BaseModel):
+    index: int = Field(..., description="Track position in the composition")
+    section: str = Field(..., description="Section the track belongs to")
+    instrument: str = Field(..., description="Instrument name")
+    midi_program: int = Field(..., description="MIDI program number (0-127)")
+    notes: List[Note] = Field(..., description="Notes sounding in the window, in start order")
+
+
+class NoteWindowResponse(BaseModel):
+    id: str = Field(..., description="Composition ID")
+    start: Optional[float] = Field(None, description="Window start in beats")
+    end: Optional[float] = Field(None, description="Window end in beats (exclusive)")
+    tracks: List[TrackNotes] = Field(..., description="Matching tracks")
+
+
+class TrackAnalysis(BaseModel):
+    instrument: str = Field(..., description="Instrument name")
+    midi_program: int = Field(..., description="MIDI program number (0-127)")
+    note_count: int = Field(..., description="Number of notes")
+    pitch_min: int = Field(..., description="Lowest pitch")
+    pitch_max: int = Field(..., description="Highest pitch")
+    pitch_mean: float = Field(..., description="Mean pitch")
+    velocity_mean: float = Field(..., description="Mean velocity")
+    velocity_std: float = Field(..., description="Standard deviation of velocities")
+    duration_mean: float = Field(..., description="Mean note duration in beats")
+    start: float = Field(..., description="First note start in beats")
+    end: float = Field(..., description="Last note end in beats")
+    max_polyphony: int = Field(..., description="Most notes sounding at once")
+    mean_polyphony: float = Field(..., description="Average notes sounding at once, while any sound")
+
+
+class CompositionAnalysis(BaseModel):
+    id: str = Field(..., description="Composition ID")
+    note_count: int = Field(..., description="Number of notes")
+    duration_beats: float = Field(..., description="End of the last note in beats")
+    pitch_histogram: List[int] = Field(..., description="Note count per MIDI pitch (0-127)")
+    pitch_class_histogram: List[int] = Field(..., description="Note count per pitch class, C first")
+    velocity_histogram: List[int] = Field(..., description="Note count per velocity bin of 16")
+    pitch_min: Optional[int] = Field(None, description="Lowest pitch")
+    pitch_max: Optional[int] = Field(None, description="Highest pitch")
+    notes_per_beat: float = Field(..., description="Average note density")
+    notes_per_bar: List[int] = Field(..., description="Notes starting in each bar")
+    max_polyphony: int = Field(..., description="Most notes sounding at once")
+    mean_polyphony: float = Field(..., description="Average notes sounding at once, while any sound")
+    tracks: List[TrackAnalysis] = Field(..., description="Statistics per encoded track")
+
+
+class SimilarComposition(BaseModel):
+    id: str = Field(..., description="Composition ID")
+    title: str = Field(..., description="Composition title")
+    score: float = Field(..., description="Cosine similarity of the feature vectors (1 is identical)")
+
+
+class SimilarCompositions(BaseModel):
+    id: str = Field(..., description="ID of the composition compared against")
+    similar: List[SimilarComposition] = Field(..., description="Most similar compositions first")
+
+
+class PianoRollSelection(CompositionSelection):
+    fs: float = Field(100.0, gt=0, le=10000, description="Frames per second")
+    dtype: Literal["uint8", "int16", "float32", "float64", "bool"] = Field(
+        "float64", description="Element type of the rolls"
+    )
+
+
+class LiveSessionStart(BaseModel):
+    title: str = Field("Live Session", description="Composition title")
+    tempo: int = Field(..., gt=0, description="Tempo in beats per minute")
+    time_signature: str = Field("4/4", description="Time signature (e.g., '4/4')")
+
+
+class LiveNoteBatch(BaseModel):
+    instrument: str = Field(..., description="Instrument name")
+    midi_program: int = Field(..., ge=0, le=127, description="MIDI program number (0-127)")
+    notes: List[Note] = Field(..., description="Notes to add to the track")
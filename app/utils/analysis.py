@@ -0,0 +1,132 @@
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from app.utils.note_arrays import PackedComposition, TrackArrays, beats_per_bar
+
+
+def polyphony(start: np.ndarray, end: np.ndarray) -> Tuple[int, float]:
+    """
+    Maximum and average number of simultaneously sounding notes
+
+    Notes are swept as +1/-1 events in time order, with ends before starts at
+    equal times so back-to-back notes do not overlap. The average is weighted
+    by time and only counts time in which something sounds.
+    """
+    sounding = end > start
+    if not sounding.any():
+        return 0, 0.0
+    times = np.concatenate((start[sounding], end[sounding]))
+    steps = np.concatenate((np.ones(sounding.sum(), dtype=np.int64), -np.ones(sounding.sum(), dtype=np.int64)))
+    order = np.lexsort((steps, times))
+    times, counts = times[order], np.cumsum(steps[order])
+    spans = np.diff(times)
+    active = counts[:-1] > 0
+    sounding_time = spans[active].sum()
+    mean = float((counts[:-1] * spans)[active].sum() / sounding_time) if sounding_time > 0 else 0.0
+    return int(counts.max()), mean
+
+
+def _track_stats(tracks: List[TrackArrays]) -> Dict[str, Any]:
+    pitch = np.concatenate([track.pitch for track in tracks])
+    start = np.concatenate([track.start for track in tracks])
+    duration = np.concatenate([track.duration for track in tracks])
+    velocity = np.concatenate([track.velocity for track in tracks])
+    max_polyphony, mean_polyphony = polyphony(start, start + duration)
+    return {
+        "instrument": tracks[0].instrument,
+        "midi_program": tracks[0].midi_program,
+        "note_count": len(pitch),
+        "pitch_min": int(pitch.min()),
+        "pitch_max": int(pitch.max()),
+        "pitch_mean": float(pitch.mean()),
+        "velocity_mean": float(velocity.mean()),
+        "velocity_std": float(velocity.std()),
+        "duration_mean": float(duration.mean()),
+        "start": float(start.min()),
+        "end": float((start + duration).max()),
+        "max_polyphony": max_polyphony,
+        "mean_polyphony": mean_polyphony
+    }
+
+
+def analyze(composition: PackedComposition) -> Dict[str, Any]:
+    """
+    Compute musical statistics of a packed composition
+
+    Every statistic is computed over whole note columns. Tracks are grouped by
+    instrument and program, like the tracks of the encoded file. Times are in beats.
+
+    Args:
+        composition: The packed composition
+
+    Returns:
+        JSON-serializable statistics: pitch, pitch class and velocity histograms,
+        range, density (overall and per bar), polyphony and per-track statistics
+    """
+    groups: Dict[str, List[TrackArrays]] = {}
+    for section in composition.sections:
+        for track in section.tracks:
+            if len(track):
+                groups.setdefault(f"{track.instrument}_{track.midi_program}", []).append(track)
+    tracks = [track for group in groups.values() for track in group]
+
+    bar = beats_per_bar(composition.time_signature)
+    if not tracks:
+        return {
+            "note_count": 0,
+            "duration_beats": 0.0,
+            "pitch_histogram": [0] * 128,
+            "pitch_class_histogram": [0] * 12,
+            "velocity_histogram": [0] * 8,
+            "pitch_min": None,
+            "pitch_max": None,
+            "notes_per_beat": 0.0,
+            "notes_per_bar": [],
+            "max_polyphony": 0,
+            "mean_polyphony": 0.0,
+            "tracks": []
+        }
+
+    pitch = np.concatenate([track.pitch for track in tracks])
+    start = np.concatenate([track.start for track in tracks])
+    end = np.concatenate([track.end for track in tracks])
+    velocity = np.concatenate([track.velocity for track in tracks])
+    duration = float(end.max())
+    max_polyphony, mean_polyphony = polyphony(start, end)
+
+    return {
+        "note_count": len(pitch),
+        "duration_beats": duration,
+        "pitch_histogram": np.bincount(pitch, minlength=128).tolist(),
+        "pitch_class_histogram": np.bincount(pitch % 12, minlength=12).tolist(),
+        # Eight velocity bins of 16
+        "velocity_histogram": np.bincount(velocity // 16, minlength=8).tolist(),
+        "pitch_min": int(pitch.min()),
+        "pitch_max": int(pitch.max()),
+        "notes_per_beat": len(pitch) / duration if duration > 0 else 0.0,
+        "notes_per_bar": np.bincount((start // bar).astype(np.int64)).tolist(),
+        "max_polyphony": max_polyphony,
+        "mean_polyphony": mean_polyphony,
+        "tracks": [_track_stats(group) for group in groups.values()]
+    }
+
+
+def analysis_path_for(file_path: str) -> str:
+    """Path of the analysis belonging to a MIDI file"""
+    return os.path.splitext(file_path)[0] + ".analysis.json"
+
+
+def save_analysis(path: str, analysis: Dict[str, Any]) -> str:
+    """Write an analysis next to its MIDI file, keeping it out of the metadata store; returns the path"""
+    with open(path, "w") as f:
+        json.dump(analysis, f, separators=(",", ":"))
+    return path
+
+
+def load_analysis(path: str) -> Dict[str, Any]:
+    """Read an analysis written by save_analysis"""
+    with open(path) as f:
+        return json.load(f)
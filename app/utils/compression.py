@@ -0,0 +1,48 @@
+import gzip
+from typing import Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> dict:
+    """Parse an Accept-Encoding header into {coding: quality}"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def compress_body(body: bytes, accept_encoding: Optional[str], min_size: int) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a response body with the best encoding the client accepts
+
+    Args:
+        body: Encoded response body
+        accept_encoding: Raw Accept-Encoding request header
+        min_size: Bodies smaller than this are returned uncompressed
+
+    Returns:
+        The (possibly compressed) body and its Content-Encoding, if any
+    """
+    if len(body) < min_size:
+        return body, None
+
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return brotli.compress(body, quality=5), "br"
+    if accepted.get("gzip", 0) > 0:
+        return gzip.compress(body, compresslevel=6), "gzip"
+    return body, None
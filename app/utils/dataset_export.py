@@ -0,0 +1,276 @@
+import io
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils import smf
+from app.utils.note_store import load_notes
+
+MANIFEST = "manifest.json"
+
+# Note columns of a shard and their types; composition indexes the shard's composition_id array
+COLUMNS = {
+    "composition": np.int32,
+    "track": np.int16,
+    "program": np.uint8,
+    "pitch": np.uint8,
+    "start": np.float64,
+    "duration": np.float64,
+    "velocity": np.uint8
+}
+
+# Keys of a metadata record a worker needs; records are sent to worker processes
+_RECORD_FIELDS = ("id", "file_path", "notes_path", "created_at")
+
+
+@dataclass
+class ExportStats:
+    """Running totals of an export"""
+    shards: int = 0
+    compositions: int = 0
+    notes: int = 0
+    bytes_written: int = 0
+    skipped: List[Dict[str, str]] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    def add(self, shard: Dict[str, Any]):
+        self.shards += 1
+        self.compositions += shard["compositions"]
+        self.notes += shard["notes"]
+        self.bytes_written += shard["bytes"]
+        self.skipped.extend(shard["skipped"])
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "shards": self.shards,
+            "compositions": self.compositions,
+            "notes": self.notes,
+            "bytes_written": self.bytes_written,
+            "skipped": self.skipped,
+            "elapsed_seconds": elapsed,
+            "notes_per_second": self.notes / elapsed if elapsed > 0 else 0.0,
+            "compositions_per_second": self.compositions / elapsed if elapsed > 0 else 0.0
+        }
+
+
+def _composition_tracks(record: Dict[str, Any]) -> List[tuple]:
+    """(track, program, pitch, start, duration, velocity) per track of a composition"""
+    notes_path = record.get("notes_path")
+    if notes_path and os.path.exists(notes_path):
+        stored = load_notes(notes_path)
+        return [
+            (index, notes.midi_program, notes.pitch, notes.start, notes.duration, notes.velocity)
+            for index, notes in enumerate(track.notes for track in stored.tracks)
+        ]
+    # Merged and live compositions only have their MIDI file
+    with open(record["file_path"], "rb") as f:
+        decoded = smf.read_midi(f.read())
+    tracks = []
+    for index, track in enumerate(decoded.tracks):
+        # In beats, like stored notes
+        start = track.start_ticks / decoded.resolution
+        duration = (track.end_ticks - track.start_ticks) / decoded.resolution
+        tracks.append((index, track.program, track.pitch, start, duration, track.velocity))
+    return tracks
+
+
+def build_shard(records: List[Dict[str, Any]]) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Collect the notes of some compositions into one columnar .npz shard
+
+    Every column in COLUMNS has one row per note, and composition_id holds
+    the IDs that the composition column indexes.
+
+    Args:
+        records: Composition metadata records
+
+    Returns:
+        The shard bytes and its statistics
+    """
+    ids: List[str] = []
+    parts: Dict[str, List[np.ndarray]] = {name: [] for name in COLUMNS}
+    skipped = []
+    for record in records:
+        try:
+            tracks = _composition_tracks(record)
+        except (OSError, EOFError, ValueError, KeyError) as e:
+            skipped.append({"id": record["id"], "reason": str(e) or type(e).__name__})
+            continue
+        code = len(ids)
+        ids.append(record["id"])
+        for track, program, *notes in tracks:
+            count = len(notes[0])
+            parts["composition"].append(np.full(count, code))
+            parts["track"].append(np.full(count, track))
+            parts["program"].append(np.full(count, program))
+            for name, column in zip(("pitch", "start", "duration", "velocity"), notes):
+                parts[name].append(column)
+
+    columns = {
+        name: np.concatenate(parts[name]).astype(dtype) if parts[name] else np.empty(0, dtype=dtype)
+        for name, dtype in COLUMNS.items()
+    }
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, composition_id=np.array(ids, dtype=str), **columns)
+    data = buffer.getvalue()
+    last_created_at = max((record["created_at"] for record in records), default=None)
+    return data, {
+        "compositions": len(ids),
+        "notes": len(columns["pitch"]),
+        "bytes": len(data),
+        "skipped": skipped,
+        "last_created_at": last_created_at,
+        "last_ids": [record["id"] for record in records if record["created_at"] == last_created_at]
+    }
+
+
+def write_shard(records: List[Dict[str, Any]], path: str) -> Dict[str, Any]:
+    """Build a shard and write it to path; runs in a worker process"""
+    data, stats = build_shard(records)
+    with open(path, "wb") as f:
+        f.write(data)
+    return {**stats, "file": os.path.basename(path)}
+
+
+def batches(compositions: Iterable[Dict[str, Any]], shard_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Split metadata records into shard-sized batches of picklable records"""
+    batch = []
+    for composition in compositions:
+        batch.append({key: composition.get(key) for key in _RECORD_FIELDS})
+        if len(batch) == shard_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_pools: Dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def process_pool(processes: int) -> ProcessPoolExecutor:
+    """The shared pool of this many worker processes, started once and kept for later exports"""
+    with _pools_lock:
+        pool = _pools.get(processes)
+        if pool is None:
+            pool = _pools[processes] = ProcessPoolExecutor(max_workers=processes)
+        return pool
+
+
+def map_shards(function: Callable, arguments: Iterable[tuple], processes: int) -> Iterator[Any]:
+    """
+    Apply function to each argument tuple across a process pool, yielding results in order
+
+    Arguments are pulled and submitted lazily, at most two per process ahead
+    of the consumer, so a slow consumer bounds the results held in memory.
+    Closing the iterator early cancels the shards not yet started.
+    """
+    if processes <= 1:
+        for args in arguments:
+            yield function(*args)
+        return
+    executor = process_pool(processes)
+    pending = deque()
+    try:
+        for args in arguments:
+            pending.append(executor.submit(function, *args))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def advance_cursor(
+    last_created_at: Optional[str], last_ids: List[str], shard: Dict[str, Any]
+) -> Tuple[Optional[str], List[str]]:
+    """
+    Move an export's cursor past a shard
+
+    The cursor is the newest exported created_at and the IDs exported at that
+    time; an incremental export passes both on, so compositions sharing the
+    last created_at are neither skipped nor exported twice.
+    """
+    # Shards follow creation order, so the latest shard holds the newest composition
+    if shard["last_created_at"] is None:
+        return last_created_at, last_ids
+    if shard["last_created_at"] != last_created_at:
+        last_ids = []
+    return shard["last_created_at"], last_ids + shard["last_ids"]
+
+
+def read_manifest(output_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def export_dataset(
+    iter_compositions: Callable[[Optional[str], Optional[List[str]]], Iterable[Dict[str, Any]]],
+    output_dir: str,
+    shard_size: int,
+    processes: int,
+    incremental: bool = False,
+    on_shard: Optional[Callable[[Dict[str, Any], ExportStats], None]] = None
+) -> Dict[str, Any]:
+    """
+    Export compositions' notes to sharded columnar files in a directory
+
+    Shards are built in parallel worker processes and written as
+    ``part-NNNNN.npz``. The manifest lists every shard, the created_at of
+    the newest exported composition and the IDs exported at that time; an
+    incremental export only exports compositions not exported yet and appends
+    its shards to the existing ones.
+
+    Args:
+        iter_compositions: Returns metadata records oldest first, like
+            CompositionStorage.iter_compositions(since, seen)
+        output_dir: Destination directory
+        shard_size: Compositions per shard
+        processes: Worker processes; 1 builds shards in this process
+        incremental: Continue the export already in output_dir
+        on_shard: Called with each finished shard and the running totals
+
+    Returns:
+        The written manifest
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    previous = read_manifest(output_dir) if incremental else None
+    shards = list(previous["shards"]) if previous else []
+    since = previous.get("last_created_at") if previous else None
+    # Manifests written before last_ids existed resume strictly after last_created_at
+    seen = previous.get("last_ids") if previous else None
+
+    first = len(shards)
+    arguments = (
+        (batch, os.path.join(output_dir, f"part-{first + number:05d}.npz"))
+        for number, batch in enumerate(batches(iter_compositions(since, seen), shard_size))
+    )
+    stats = ExportStats()
+    last_created_at, last_ids = since, list(seen or ())
+    for shard in map_shards(write_shard, arguments, processes):
+        stats.add(shard)
+        shards.append({key: shard[key] for key in ("file", "compositions", "notes", "bytes")})
+        last_created_at, last_ids = advance_cursor(last_created_at, last_ids, shard)
+        if on_shard:
+            on_shard(shard, stats)
+
+    manifest = {
+        "shards": shards, "last_created_at": last_created_at, "last_ids": last_ids, "stats": stats.as_dict()
+    }
+    # Written last, so an interrupted export is simply redone from the previous manifest
+    with open(os.path.join(output_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
@@ -0,0 +1,85 @@
+from dataclasses import replace
+from typing import Optional
+
+import numpy as np
+
+from app.models.composition import HumanizeOptions, QuantizeOptions, RenderWindow
+from app.utils.note_arrays import PackedComposition, PackedSection, TrackArrays, window_beats
+
+
+def quantize(track: TrackArrays, grid: float, strength: float = 1.0, swing: float = 0.0, durations: bool = False) -> TrackArrays:
+    """
+    Move note starts towards the nearest grid position
+
+    Args:
+        track: The notes to quantize
+        grid: Grid spacing in beats
+        strength: Fraction of the distance to the grid position to move (0-1)
+        swing: Delay of odd grid positions, as a fraction of the grid
+        durations: Also round durations to whole grid steps (at least one)
+
+    Returns:
+        The quantized notes
+    """
+    # Round half up so midpoints consistently move later
+    slots = np.floor(track.start / grid + 0.5)
+    target = slots * grid + np.mod(slots, 2) * (swing * grid)
+    start = track.start + strength * (target - track.start)
+    duration = track.duration
+    if durations:
+        steps = np.maximum(np.floor(duration / grid + 0.5), 1.0)
+        duration = duration + strength * (steps * grid - duration)
+    return replace(track, start=start, duration=duration)
+
+
+def humanize(track: TrackArrays, rng: np.random.Generator, timing: float = 0.0, velocity: int = 0) -> TrackArrays:
+    """
+    Add uniform random timing and velocity offsets
+
+    Timing offsets are in beats, like note times. Starts are kept non-negative; sounding notes keep a velocity of at least 1.
+    """
+    count = len(track)
+    start = track.start
+    if timing:
+        start = np.maximum(start + rng.uniform(-timing, timing, count), 0.0)
+    velocities = track.velocity
+    if velocity:
+        jittered = track.velocity.astype(np.int16) + rng.integers(-velocity, velocity + 1, count)
+        velocities = np.where(track.velocity > 0, np.clip(jittered, 1, 127), 0).astype(np.uint8)
+    return replace(track, start=start, velocity=velocities)
+
+
+def apply_render_options(
+    composition: PackedComposition,
+    window: Optional[RenderWindow] = None,
+    quantize_options: Optional[QuantizeOptions] = None,
+    humanize_options: Optional[HumanizeOptions] = None
+) -> PackedComposition:
+    """
+    Apply a request's quantize, humanize and window options, in that order
+
+    Humanization draws from one generator seeded per request, track by track,
+    so the same seed always gives the same result.
+    """
+    rng = np.random.default_rng(humanize_options.seed) if humanize_options else None
+    if quantize_options or humanize_options:
+        sections = []
+        for section in composition.sections:
+            tracks = []
+            for track in section.tracks:
+                if quantize_options:
+                    track = quantize(
+                        track,
+                        quantize_options.grid,
+                        quantize_options.strength,
+                        quantize_options.swing,
+                        quantize_options.durations
+                    )
+                if humanize_options:
+                    track = humanize(track, rng, humanize_options.timing, humanize_options.velocity)
+                tracks.append(track)
+            sections.append(PackedSection(name=section.name, bars=section.bars, tracks=tracks))
+        composition = replace(composition, sections=sections)
+    if window:
+        composition = composition.window(*window_beats(window, composition.time_signature))
+    return composition
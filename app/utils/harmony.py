@@ -0,0 +1,271 @@
+import re
+from functools import lru_cache
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Semitones above the root of each chord quality, by suffix
+CHORD_QUALITIES = {
+    "": (0, 4, 7),
+    "maj": (0, 4, 7),
+    "M": (0, 4, 7),
+    "m": (0, 3, 7),
+    "min": (0, 3, 7),
+    "-": (0, 3, 7),
+    "dim": (0, 3, 6),
+    "o": (0, 3, 6),
+    "aug": (0, 4, 8),
+    "+": (0, 4, 8),
+    "sus2": (0, 2, 7),
+    "sus4": (0, 5, 7),
+    "sus": (0, 5, 7),
+    "5": (0, 7),
+    "6": (0, 4, 7, 9),
+    "m6": (0, 3, 7, 9),
+    "7": (0, 4, 7, 10),
+    "maj7": (0, 4, 7, 11),
+    "M7": (0, 4, 7, 11),
+    "m7": (0, 3, 7, 10),
+    "min7": (0, 3, 7, 10),
+    "-7": (0, 3, 7, 10),
+    "mMaj7": (0, 3, 7, 11),
+    "mM7": (0, 3, 7, 11),
+    "m7b5": (0, 3, 6, 10),
+    "ø": (0, 3, 6, 10),
+    "dim7": (0, 3, 6, 9),
+    "o7": (0, 3, 6, 9),
+    "aug7": (0, 4, 8, 10),
+    "7sus4": (0, 5, 7, 10),
+    "add9": (0, 4, 7, 14),
+    "9": (0, 4, 7, 10, 14),
+    "maj9": (0, 4, 7, 11, 14),
+    "m9": (0, 3, 7, 10, 14),
+    "11": (0, 4, 7, 10, 14, 17),
+    "m11": (0, 3, 7, 10, 14, 17),
+    "13": (0, 4, 7, 10, 14, 21),
+    "maj13": (0, 4, 7, 11, 14, 21),
+    "m13": (0, 3, 7, 10, 14, 21),
+}
+
+# Semitones above the tonic of each scale degree, by scale name
+SCALES = {
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "ionian": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+    "natural_minor": (0, 2, 3, 5, 7, 8, 10),
+    "aeolian": (0, 2, 3, 5, 7, 8, 10),
+    "harmonic_minor": (0, 2, 3, 5, 7, 8, 11),
+    "melodic_minor": (0, 2, 3, 5, 7, 9, 11),
+    "dorian": (0, 2, 3, 5, 7, 9, 10),
+    "phrygian": (0, 1, 3, 5, 7, 8, 10),
+    "lydian": (0, 2, 4, 6, 7, 9, 11),
+    "mixolydian": (0, 2, 4, 5, 7, 9, 10),
+    "locrian": (0, 1, 3, 5, 6, 8, 10),
+    "major_pentatonic": (0, 2, 4, 7, 9),
+    "pentatonic": (0, 2, 4, 7, 9),
+    "minor_pentatonic": (0, 3, 5, 7, 10),
+    "blues": (0, 3, 5, 6, 7, 10),
+    "whole_tone": (0, 2, 4, 6, 8, 10),
+    "chromatic": tuple(range(12)),
+}
+
+VOICINGS = ("close", "open", "drop2", "drop3")
+
+_NOTE_PATTERN = re.compile(r"([A-Ga-g])([#b♯♭]*)")
+_LETTERS = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11}
+_ACCIDENTALS = {"#": 1, "♯": 1, "b": -1, "♭": -1}
+# Key names may carry their mode, e.g. "A minor" or "F#m"
+_KEY_SUFFIXES = {"", "m", "maj", "min", "major", "minor"}
+
+# Chord qualities as a padded (qualities, MAX_CHORD_TONES) table, so chords expand with array indexing
+_QUALITY_CODES = {suffix: code for code, suffix in enumerate(CHORD_QUALITIES)}
+MAX_CHORD_TONES = max(len(intervals) for intervals in CHORD_QUALITIES.values())
+CHORD_SIZES = np.array([len(intervals) for intervals in CHORD_QUALITIES.values()], dtype=np.int64)
+CHORD_INTERVALS = np.array(
+    [intervals + (0,) * (MAX_CHORD_TONES - len(intervals)) for intervals in CHORD_QUALITIES.values()],
+    dtype=np.int64
+)
+_SCALE_TABLES = {name: np.array(steps, dtype=np.int64) for name, steps in SCALES.items()}
+_VOICING_CODES = {name: code for code, name in enumerate(VOICINGS)}
+
+
+def _note_name(text: str) -> Tuple[int, str]:
+    """Pitch class of a leading note name such as 'C', 'F#' or 'Bb', and the rest of the text"""
+    match = _NOTE_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Unknown note name: {text!r}")
+    letter, accidentals = match.groups()
+    pitch_class = _LETTERS[letter.lower()] + sum(_ACCIDENTALS[accidental] for accidental in accidentals)
+    return pitch_class % 12, text[match.end():]
+
+
+def key_pitch_class(key: str) -> int:
+    """Pitch class of a key's tonic, e.g. 2 for 'D', 'D major' or 'Dm'"""
+    pitch_class, rest = _note_name(key.strip())
+    if rest.strip().lower() not in _KEY_SUFFIXES and scale_name(rest) not in SCALES:
+        raise ValueError(f"Unknown key: {key!r}")
+    return pitch_class
+
+
+def scale_name(scale: str) -> str:
+    """Normalized scale name, e.g. 'harmonic_minor' for 'Harmonic Minor'"""
+    return re.sub(r"[\s-]+", "_", scale.strip().lower())
+
+
+def scale_steps(scale: str) -> np.ndarray:
+    """Semitones above the tonic of each degree of a scale"""
+    steps = _SCALE_TABLES.get(scale_name(scale))
+    if steps is None:
+        raise ValueError(f"Unknown scale: {scale!r}; expected one of {', '.join(SCALES)}")
+    return steps
+
+
+@lru_cache(maxsize=4096)
+def parse_chord(symbol: str) -> Tuple[int, int, int]:
+    """
+    Parse a chord symbol such as 'Cmaj7', 'F#m7b5' or 'G7/B'
+
+    Args:
+        symbol: Root, quality suffix from CHORD_QUALITIES and an optional slash bass note
+
+    Returns:
+        (root pitch class, quality code, bass pitch class or -1)
+
+    Raises:
+        ValueError: If the symbol is not recognised
+    """
+    try:
+        body, slash, bass_name = symbol.strip().partition("/")
+        root, suffix = _note_name(body)
+        bass = -1
+        if slash:
+            bass, rest = _note_name(bass_name)
+            if rest:
+                raise ValueError
+    except ValueError:
+        raise ValueError(f"Unknown chord symbol: {symbol!r}") from None
+    quality = _QUALITY_CODES.get(suffix)
+    if quality is None:
+        raise ValueError(f"Unknown chord quality {suffix!r} in {symbol!r}")
+    return root, quality, bass
+
+
+def chord_note_count(symbol: str) -> int:
+    """Most notes a chord symbol expands into: its tones and any slash bass note"""
+    _, quality, bass = parse_chord(symbol)
+    return int(CHORD_SIZES[quality]) + (bass >= 0)
+
+
+def _in_range(pitch: np.ndarray, rows: np.ndarray, start, duration, velocity):
+    """Note columns for valid pitches, with the chord or degree row each came from"""
+    keep = (pitch >= 0) & (pitch <= 127)
+    rows = rows[keep]
+    return (
+        pitch[keep].astype(np.uint8),
+        np.asarray(start, dtype=np.float64)[rows],
+        np.asarray(duration, dtype=np.float64)[rows],
+        np.asarray(velocity, dtype=np.uint8)[rows]
+    )
+
+
+def chord_notes(
+    symbols: Sequence[str],
+    octave: Sequence[int],
+    inversion: Sequence[int],
+    voicing: Sequence[str],
+    start: Sequence[float],
+    duration: Sequence[float],
+    velocity: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Expand chord events into notes
+
+    Chord tones are looked up in CHORD_INTERVALS and stacked above the root
+    in the given octave (octave 4 puts C at 60). An inversion moves that many
+    of the lowest tones up an octave. The voicing then spreads the tones:
+    'open' raises every second tone from the bottom by an octave, 'drop2' and
+    'drop3' lower the second and third highest tone. A slash bass note is added
+    below the lowest tone. Tones outside 0-127 are dropped.
+
+    Args:
+        symbols: Chord symbols, see parse_chord
+        octave: Octave of each chord's root
+        inversion: Inversion of each chord
+        voicing: Name of each chord's voicing, one of VOICINGS
+        start: Start time of each chord in beats
+        duration: Duration of each chord in beats
+        velocity: Velocity of each chord's notes
+
+    Returns:
+        pitch, start, duration and velocity columns of the notes, chord by chord
+    """
+    codes = np.array([parse_chord(symbol) for symbol in symbols], dtype=np.int64).reshape(-1, 3)
+    root, quality, bass = codes.T
+    size = CHORD_SIZES[quality][:, None]
+    position = np.arange(MAX_CHORD_TONES)
+    valid = position < size
+
+    # Inversions past the chord size continue into higher octaves
+    turns, rest = np.divmod(np.asarray(inversion, dtype=np.int64)[:, None], size)
+    tones = CHORD_INTERVALS[quality] + 12 * (turns + (position < rest))
+    tones = np.sort(np.where(valid, tones, np.iinfo(np.int64).max), axis=1)
+
+    code = np.array([_VOICING_CODES[name] for name in voicing], dtype=np.int64)[:, None]
+    shift = np.select(
+        [
+            (code == _VOICING_CODES["open"]) & (position % 2 == 1),
+            (code == _VOICING_CODES["drop2"]) & (size >= 3) & (position == size - 2),
+            (code == _VOICING_CODES["drop3"]) & (size >= 4) & (position == size - 3)
+        ],
+        [12, -12, -12],
+        0
+    )
+    base = 12 * (np.asarray(octave, dtype=np.int64)[:, None] + 1) + root[:, None]
+    pitch = np.where(valid, base + np.where(valid, tones, 0) + shift, -1)
+
+    # Slash bass notes go below the lowest chord tone
+    lowest = np.where(valid, pitch, np.iinfo(np.int64).max).min(axis=1)
+    bass_pitch = np.where(bass >= 0, lowest - 1 - (lowest - 1 - bass) % 12, -1)
+    pitch = np.column_stack((bass_pitch, pitch))
+
+    rows = np.broadcast_to(np.arange(len(codes))[:, None], pitch.shape).ravel()
+    return _in_range(pitch.ravel(), rows, start, duration, velocity)
+
+
+def degree_notes(
+    key: str,
+    scale: str,
+    degree: Sequence[int],
+    octave: Sequence[int],
+    accidental: Sequence[int],
+    start: Sequence[float],
+    duration: Sequence[float],
+    velocity: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Resolve scale-degree notes against a key and scale
+
+    Degree 1 is the tonic in the given octave (octave 4 puts C at 60); degrees
+    past the end of the scale continue into higher octaves. Notes outside
+    0-127 are dropped.
+
+    Args:
+        key: Key of the composition, see key_pitch_class
+        scale: Scale of the composition, one of SCALES
+        degree: 1-based scale degree of each note
+        octave: Octave of each note's tonic
+        accidental: Chromatic alteration of each note in semitones
+        start: Start time of each note in beats
+        duration: Duration of each note in beats
+        velocity: Velocity of each note
+
+    Returns:
+        pitch, start, duration and velocity columns of the notes
+    """
+    steps = scale_steps(scale)
+    turns, index = np.divmod(np.asarray(degree, dtype=np.int64) - 1, len(steps))
+    pitch = (
+        12 * (np.asarray(octave, dtype=np.int64) + 1 + turns)
+        + key_pitch_class(key) + steps[index] + np.asarray(accidental, dtype=np.int64)
+    )
+    return _in_range(pitch, np.arange(len(pitch)), start, duration, velocity)
@@ -0,0 +1,76 @@
+from typing import Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when a Range header cannot be satisfied for the given size"""
+
+
+def quote_etag(etag: str) -> str:
+    """Format a stored content hash as a strong entity tag"""
+    return f'"{etag}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against an entity tag (weak comparison)
+
+    Args:
+        if_none_match: Raw If-None-Match header value
+        etag: Quoted entity tag of the current representation
+
+    Returns:
+        True if the client already holds this representation
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range from a Range header
+
+    Args:
+        range_header: Raw Range header value
+        size: Size of the full representation in bytes
+
+    Returns:
+        Inclusive (start, end) byte positions, or None to serve the full body
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the representation
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Unknown units and multipart ranges are answered with the full body
+        return None
+
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        elif last:
+            # Suffix range: the final N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable(f"Range start {start} is beyond size {size}")
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
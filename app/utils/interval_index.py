@@ -0,0 +1,124 @@
+from dataclasses import dataclass
+from typing import Dict, List
+
+import numpy as np
+
+# Nodes with at most this many intervals are scanned linearly
+LEAF_SIZE = 256
+
+_FIELDS = ("center", "left", "right", "lo", "hi", "by_start", "start_sorted", "by_end", "end_sorted")
+
+
+@dataclass
+class IntervalIndex:
+    """
+    Static centered interval tree over notes sorted by start time, stored as flat arrays
+
+    Each node keeps the intervals containing its center twice: by ascending
+    start and by descending end, so a point query only touches the nodes on one
+    root-to-leaf path plus the intervals it reports. Combined with a binary
+    search on the sorted starts, window queries run in O(log n + k).
+    """
+    center: np.ndarray        # float64 per node, NaN for leaves
+    left: np.ndarray          # int32 child node, -1 for none
+    right: np.ndarray         # int32 child node, -1 for none
+    lo: np.ndarray            # int64 slice of the node's intervals in by_start/by_end
+    hi: np.ndarray
+    by_start: np.ndarray      # int32 note ids, ascending start within each node
+    start_sorted: np.ndarray  # float64 start of by_start
+    by_end: np.ndarray        # int32 note ids, descending end within each node
+    end_sorted: np.ndarray    # float64 negated end of by_end (ascending)
+
+    @classmethod
+    def build(cls, start: np.ndarray, end: np.ndarray) -> "IntervalIndex":
+        """Build the index; start must be sorted ascending"""
+        nodes: List[list] = []
+        by_start: List[np.ndarray] = []
+        by_end: List[np.ndarray] = []
+        offset = 0
+
+        # Iterative build; children are linked once they are created
+        stack = [(np.arange(len(start), dtype=np.int32), -1, 0)]
+        while stack:
+            ids, parent, side = stack.pop()
+            node = len(nodes)
+            if parent >= 0:
+                nodes[parent][1 + side] = node
+
+            if len(ids) <= LEAF_SIZE:
+                center, contained = np.nan, ids
+                left_ids = right_ids = ids[:0]
+            else:
+                node_start, node_end = start[ids], end[ids]
+                center = float(np.median(np.concatenate((node_start, node_end))))
+                left_mask = node_end < center
+                right_mask = node_start > center
+                contained = ids[~(left_mask | right_mask)]
+                left_ids, right_ids = ids[left_mask], ids[right_mask]
+
+            ending = contained[np.argsort(-end[contained], kind="stable")]
+            nodes.append([center, -1, -1, offset, offset + len(contained)])
+            by_start.append(contained)
+            by_end.append(ending)
+            offset += len(contained)
+
+            if len(left_ids):
+                stack.append((left_ids, node, 0))
+            if len(right_ids):
+                stack.append((right_ids, node, 1))
+
+        table = np.array(nodes, dtype=np.float64).reshape(-1, 5)
+        by_start_ids = np.concatenate(by_start) if by_start else np.empty(0, dtype=np.int32)
+        by_end_ids = np.concatenate(by_end) if by_end else np.empty(0, dtype=np.int32)
+        return cls(
+            center=table[:, 0],
+            left=table[:, 1].astype(np.int32),
+            right=table[:, 2].astype(np.int32),
+            lo=table[:, 3].astype(np.int64),
+            hi=table[:, 4].astype(np.int64),
+            by_start=by_start_ids,
+            start_sorted=start[by_start_ids],
+            by_end=by_end_ids,
+            end_sorted=-end[by_end_ids]
+        )
+
+    def stab(self, start: np.ndarray, end: np.ndarray, point: float) -> np.ndarray:
+        """Ids of intervals with start < point < end"""
+        found = []
+        node = 0 if len(self.center) else -1
+        while node >= 0:
+            lo, hi = int(self.lo[node]), int(self.hi[node])
+            center = self.center[node]
+            if np.isnan(center):
+                ids = self.by_start[lo:hi]
+                found.append(ids[(start[ids] < point) & (end[ids] > point)])
+                break
+            if point < center:
+                # Every interval here ends at or after the center
+                count = int(np.searchsorted(self.start_sorted[lo:hi], point, side="left"))
+                found.append(self.by_start[lo:lo + count])
+                node = self.left[node]
+            elif point > center:
+                # Every interval here starts at or before the center
+                count = int(np.searchsorted(self.end_sorted[lo:hi], -point, side="left"))
+                found.append(self.by_end[lo:lo + count])
+                node = self.right[node]
+            else:
+                ids = self.by_start[lo:hi]
+                found.append(ids[(start[ids] < point) & (end[ids] > point)])
+                break
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int32)
+
+    def overlapping(self, start: np.ndarray, end: np.ndarray, window_start: float, window_end: float) -> np.ndarray:
+        """Ids of notes sounding in [window_start, window_end), in start order"""
+        first = int(np.searchsorted(start, window_start, side="left"))
+        last = int(np.searchsorted(start, window_end, side="left"))
+        spanning = np.sort(self.stab(start, end, window_start))
+        return np.concatenate((spanning, np.arange(first, last, dtype=np.int32)))
+
+    def to_arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {f"{prefix}{name}": getattr(self, name) for name in _FIELDS}
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str) -> "IntervalIndex":
+        return cls(**{name: arrays[f"{prefix}{name}"] for name in _FIELDS})
@@ -0,0 +1,176 @@
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from app.utils import smf
+
+
+class LiveTrack:
+    """
+    A track whose sorted note events and their encoding are updated incrementally
+
+    Events are kept in (tick, pitch, velocity) order in growable columns. A new
+    batch only re-sorts the events at or after its earliest tick, and only those
+    events are re-encoded on the next snapshot; the encoded prefix is kept as is.
+    The encoded buffer already holds the note-on status byte, so a snapshot
+    copies it once, straight into the file.
+    """
+
+    def __init__(self, instrument: str, midi_program: int):
+        self.instrument = instrument
+        self.midi_program = midi_program
+        self._count = 0
+        self._ticks = np.empty(0, dtype=np.int64)
+        self._pitches = np.empty(0, dtype=np.uint8)
+        self._velocities = np.empty(0, dtype=np.uint8)
+        # Byte offset just past each encoded event, counting the status byte
+        self._ends = np.empty(0, dtype=np.int64)
+        self._encoded = bytearray()
+        self._encoded_count = 0
+        # Offset of the status byte, after the first event's delta time
+        self._status_offset = 0
+
+    def __len__(self) -> int:
+        """Number of notes in the track"""
+        return self._count // 2
+
+    def _reserve(self, size: int):
+        capacity = len(self._ticks)
+        if size <= capacity:
+            return
+        capacity = max(size, 2 * capacity, 256)
+        for name in ("_ticks", "_pitches", "_velocities", "_ends"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._count] = column[:self._count]
+            setattr(self, name, grown)
+
+    def add_notes(self, pitch: np.ndarray, start_ticks: np.ndarray, end_ticks: np.ndarray, velocity: np.ndarray):
+        """Merge a batch of notes into the sorted event buffer"""
+        if not len(pitch):
+            return
+        ticks, pitches, velocities = smf.note_events(pitch, start_ticks, end_ticks, velocity)
+        count = self._count
+
+        # Existing events before the batch's earliest tick keep their place
+        split = int(np.searchsorted(self._ticks[:count], ticks[0], side="left"))
+        if split < count:
+            ticks = np.concatenate((self._ticks[split:count], ticks))
+            pitches = np.concatenate((self._pitches[split:count], pitches))
+            velocities = np.concatenate((self._velocities[split:count], velocities))
+            order = np.lexsort((velocities, pitches, ticks))
+            ticks, pitches, velocities = ticks[order], pitches[order], velocities[order]
+
+        self._reserve(split + len(ticks))
+        self._ticks[split:split + len(ticks)] = ticks
+        self._pitches[split:split + len(ticks)] = pitches
+        self._velocities[split:split + len(ticks)] = velocities
+        self._count = split + len(ticks)
+
+        # Drop the encoding of every event that moved
+        if split < self._encoded_count:
+            del self._encoded[self._byte_offset(split):]
+            self._encoded_count = split
+
+    def _byte_offset(self, index: int) -> int:
+        return int(self._ends[index - 1]) if index else 0
+
+    def _encode_pending(self):
+        start, count = self._encoded_count, self._count
+        if start == count:
+            return
+        previous_tick = int(self._ticks[start - 1]) if start else 0
+        events, sizes = smf.encode_running_events(
+            self._ticks[start:count], self._pitches[start:count], self._velocities[start:count], previous_tick
+        )
+        data = events.tobytes()
+        if not start:
+            # The channel is set when the chunk is built
+            self._status_offset = len(smf.encode_vlq(int(self._ticks[0])))
+            data = data[:self._status_offset] + b"\x90" + data[self._status_offset:]
+            sizes[0] += 1
+        self._ends[start:count] = self._byte_offset(start) + np.cumsum(sizes)
+        self._encoded += data
+        self._encoded_count = count
+
+    def chunk(self, channel: int) -> List[Union[bytes, bytearray]]:
+        """
+        Encode the track as an MTrk chunk, re-encoding only events changed since the last call
+
+        Returns:
+            The chunk in parts, to be joined into the file; the events are the
+            track's own buffer, not a copy
+        """
+        self._encode_pending()
+        if self._count:
+            self._encoded[self._status_offset] = 0x90 | channel
+        header = smf.track_header(self.instrument, self.midi_program, channel)
+        size = len(header) + len(self._encoded) + len(smf.END_OF_TRACK)
+        return [smf.track_chunk_header(size) + header, self._encoded, smf.END_OF_TRACK]
+
+
+class LiveSession:
+    """Notes streamed into a composition that can be encoded as MIDI at any time"""
+
+    def __init__(self, title: str, tempo: int, time_signature: str):
+        self.title = title
+        self.tempo = tempo
+        self.time_signature = time_signature
+        self._tempo_chunk = smf.tempo_track(tempo, smf.parse_time_signature(time_signature))
+        # Tracks are keyed like MidiGenerator groups them, in order of first appearance
+        self._tracks: Dict[str, LiveTrack] = {}
+        self._snapshot: Optional[bytes] = None
+
+    @property
+    def note_count(self) -> int:
+        return sum(len(track) for track in self._tracks.values())
+
+    @property
+    def track_count(self) -> int:
+        return len(self._tracks)
+
+    def has_track(self, instrument: str, midi_program: int) -> bool:
+        return f"{instrument}_{midi_program}" in self._tracks
+
+    def add_notes(self, instrument: str, midi_program: int, pitch, start, duration, velocity) -> LiveTrack:
+        """
+        Add a batch of notes to a track, creating the track on first use
+
+        Args:
+            instrument: Instrument name
+            midi_program: MIDI program number
+            pitch, start, duration, velocity: Note columns; times in beats
+
+        Returns:
+            The updated track
+        """
+        track_key = f"{instrument}_{midi_program}"
+        track = self._tracks.get(track_key)
+        if track is None:
+            track = self._tracks[track_key] = LiveTrack(instrument, midi_program)
+
+        start = np.asarray(start, dtype=np.float64)
+        end = start + np.asarray(duration, dtype=np.float64)
+        track.add_notes(
+            np.asarray(pitch, dtype=np.uint8),
+            smf.beats_to_ticks(start),
+            smf.beats_to_ticks(end),
+            np.asarray(velocity, dtype=np.uint8)
+        )
+        if len(start):
+            self._snapshot = None
+        return track
+
+    def snapshot(self) -> bytes:
+        """
+        Encode the session as a Standard MIDI File
+
+        Produces the same bytes MidiGenerator.encode_midi would for the same notes.
+        """
+        if self._snapshot is None:
+            tracks = [track for track in self._tracks.values() if len(track)]
+            parts: List[Union[bytes, bytearray]] = [smf.header_chunk(len(tracks) + 1), self._tempo_chunk]
+            for index, track in enumerate(tracks):
+                parts += track.chunk(smf.CHANNELS[index % len(smf.CHANNELS)])
+            self._snapshot = b"".join(parts)
+        return self._snapshot
@@ -0,0 +1,173 @@
+import math
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils import smf
+
+
+class MergeError(ValueError):
+    """Raised when the inputs cannot be merged"""
+
+
+@dataclass
+class _Input:
+    resolution: int
+    microseconds_per_beat: int
+    time_signature: Tuple[int, int]
+    tracks: List[smf.EncodedNoteTrack]
+
+    @property
+    def end_tick(self) -> int:
+        return max((track.end_tick for track in self.tracks), default=0)
+
+
+@dataclass
+class _Group:
+    """Output track collecting every input track with the same program"""
+    name: str
+    program: int
+    pieces: List[bytes] = field(default_factory=list)
+    first_delta: int = 0
+    last_tick: int = 0
+    # Tracks layered into this group; two or more are interleaved instead of spliced
+    layers: List[smf.EncodedNoteTrack] = field(default_factory=list)
+
+    def splice(self, track: smf.EncodedNoteTrack, offset: int):
+        """Append a track's encoded events, rewriting only its first delta"""
+        delta = offset + track.first_delta - self.last_tick
+        if not self.pieces:
+            self.first_delta = delta
+        skip = len(smf.encode_vlq(track.first_delta))
+        self.pieces.append(smf.encode_vlq(delta) + track.events[skip:])
+        self.last_tick = offset + track.end_tick
+
+    def events(self) -> bytes:
+        if len(self.layers) > 1:
+            combined = _combine(self.layers)
+            self.first_delta = combined.first_delta
+            return combined.events
+        return b"".join(self.pieces)
+
+    def chunk(self, channel: int) -> bytes:
+        return smf.track_chunk(
+            smf.track_header(self.name, self.program, channel)
+            + smf.with_status(self.events(), self.first_delta, channel)
+            + smf.END_OF_TRACK
+        )
+
+
+def _combine(tracks: List[smf.EncodedNoteTrack]) -> smf.EncodedNoteTrack:
+    """Interleave the events of tracks that overlap in time into one track"""
+    ticks = np.concatenate([track.ticks for track in tracks])
+    pitches = np.concatenate([track.pitches for track in tracks])
+    velocities = np.concatenate([track.velocities for track in tracks])
+    order = np.lexsort((velocities, pitches, ticks))
+    ticks, pitches, velocities = ticks[order], pitches[order], velocities[order]
+    events, _ = smf.encode_running_events(ticks, pitches, velocities)
+    return smf.EncodedNoteTrack(
+        tracks[0].name, tracks[0].program, events.tobytes(), int(ticks[0]), ticks, pitches, velocities
+    )
+
+
+def _by_program(tracks: List[smf.EncodedNoteTrack]) -> List[smf.EncodedNoteTrack]:
+    """One track per program, combining tracks of a file that share one"""
+    programs: Dict[int, List[smf.EncodedNoteTrack]] = {}
+    for track in tracks:
+        if len(track.ticks):
+            programs.setdefault(track.program, []).append(track)
+    return [group[0] if len(group) == 1 else _combine(group) for group in programs.values()]
+
+
+def _read_input(data: bytes) -> _Input:
+    """Take a file's tracks in encoded form, decoding only files written in another layout"""
+    resolution, chunks = smf.split_chunks(data)
+    meta = smf.parse_meta_track(chunks[0]) if chunks else None
+    tracks = [smf.parse_note_track(chunk) for chunk in chunks[1:]]
+    if meta is not None and all(track is not None for track in tracks):
+        return _Input(resolution, meta[0], meta[1], _by_program(tracks))
+
+    decoded = smf.read_midi(data)
+    encoded = []
+    for track in decoded.tracks:
+        ticks, pitches, velocities = smf.note_events(track.pitch, track.start_ticks, track.end_ticks, track.velocity)
+        events, _ = smf.encode_running_events(ticks, pitches, velocities)
+        encoded.append(smf.EncodedNoteTrack(
+            track.name, track.program, events.tobytes(), int(ticks[0]), ticks, pitches, velocities
+        ))
+    return _Input(decoded.resolution, decoded.microseconds_per_beat, decoded.time_signature, _by_program(encoded))
+
+
+def merge_midi(files: Iterable[bytes], mode: str = "concat", align_bars: bool = True) -> bytes:
+    """
+    Merge MIDI files by layering them or concatenating them in time
+
+    Files are read one at a time in a single pass. Tracks sharing a program are
+    merged into one output track. Concatenation splices the encoded events and
+    only rewrites the first delta of each piece; layering splices too, except
+    that tracks sharing a program are interleaved from their decoded events.
+
+    Args:
+        files: MIDI file contents, in order
+        mode: "layer" to play the files together, "concat" to play them one after another
+        align_bars: When concatenating, start each file on a bar boundary of the previous one
+
+    Returns:
+        The merged MIDI file
+
+    Raises:
+        MergeError: If resolutions differ, or layered files have different tempos
+    """
+    groups: Dict[int, _Group] = {}
+    tempo_map: List[Tuple[int, int, Tuple[int, int]]] = []
+    resolution: Optional[int] = None
+    offset = 0
+
+    for index, data in enumerate(files):
+        try:
+            current = _read_input(data)
+        except (ValueError, IndexError, OSError) as e:
+            raise MergeError(f"Input {index} is not a readable MIDI file: {e}")
+        if resolution is None:
+            resolution = current.resolution
+        elif current.resolution != resolution:
+            raise MergeError(f"Input {index} has resolution {current.resolution}, expected {resolution}")
+
+        if mode == "layer":
+            if tempo_map and tempo_map[0][1] != current.microseconds_per_beat:
+                raise MergeError(f"Input {index} has a different tempo; layered inputs must share one")
+            if not tempo_map:
+                tempo_map.append((0, current.microseconds_per_beat, current.time_signature))
+        else:
+            tempo_map.append((offset, current.microseconds_per_beat, current.time_signature))
+
+        for track in current.tracks:
+            group = groups.get(track.program)
+            if group is None:
+                group = groups[track.program] = _Group(track.name, track.program)
+            if mode == "layer":
+                group.layers.append(track)
+                if len(group.layers) == 1:
+                    group.splice(track, 0)
+                else:
+                    group.pieces = []
+            else:
+                group.splice(track, offset)
+
+        if mode != "layer":
+            length = current.end_tick
+            if align_bars:
+                numerator, denominator = current.time_signature
+                bar = numerator * 4 * resolution // denominator
+                length = math.ceil(length / bar) * bar if length else 0
+            offset += length
+
+    if resolution is None:
+        raise MergeError("Nothing to merge")
+
+    chunks = [smf.conductor_track(tempo_map)]
+    audible = [group for group in groups.values() if group.pieces or len(group.layers) > 1]
+    for index, group in enumerate(audible):
+        chunks.append(group.chunk(smf.CHANNELS[index % len(smf.CHANNELS)]))
+    return smf.midi_file(chunks, resolution)
@@ -1,88 +1,233 @@
+import hashlib
 import os
+import time
 import uuid
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 import logging
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Optional, Union
 
-import pretty_midi
+import numpy as np
 
 from app.models.composition import CompositionData
+from app.utils import smf
+from app.utils.analysis import analysis_path_for, analyze, save_analysis
+from app.utils.similarity import feature_index, feature_vector
+from app.utils.note_arrays import PackedComposition, pack_composition
+from app.utils.note_store import notes_path_for, save_notes
 from app.core.config import settings
+from app.core.cache import midi_cache
+from app.core.metrics import bytes_written, notes_rendered, stage_seconds, time_stage
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class RenderProgress:
+    """Running counters reported while a composition is rendered"""
+    sections_total: int
+    tracks_total: int
+    notes_total: int
+    stage: str = "building"
+    sections_done: int = 0
+    tracks_done: int = 0
+    instruments_total: int = 0
+    instruments_encoded: int = 0
+    notes_processed: int = 0
+    notes_encoded: int = 0
+    bytes_written: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def eta_seconds(self) -> Optional[float]:
+        """Estimated seconds remaining, extrapolated from the work done so far"""
+        done = self.notes_processed + self.notes_encoded
+        total = 2 * self.notes_total
+        if self.stage == "done" or total == 0:
+            return 0.0
+        if done == 0:
+            return None
+        return (time.monotonic() - self.started) * (total - done) / done
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "sections_done": self.sections_done,
+            "sections_total": self.sections_total,
+            "tracks_done": self.tracks_done,
+            "tracks_total": self.tracks_total,
+            "instruments_encoded": self.instruments_encoded,
+            "instruments_total": self.instruments_total,
+            "notes_processed": self.notes_processed,
+            "notes_encoded": self.notes_encoded,
+            "notes_total": self.notes_total,
+            "bytes_written": self.bytes_written,
+            "elapsed_seconds": time.monotonic() - self.started,
+            "eta_seconds": self.eta_seconds()
+        }
+
+
+ProgressCallback = Callable[[RenderProgress], None]
+
+
+def _instrument_key(track) -> str:
+    """Tracks with the same key are encoded into one MIDI track"""
+    return f"{track.instrument}_{track.midi_program}"
+
+
 class MidiGenerator:
     @staticmethod
-    def generate_midi_file(composition_data: CompositionData) -> Dict[str, Any]:
+    def encode_midi(composition: PackedComposition, progress: Optional[ProgressCallback] = None) -> bytes:
+        """
+        Encode a packed composition as a Standard MIDI File
+        
+        Args:
+            composition: The packed composition
+            progress: Optional callback invoked after each section and each encoded instrument
+            
+        Returns:
+            The MIDI file bytes
+        """
+        tracker = RenderProgress(
+            sections_total=len(composition.sections),
+            tracks_total=composition.track_count,
+            notes_total=composition.note_count
+        )
+        # Building note columns and encoding them alternate per instrument; both are summed
+        started = time.perf_counter()
+        encode_seconds = 0.0
+        
+        # Group tracks by instrument name and program, in order of first appearance
+        instruments = {}
+        for section in composition.sections:
+            for track in section.tracks:
+                instruments.setdefault(_instrument_key(track), []).append(track)
+                tracker.tracks_done += 1
+                tracker.notes_processed += len(track)
+            tracker.sections_done += 1
+            if progress:
+                progress(tracker)
+        
+        # Only instruments with notes get a track
+        groups = [tracks for tracks in instruments.values() if any(len(track) for track in tracks)]
+        tracker.instruments_total = len(groups)
+        tracker.stage = "encoding"
+        
+        chunks = [smf.tempo_track(composition.tempo, smf.parse_time_signature(composition.time_signature))]
+        tracker.bytes_written += len(chunks[0])
+        for index, tracks in enumerate(groups):
+            pitch = np.concatenate([track.pitch for track in tracks])
+            start_ticks = smf.beats_to_ticks(np.concatenate([track.start for track in tracks]))
+            end_ticks = smf.beats_to_ticks(np.concatenate([track.end for track in tracks]))
+            velocity = np.concatenate([track.velocity for track in tracks])
+            encode_started = time.perf_counter()
+            chunk = smf.note_track(
+                tracks[0].instrument,
+                tracks[0].midi_program,
+                smf.CHANNELS[index % len(smf.CHANNELS)],
+                pitch,
+                start_ticks,
+                end_ticks,
+                velocity
+            )
+            encode_seconds += time.perf_counter() - encode_started
+            chunks.append(chunk)
+            tracker.instruments_encoded += 1
+            tracker.notes_encoded += len(pitch)
+            tracker.bytes_written += len(chunk)
+            if progress:
+                progress(tracker)
+        
+        encode_started = time.perf_counter()
+        midi_bytes = smf.midi_file(chunks)
+        finished = time.perf_counter()
+        encode_seconds += finished - encode_started
+        stage_seconds["build"].observe(finished - started - encode_seconds)
+        stage_seconds["encode"].observe(encode_seconds)
+        notes_rendered.inc(composition.note_count)
+        tracker.stage = "done"
+        tracker.notes_encoded = tracker.notes_total
+        tracker.bytes_written = len(midi_bytes)
+        if progress:
+            progress(tracker)
+        return midi_bytes
+    
+    @staticmethod
+    def generate_midi_file(
+        composition_data: Union[CompositionData, PackedComposition],
+        progress: Optional[ProgressCallback] = None
+    ) -> Dict[str, Any]:
         """
         Generate a MIDI file from composition data
         
         Args:
-            composition_data: The composition data structure
+            composition_data: The composition data structure, or its packed form
+            progress: Optional callback receiving RenderProgress updates
             
         Returns:
             Dictionary with metadata about the generated file
         """
         try:
-            # Create a PrettyMIDI object
-            midi = pretty_midi.PrettyMIDI(initial_tempo=composition_data.tempo)
+            if isinstance(composition_data, CompositionData):
+                composition_data = pack_composition(composition_data)
             
-            # Dictionary to keep track of instruments by name and program
-            instruments = {}
+            # Encode in memory so the content hash is computed once
+            midi_bytes = MidiGenerator.encode_midi(composition_data, progress)
+            metadata = MidiGenerator.save_midi_bytes(composition_data.title, midi_bytes)
             
-            # Process each section in the composition
+            # Keep the source notes so they can be queried without parsing MIDI
+            metadata["notes_path"] = save_notes(notes_path_for(metadata["file_path"]), composition_data)
+            # Analytics come from the notes already in memory instead of re-parsing the file
+            metadata["analysis_path"] = save_analysis(analysis_path_for(metadata["file_path"]), analyze(composition_data))
+            # Features are computed from the tracks and tick grid of the encoded file, as for imported files
+            instruments = {}
             for section in composition_data.sections:
-                # Process each track in the section
                 for track in section.tracks:
-                    # Create a unique key for the instrument
-                    instrument_key = f"{track.instrument}_{track.midi_program}"
-                    
-                    # Get or create the instrument
-                    if instrument_key not in instruments:
-                        instrument = pretty_midi.Instrument(
-                            program=track.midi_program,
-                            name=track.instrument
-                        )
-                        instruments[instrument_key] = instrument
-                    else:
-                        instrument = instruments[instrument_key]
-                    
-                    # Add notes to the instrument
-                    for note_data in track.notes:
-                        if not hasattr(note_data, 'pitch') or note_data.pitch is None:
-                            continue  # Skip invalid notes
-                            
-                        note = pretty_midi.Note(
-                            velocity=note_data.velocity,
-                            pitch=note_data.pitch,
-                            start=note_data.start_time,
-                            end=note_data.start_time + note_data.duration
-                        )
-                        instrument.notes.append(note)
-            
-            # Add all instruments to the MIDI data
-            for instrument in instruments.values():
-                if instrument.notes:  # Only add instruments with notes
-                    midi.instruments.append(instrument)
-            
-            # Generate a unique filename
-            composition_id = str(uuid.uuid4())
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"{composition_id}_{timestamp}.mid"
-            file_path = os.path.join(settings.MIDI_FILES_DIR, filename)
-            
-            # Write the MIDI file
-            midi.write(file_path)
-            
-            return {
-                "id": composition_id,
-                "title": composition_data.title,
-                "file_path": str(file_path),
-                "created_at": datetime.now().isoformat()
-            }
+                    instruments.setdefault(_instrument_key(track), []).append(track)
+            tracks = []
+            for group in instruments.values():
+                start = smf.beats_to_ticks(np.concatenate([track.start for track in group]))
+                end = smf.beats_to_ticks(np.concatenate([track.end for track in group]))
+                pitch = np.concatenate([track.pitch for track in group])
+                tracks.append((pitch, start / smf.RESOLUTION, (end - start) / smf.RESOLUTION))
+            feature_index(settings.MIDI_FILES_DIR).add([metadata["id"]], feature_vector(tracks))
+            return metadata
             
         except Exception as e:
             logger.error(f"Error generating MIDI file: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+    
+    @staticmethod
+    def save_midi_bytes(title: str, midi_bytes: bytes) -> Dict[str, Any]:
+        """
+        Write encoded MIDI bytes to a new file
+        
+        Args:
+            title: Composition title
+            midi_bytes: The encoded MIDI file
+            
+        Returns:
+            Dictionary with metadata about the written file
+        """
+        # Generate a unique filename
+        composition_id = str(uuid.uuid4())
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        filename = f"{composition_id}_{timestamp}.mid"
+        file_path = os.path.join(settings.MIDI_FILES_DIR, filename)
+        
+        # Write the MIDI file
+        with time_stage("write"), open(file_path, "wb") as f:
+            f.write(midi_bytes)
+        bytes_written.inc(len(midi_bytes))
+        
+        # Fresh compositions are likely to be downloaded next
+        midi_cache.put(composition_id, midi_bytes)
+        
+        return {
+            "id": composition_id,
+            "title": title,
+            "file_path": str(file_path),
+            "created_at": datetime.now().isoformat(),
+            "etag": hashlib.sha256(midi_bytes).hexdigest(),
+            "size": len(midi_bytes)
+        }
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from app.utils import smf
+from app.utils.similarity import feature_index, feature_vector
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+
+
+@dataclass
+class ImportStats:
+    """Running totals of an import"""
+    found: int = 0
+    already_imported: int = 0
+    imported: int = 0
+    failed: List[Dict[str, str]] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic)
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        processed = self.imported + len(self.failed)
+        return {
+            "found": self.found,
+            "already_imported": self.already_imported,
+            "imported": self.imported,
+            "failed": self.failed,
+            "elapsed_seconds": elapsed,
+            "files_per_second": processed / elapsed if elapsed > 0 else 0.0
+        }
+
+
+def find_midi_files(root: str) -> Iterator[str]:
+    """Absolute paths of the MIDI files under root, in a stable order"""
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(MIDI_EXTENSIONS):
+                yield os.path.abspath(os.path.join(directory, filename))
+
+
+def composition_id_for(source_path: str) -> str:
+    """Stable composition ID of a source file, so re-running an import skips it"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, "file://" + os.path.abspath(source_path)))
+
+
+def _place(source_path: str, file_path: str, link: bool):
+    """Hard-link (falling back to a copy across filesystems) or copy a file into the library"""
+    if os.path.exists(file_path):
+        # Placed by an interrupted run; names are derived from the source, so it is the same file
+        return
+    if link:
+        try:
+            os.link(source_path, file_path)
+            return
+        except OSError:
+            pass
+    partial = file_path + ".part"
+    shutil.copyfile(source_path, partial)
+    os.replace(partial, file_path)
+
+
+def import_file(source_path: str, midi_files_dir: str, link: bool = True) -> Dict[str, Any]:
+    """
+    Read a MIDI file, place it in the library and describe it; runs in a worker process
+
+    Args:
+        source_path: The file to import
+        midi_files_dir: Library directory
+        link: Hard-link instead of copying when possible
+
+    Returns:
+        The composition metadata record with its feature vector under "features",
+        or {"source_path", "error"} if the file is unreadable
+    """
+    try:
+        with open(source_path, "rb") as f:
+            data = f.read()
+        decoded = smf.read_midi(data)
+    except (OSError, EOFError, ValueError, KeyError, IndexError) as e:
+        return {"source_path": source_path, "error": str(e) or type(e).__name__}
+
+    composition_id = composition_id_for(source_path)
+    modified = datetime.fromtimestamp(os.path.getmtime(source_path)).strftime("%Y%m%d%H%M%S")
+    file_path = os.path.join(midi_files_dir, f"{composition_id}_{modified}.mid")
+    try:
+        _place(source_path, file_path, link)
+    except OSError as e:
+        return {"source_path": source_path, "error": str(e)}
+
+    features = feature_vector(
+        (
+            track.pitch,
+            track.start_ticks / decoded.resolution,
+            (track.end_ticks - track.start_ticks) / decoded.resolution
+        )
+        for track in decoded.tracks
+    )
+    ends = [decoded.ticks_to_seconds(track.end_ticks).max() for track in decoded.tracks if len(track.end_ticks)]
+    numerator, denominator = decoded.time_signature
+    return {
+        "id": composition_id,
+        "title": os.path.splitext(os.path.basename(source_path))[0],
+        "file_path": file_path,
+        "created_at": datetime.now().isoformat(),
+        "etag": hashlib.sha256(data).hexdigest(),
+        "size": len(data),
+        "source_path": source_path,
+        "tempo": round(6e7 / decoded.microseconds_per_beat, 3),
+        "time_signature": f"{numerator}/{denominator}",
+        "duration_seconds": float(max(ends, default=0.0)),
+        "track_count": len(decoded.tracks),
+        "note_count": sum(len(track.pitch) for track in decoded.tracks),
+        # Moved into the feature index on commit
+        "features": features.tolist()
+    }
+
+
+def import_directory(
+    root: str,
+    storage,
+    midi_files_dir: str,
+    link: bool = True,
+    processes: int = 1,
+    batch_size: int = 5000,
+    on_batch: Optional[Callable[[ImportStats], None]] = None
+) -> ImportStats:
+    """
+    Import every MIDI file under a directory into storage
+
+    Files are parsed and placed across a process pool. Metadata is committed
+    with one storage.add_compositions call per batch, so an interrupted import
+    keeps every committed batch. Because composition IDs derive from source
+    paths, running the import again skips what was already committed.
+
+    Args:
+        root: Directory to walk
+        storage: CompositionStorage to add the compositions to
+        midi_files_dir: Library directory files are linked or copied into
+        link: Hard-link instead of copying when possible
+        processes: Worker processes; 1 imports in this process
+        batch_size: Compositions per metadata commit
+        on_batch: Called with the running totals after each commit
+
+    Returns:
+        Totals of the import
+    """
+    stats = ImportStats()
+    pending = []
+    for source_path in find_midi_files(root):
+        stats.found += 1
+        if storage.get_composition(composition_id_for(source_path)) is not None:
+            stats.already_imported += 1
+        else:
+            pending.append(source_path)
+
+    batch: List[Dict[str, Any]] = []
+    features = feature_index(midi_files_dir)
+
+    def commit():
+        features.add(
+            [record["id"] for record in batch],
+            np.array([record.pop("features") for record in batch], dtype=np.float32)
+        )
+        stats.imported += storage.add_compositions(batch)
+        batch.clear()
+        if on_batch:
+            on_batch(stats)
+
+    def handle(record: Dict[str, Any]):
+        if "error" in record:
+            stats.failed.append(record)
+            return
+        batch.append(record)
+        if len(batch) >= batch_size:
+            commit()
+
+    arguments = [(source_path, midi_files_dir, link) for source_path in pending]
+    if processes <= 1:
+        for args in arguments:
+            handle(import_file(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # Results are consumed as they arrive; chunks keep inter-process overhead low
+            for record in executor.map(import_file, *zip(*arguments), chunksize=64):
+                handle(record)
+    if batch:
+        commit()
+    return stats
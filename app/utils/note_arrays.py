@@ -0,0 +1,239 @@
+import math
+from dataclasses import dataclass, field, replace
+from functools import cached_property
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models.composition import Chord, CompositionData, RenderWindow, ScaleDegreeNote
+from app.utils import harmony
+from app.utils.note_validation import NoteValidator
+from app.utils.smf import parse_time_signature
+
+
+@dataclass
+class StartIndex:
+    """
+    Notes sorted by start time, with the running maximum of their end times
+
+    Notes overlapping a window are found with two binary searches: one on the
+    sorted starts for the window end, one on the running maximum end for the
+    window start.
+    """
+    order: np.ndarray    # note indices in start order
+    start: np.ndarray    # sorted start times
+    max_end: np.ndarray  # running maximum of end times in start order
+
+    @classmethod
+    def build(cls, start: np.ndarray, end: np.ndarray) -> "StartIndex":
+        order = np.argsort(start, kind="stable")
+        return cls(order=order, start=start[order], max_end=np.maximum.accumulate(end[order]))
+
+    def overlapping(self, start: np.ndarray, end: np.ndarray, window_start, window_end) -> np.ndarray:
+        """Indices of notes sounding in [window_start, window_end), in start order"""
+        # Notes before lo all end by window_start; zero-length notes at window_start still count
+        lo = min(
+            int(np.searchsorted(self.max_end, window_start, side="right")),
+            int(np.searchsorted(self.start, window_start, side="left"))
+        )
+        hi = int(np.searchsorted(self.start, window_end, side="left"))
+        candidates = self.order[lo:hi]
+        keep = (end[candidates] > window_start) | (start[candidates] >= window_start)
+        return candidates[keep]
+
+
+def clip_to_window(
+    start: np.ndarray, end: np.ndarray, window_start, window_end
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Clip note times to a window and shift them so the window starts at zero"""
+    return np.maximum(start, window_start) - window_start, np.minimum(end, window_end) - window_start
+
+
+@dataclass
+class TrackArrays:
+    """A track's notes packed into parallel columns"""
+    instrument: str
+    midi_program: int
+    pitch: np.ndarray      # uint8
+    start: np.ndarray      # float64, beats
+    duration: np.ndarray   # float64, beats
+    velocity: np.ndarray   # uint8
+
+    def __len__(self) -> int:
+        return len(self.pitch)
+
+    @property
+    def end(self) -> np.ndarray:
+        return self.start + self.duration
+
+    @cached_property
+    def index(self) -> StartIndex:
+        return StartIndex.build(self.start, self.end)
+
+    def window(self, window_start: float, window_end: float) -> "TrackArrays":
+        """Notes sounding in [window_start, window_end) beats, clipped and shifted to start at zero"""
+        end = self.end
+        selected = self.index.overlapping(self.start, end, window_start, window_end)
+        start, clipped_end = clip_to_window(self.start[selected], end[selected], window_start, window_end)
+        return TrackArrays(
+            instrument=self.instrument,
+            midi_program=self.midi_program,
+            pitch=self.pitch[selected],
+            start=start,
+            duration=clipped_end - start,
+            velocity=self.velocity[selected]
+        )
+
+
+@dataclass
+class PackedSection:
+    name: str
+    bars: int
+    tracks: List[TrackArrays] = field(default_factory=list)
+
+
+@dataclass
+class PackedComposition:
+    """Compact, array-backed counterpart of CompositionData"""
+    title: str
+    tempo: int
+    time_signature: str
+    key: str
+    scale: str
+    length_bars: int
+    sections: List[PackedSection] = field(default_factory=list)
+
+    @property
+    def note_count(self) -> int:
+        return sum(len(track) for section in self.sections for track in section.tracks)
+
+    @property
+    def track_count(self) -> int:
+        return sum(len(section.tracks) for section in self.sections)
+
+    def window(self, window_start: float, window_end: float) -> "PackedComposition":
+        """The part of the composition sounding in [window_start, window_end) beats"""
+        return replace(
+            self,
+            length_bars=max(1, math.ceil((window_end - window_start) / beats_per_bar(self.time_signature))),
+            sections=[
+                PackedSection(
+                    name=section.name,
+                    bars=section.bars,
+                    tracks=[track.window(window_start, window_end) for track in section.tracks]
+                )
+                for section in self.sections
+            ]
+        )
+
+
+def beats_per_bar(time_signature: str) -> float:
+    """Quarter-note beats in one bar of the time signature"""
+    numerator, denominator = parse_time_signature(time_signature)
+    return numerator * 4 / denominator
+
+
+def window_beats(window: RenderWindow, time_signature: str) -> Tuple[float, float]:
+    """Convert a render window to a [start, end) range in beats"""
+    scale = beats_per_bar(time_signature) if window.unit == "bar" else 1.0
+    return window.start * scale, window.end * scale
+
+
+def track_arrays(instrument: str, midi_program: int, pitch, start, duration, velocity) -> TrackArrays:
+    """Build a TrackArrays from any sequences, coercing to the packed dtypes"""
+    return TrackArrays(
+        instrument=instrument,
+        midi_program=midi_program,
+        pitch=np.asarray(pitch, dtype=np.uint8),
+        start=np.asarray(start, dtype=np.float64),
+        duration=np.asarray(duration, dtype=np.float64),
+        velocity=np.asarray(velocity, dtype=np.uint8)
+    )
+
+
+def with_harmony(
+    track: TrackArrays, chords: Sequence[Chord], degrees: Sequence[ScaleDegreeNote], key: str, scale: str
+) -> TrackArrays:
+    """
+    Append the notes of a track's chord events and scale-degree notes to its columns
+
+    Args:
+        track: The track's explicit notes
+        chords: Chord events to expand
+        degrees: Scale-degree notes to resolve
+        key: Key of the composition
+        scale: Scale of the composition
+
+    Returns:
+        The track with the expanded notes after its explicit ones
+    """
+    columns = [(track.pitch, track.start, track.duration, track.velocity)]
+    if chords:
+        columns.append(harmony.chord_notes(
+            [chord.symbol for chord in chords],
+            [chord.octave for chord in chords],
+            [chord.inversion for chord in chords],
+            [chord.voicing for chord in chords],
+            [chord.start_time for chord in chords],
+            [chord.duration for chord in chords],
+            [chord.velocity for chord in chords]
+        ))
+    if degrees:
+        columns.append(harmony.degree_notes(
+            key,
+            scale,
+            [note.degree for note in degrees],
+            [note.octave for note in degrees],
+            [note.accidental for note in degrees],
+            [note.start_time for note in degrees],
+            [note.duration for note in degrees],
+            [note.velocity for note in degrees]
+        ))
+    return track_arrays(track.instrument, track.midi_program, *(np.concatenate(parts) for parts in zip(*columns)))
+
+
+def pack_composition(
+    composition_data: CompositionData, validator: Optional[NoteValidator] = None
+) -> PackedComposition:
+    """
+    Pack validated composition data into per-track arrays
+
+    Args:
+        composition_data: The composition data structure
+        validator: Checks each track's notes, chords and degrees before they are expanded
+
+    Returns:
+        The same composition with notes stored column-wise
+    """
+    packed = PackedComposition(
+        title=composition_data.title,
+        tempo=composition_data.tempo,
+        time_signature=composition_data.time_signature,
+        key=composition_data.key,
+        scale=composition_data.scale,
+        length_bars=composition_data.length_bars
+    )
+    for section_index, section in enumerate(composition_data.sections):
+        packed_section = PackedSection(name=section.name, bars=section.bars)
+        for track_index, track in enumerate(section.tracks):
+            notes = track.notes
+            packed_track = track_arrays(
+                track.instrument,
+                track.midi_program,
+                [note.pitch for note in notes],
+                [note.start_time for note in notes],
+                [note.duration for note in notes],
+                [note.velocity for note in notes]
+            )
+            if validator is not None:
+                loc = ("sections", section_index, "tracks", track_index)
+                validator.check(loc + ("notes",), packed_track.start, packed_track.duration, packed_track.pitch)
+                validator.check_items(loc + ("chords",), track.chords)
+                validator.check_items(loc + ("degrees",), track.degrees)
+            if track.chords or track.degrees:
+                packed_track = with_harmony(
+                    packed_track, track.chords, track.degrees, composition_data.key, composition_data.scale
+                )
+            packed_section.tracks.append(packed_track)
+        packed.sections.append(packed_section)
+    return packed
@@ -0,0 +1,133 @@
+"""
+Columnar storage of a composition's source notes
+
+Each composition is saved as one compressed ``.npz`` archive next to its MIDI
+file: a JSON header with the composition and track metadata, and per track
+the note columns sorted by start time plus a persisted interval index.
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.utils.interval_index import IntervalIndex
+from app.utils.note_arrays import PackedComposition, PackedSection, TrackArrays
+
+FORMAT_VERSION = 1
+_COLUMNS = ("pitch", "start", "duration", "velocity")
+
+
+@dataclass
+class StoredTrack:
+    section: str
+    notes: TrackArrays  # sorted by start
+    end: np.ndarray
+    index: IntervalIndex
+
+    def window(self, window_start: Optional[float], window_end: Optional[float]) -> np.ndarray:
+        """Positions of the notes sounding in the window; open ends are unbounded"""
+        if window_start is None and window_end is None:
+            return np.arange(len(self.notes), dtype=np.int32)
+        return self.index.overlapping(
+            self.notes.start,
+            self.end,
+            -np.inf if window_start is None else window_start,
+            np.inf if window_end is None else window_end
+        )
+
+
+@dataclass
+class StoredNotes:
+    header: Dict[str, Any]
+    tracks: List[StoredTrack]
+    nbytes: int
+
+    def to_packed(self) -> PackedComposition:
+        """Rebuild the packed composition (notes within a track are in start order)"""
+        header = {key: value for key, value in self.header.items() if key not in ("version", "sections")}
+        packed = PackedComposition(**header)
+        tracks = iter(self.tracks)
+        for section in self.header["sections"]:
+            packed.sections.append(PackedSection(
+                name=section["name"],
+                bars=section["bars"],
+                tracks=[next(tracks).notes for _ in section["tracks"]]
+            ))
+        return packed
+
+
+def notes_path_for(file_path: str) -> str:
+    """Path of the note store belonging to a MIDI file"""
+    return os.path.splitext(file_path)[0] + ".notes.npz"
+
+
+def save_notes(path: str, composition: PackedComposition) -> str:
+    """
+    Save a packed composition's notes with their interval indexes
+
+    Args:
+        path: Destination .npz path
+        composition: The composition that was rendered
+
+    Returns:
+        The path written
+    """
+    header = {
+        "version": FORMAT_VERSION,
+        "title": composition.title,
+        "tempo": composition.tempo,
+        "time_signature": composition.time_signature,
+        "key": composition.key,
+        "scale": composition.scale,
+        "length_bars": composition.length_bars,
+        "sections": []
+    }
+    arrays = {}
+    track_number = 0
+    for section in composition.sections:
+        section_header = {"name": section.name, "bars": section.bars, "tracks": []}
+        for track in section.tracks:
+            section_header["tracks"].append({"instrument": track.instrument, "midi_program": track.midi_program})
+            order = np.argsort(track.start, kind="stable")
+            prefix = f"t{track_number}_"
+            for column in _COLUMNS:
+                arrays[prefix + column] = getattr(track, column)[order]
+            start = arrays[prefix + "start"]
+            arrays.update(IntervalIndex.build(start, start + arrays[prefix + "duration"]).to_arrays(prefix + "index_"))
+            track_number += 1
+        header["sections"].append(section_header)
+    arrays["header"] = np.frombuffer(json.dumps(header).encode(), dtype=np.uint8)
+
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    return path
+
+
+def load_notes(path: str) -> StoredNotes:
+    """Load and decompress a note store"""
+    with np.load(path, allow_pickle=False) as archive:
+        arrays = {name: archive[name] for name in archive.files}
+    header = json.loads(arrays.pop("header").tobytes())
+
+    tracks = []
+    track_number = 0
+    for section in header["sections"]:
+        for track in section["tracks"]:
+            prefix = f"t{track_number}_"
+            notes = TrackArrays(
+                instrument=track["instrument"],
+                midi_program=track["midi_program"],
+                **{column: arrays[prefix + column] for column in _COLUMNS}
+            )
+            tracks.append(StoredTrack(
+                section=section["name"],
+                notes=notes,
+                end=notes.end,
+                index=IntervalIndex.from_arrays(arrays, prefix + "index_")
+            ))
+            track_number += 1
+
+    nbytes = sum(array.nbytes for array in arrays.values()) + sum(track.end.nbytes for track in tracks)
+    return StoredNotes(header=header, tracks=tracks, nbytes=nbytes)
@@ -0,0 +1,137 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Semantic error kinds and their messages, in reporting order
+ERROR_MESSAGES = {
+    "non_finite": "Start time and duration must be finite numbers",
+    "negative_start": "Note starts before the beginning of the composition",
+    "non_positive_duration": "Duration must be positive",
+    "past_end": "Note ends after the last bar of the composition",
+    "overlap": "Note overlaps an earlier note of the same pitch",
+}
+
+# Slack for floating-point note ends that land exactly on the last bar line
+_END_TOLERANCE = 1e-9
+
+
+class NoteValidationError(Exception):
+    """Raised with a NoteValidator summary when notes fail the semantic checks"""
+
+    def __init__(self, summary: Dict[str, Any]):
+        super().__init__(summary["msg"])
+        self.summary = summary
+
+
+def _overlaps(pitch: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """Mask of notes starting before an earlier-starting note of the same pitch has ended"""
+    mask = np.zeros(len(pitch), dtype=bool)
+    if len(pitch) < 2:
+        return mask
+    order = np.lexsort((start, pitch))
+    pitch, start, end = pitch[order].astype(np.float64), start[order], end[order]
+    # Offset each pitch's times past every lower pitch's, so one running maximum serves all pitches
+    low = min(start.min(), end.min())
+    span = max(start.max(), end.max()) - low + 1.0
+    offset = (pitch - pitch[0]) * span - low
+    latest_end = np.maximum.accumulate(end + offset)
+    mask[order[1:]] = (pitch[1:] == pitch[:-1]) & (start[1:] + offset[1:] < latest_end[:-1])
+    return mask
+
+
+def _input_value(value: float):
+    """A reported input value; NaN and infinities are not valid JSON, so they are given as strings"""
+    return float(value) if np.isfinite(value) else str(float(value))
+
+
+class NoteValidator:
+    """
+    Array-wise semantic checks of note columns, with a capped, indexed summary
+
+    Each checked column set is tested as a whole for negative starts,
+    non-positive durations, notes ending past the composition and optionally
+    overlapping notes of the same pitch. All errors are counted per kind, but
+    only the first max_errors are reported with their positions.
+    """
+
+    def __init__(
+        self,
+        length_beats: float,
+        check_overlaps: bool = False,
+        max_errors: int = 20,
+        loc: Tuple[Any, ...] = ()
+    ):
+        self.length_beats = length_beats
+        self.check_overlaps = check_overlaps
+        self.max_errors = max_errors
+        self.loc = loc
+        self.counts: Dict[str, int] = {kind: 0 for kind in ERROR_MESSAGES}
+        self.errors: List[Dict[str, Any]] = []
+
+    def check(self, loc: Tuple[Any, ...], start, duration, pitch=None):
+        """
+        Check one list of notes
+
+        Args:
+            loc: Location of the list, e.g. ("sections", 0, "tracks", 1, "notes")
+            start: Start times in beats
+            duration: Durations in beats
+            pitch: Pitches; overlaps are only checked when given
+        """
+        start = np.asarray(start, dtype=np.float64)
+        duration = np.asarray(duration, dtype=np.float64)
+        if not len(start):
+            return
+        end = start + duration
+        # NaN compares False with everything, so non-finite notes get their own kind
+        finite = np.isfinite(start) & np.isfinite(duration)
+        masks = {
+            "non_finite": ~finite,
+            "negative_start": finite & (start < 0),
+            "non_positive_duration": finite & ~(duration > 0),
+            "past_end": finite & (end > self.length_beats + _END_TOLERANCE),
+        }
+        if self.check_overlaps and pitch is not None:
+            masks["overlap"] = np.zeros(len(start), dtype=bool)
+            kept = np.flatnonzero(finite)
+            masks["overlap"][kept] = _overlaps(np.asarray(pitch)[kept], start[kept], end[kept])
+
+        remaining = self.max_errors - len(self.errors)
+        found = []
+        for kind, mask in masks.items():
+            indices = np.flatnonzero(mask)
+            self.counts[kind] += len(indices)
+            found.extend((int(index), kind) for index in indices[:remaining])
+        for index, kind in sorted(found)[:remaining]:
+            self.errors.append({
+                "type": kind,
+                "loc": self.loc + tuple(loc) + (index,),
+                "msg": ERROR_MESSAGES[kind],
+                "input": {"start_time": _input_value(start[index]), "duration": _input_value(duration[index])}
+            })
+
+    def check_items(self, loc: Tuple[Any, ...], items: Sequence[Any]):
+        """Check chord events or scale-degree notes by their start times and durations"""
+        if items:
+            self.check(loc, [item.start_time for item in items], [item.duration for item in items])
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """Error counts per kind and the first positions, or None if every note passed"""
+        total = self.total
+        if not total:
+            return None
+        return {
+            "msg": f"{total} semantic error{'s' if total != 1 else ''} in composition notes",
+            "counts": {kind: count for kind, count in self.counts.items() if count},
+            "errors": self.errors,
+            "truncated": total > len(self.errors)
+        }
+
+    def raise_if_invalid(self):
+        summary = self.summary()
+        if summary is not None:
+            raise NoteValidationError(summary)
@@ -0,0 +1,109 @@
+import io
+from typing import NamedTuple
+
+import numpy as np
+
+from app.utils import smf
+from app.utils.note_store import StoredNotes
+
+# Output dtypes; integer rolls are clipped to their range, bool rolls mark sounding cells
+DTYPES = ("uint8", "int16", "float32", "float64", "bool")
+
+
+class RollNotes(NamedTuple):
+    """Notes to draw, with times in seconds"""
+    pitch: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    velocity: np.ndarray
+
+
+def stored_roll_notes(stored: StoredNotes) -> RollNotes:
+    """
+    Notes of a note store, snapped to the tick grid of the MIDI file
+
+    Times in beats are rounded to ticks the way the file was encoded and
+    converted to seconds, so the roll matches one computed from the file itself.
+    """
+    tracks = [track.notes for track in stored.tracks]
+    tempo = stored.header["tempo"]
+    # Ticks are read back at the tempo written to the file, rounded to whole microseconds
+    scale = smf.seconds_per_tick(smf.microseconds_per_beat(tempo))
+    start = np.concatenate([track.start for track in tracks]) if tracks else np.empty(0)
+    end = np.concatenate([track.end for track in tracks]) if tracks else np.empty(0)
+    return RollNotes(
+        pitch=np.concatenate([track.pitch for track in tracks]) if tracks else np.empty(0, dtype=np.uint8),
+        start=smf.beats_to_ticks(start) * scale,
+        end=smf.beats_to_ticks(end) * scale,
+        velocity=np.concatenate([track.velocity for track in tracks]) if tracks else np.empty(0, dtype=np.uint8)
+    )
+
+
+def decoded_roll_notes(decoded: smf.DecodedMidi) -> RollNotes:
+    """Notes of a decoded MIDI file, timed by its tempo map; the drum channel is left out"""
+    tracks = [track for track in decoded.tracks if track.channel != 9]
+    if not tracks:
+        empty = np.empty(0)
+        return RollNotes(empty.astype(np.uint8), empty, empty, empty.astype(np.uint8))
+    return RollNotes(
+        pitch=np.concatenate([track.pitch for track in tracks]),
+        start=decoded.ticks_to_seconds(np.concatenate([track.start_ticks for track in tracks])),
+        end=decoded.ticks_to_seconds(np.concatenate([track.end_ticks for track in tracks])),
+        velocity=np.concatenate([track.velocity for track in tracks])
+    )
+
+
+def frame_count(notes: RollNotes, fs: float) -> int:
+    """Number of frames (columns) in the roll of these notes"""
+    return int(fs * notes.end.max()) if len(notes.end) else 0
+
+
+def piano_roll(notes: RollNotes, fs: float, dtype: str = "float64") -> np.ndarray:
+    """
+    Render notes as a (128, frames) matrix of summed velocities
+
+    Like pretty_midi's ``get_piano_roll``, there are int(fs * end) frames, a
+    note covers frames int(start * fs) up to int(end * fs) and overlapping
+    notes add up. Instead
+    of one slice assignment per note, +velocity/-velocity steps are scattered
+    into a difference matrix and integrated with one cumulative sum.
+
+    Args:
+        notes: The notes to draw
+        fs: Frames per second
+        dtype: One of DTYPES
+
+    Returns:
+        The piano roll
+    """
+    frames = frame_count(notes, fs)
+    steps = np.zeros((128, frames + 1), dtype=np.int32)
+    first = (notes.start * fs).astype(np.int64)
+    last = np.minimum((notes.end * fs).astype(np.int64), frames)
+    drawn = last > first
+    pitch = notes.pitch[drawn].astype(np.int64)
+    velocity = notes.velocity[drawn].astype(np.int32)
+    np.add.at(steps, (pitch, first[drawn]), velocity)
+    np.add.at(steps, (pitch, last[drawn]), -velocity)
+    roll = np.cumsum(steps[:, :frames], axis=1, dtype=np.int32)
+
+    if dtype == "bool":
+        return roll > 0
+    if dtype in ("uint8", "int16"):
+        limits = np.iinfo(dtype)
+        return np.clip(roll, limits.min, limits.max).astype(dtype)
+    return roll.astype(dtype)
+
+
+def npy_bytes(roll: np.ndarray) -> bytes:
+    """Serialize an array in .npy format"""
+    buffer = io.BytesIO()
+    np.save(buffer, roll)
+    return buffer.getvalue()
+
+
+def npz_bytes(roll: np.ndarray, fs: float) -> bytes:
+    """Serialize a roll and its frame rate as a compressed .npz archive"""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, piano_roll=roll, fs=np.float64(fs))
+    return buffer.getvalue()
@@ -0,0 +1,251 @@
+import fcntl
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Layout of a feature vector
+PITCH_CLASSES = 12
+INTERVAL_BINS = 13   # absolute melodic intervals 0-11, and an octave or more
+ONSET_BINS = 4       # onsets on the beat, on eighths, on sixteenths, elsewhere
+SCALARS = 3          # note density, mean pitch, pitch range
+DIMENSIONS = PITCH_CLASSES + INTERVAL_BINS + ONSET_BINS + SCALARS
+
+# Rows scored per step of a scan, bounding temporary memory
+SCAN_BLOCK = 65536
+
+
+def _normalized(histogram: np.ndarray) -> np.ndarray:
+    total = histogram.sum()
+    return histogram / total if total > 0 else histogram
+
+
+def feature_vector(tracks: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> np.ndarray:
+    """
+    Compact description of a composition's pitch content and rhythm
+
+    The vector concatenates a duration-weighted pitch-class profile, a
+    histogram of melodic intervals between successive onsets within tracks, a
+    histogram of onset positions within the beat, and log note density, mean
+    pitch and pitch range. It is scaled to unit length, so the dot product of
+    two vectors is their cosine similarity.
+
+    Args:
+        tracks: (pitch, start, duration) columns per track, times in beats
+
+    Returns:
+        float32 vector of DIMENSIONS values
+    """
+    pitches, starts, durations, intervals = [], [], [], []
+    for pitch, start, duration in tracks:
+        if not len(pitch):
+            continue
+        order = np.argsort(start, kind="stable")
+        pitch = np.asarray(pitch, dtype=np.int64)[order]
+        intervals.append(np.abs(np.diff(pitch)))
+        pitches.append(pitch)
+        starts.append(np.asarray(start, dtype=np.float64)[order])
+        durations.append(np.asarray(duration, dtype=np.float64)[order])
+
+    vector = np.zeros(DIMENSIONS, dtype=np.float64)
+    if not pitches:
+        return vector.astype(np.float32)
+    pitch, start, duration = np.concatenate(pitches), np.concatenate(starts), np.concatenate(durations)
+    interval = np.minimum(np.concatenate(intervals), INTERVAL_BINS - 1)
+
+    # Onsets are snapped to sixteenths before classifying their position in the beat
+    sixteenth = np.rint(start * 4).astype(np.int64) % 4
+    on_grid = np.abs(start * 4 - np.rint(start * 4)) < 1e-3
+    onset_bin = np.where(on_grid, np.array([0, 2, 1, 2])[sixteenth], 3)
+
+    length = max(float((start + duration).max()), 1.0)
+    parts = [
+        _normalized(np.bincount(pitch % 12, weights=np.maximum(duration, 0), minlength=PITCH_CLASSES)),
+        _normalized(np.bincount(interval, minlength=INTERVAL_BINS).astype(np.float64)),
+        _normalized(np.bincount(onset_bin, minlength=ONSET_BINS).astype(np.float64)),
+        [np.log1p(len(pitch) / length) / 4, pitch.mean() / 127, (pitch.max() - pitch.min()) / 127]
+    ]
+    vector = np.concatenate(parts)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm > 0 else vector).astype(np.float32)
+
+
+def top_k(matrix: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact nearest neighbours by dot product, scanning the matrix in blocks
+
+    Each block is scored for every query with one matrix product and only
+    its best k rows per query are kept, so memory stays bounded however many
+    rows there are.
+
+    Args:
+        matrix: (rows, DIMENSIONS) vectors, e.g. a memory map
+        queries: (queries, DIMENSIONS) vectors
+        k: Neighbours per query
+
+    Returns:
+        (queries, k') row indices and scores, best first, with k' = min(k, rows)
+    """
+    queries = np.atleast_2d(queries)
+    best_rows = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for first in range(0, len(matrix), SCAN_BLOCK):
+        scores = queries @ np.asarray(matrix[first:first + SCAN_BLOCK]).T
+        rows = np.broadcast_to(np.arange(first, first + scores.shape[1]), scores.shape)
+        scores = np.concatenate((best_scores, scores), axis=1)
+        rows = np.concatenate((best_rows, rows), axis=1)
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        best_scores, best_rows = scores, rows
+    order = np.argsort(-best_scores, axis=1, kind="stable")
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+class FeatureIndex:
+    """
+    Append-only feature matrix of a library, read through a memory map
+
+    Vectors are appended as raw float32 rows to ``features.f32`` and their
+    composition IDs as lines to ``features.ids``. A re-added ID shadows its
+    earlier row. Appends hold a lock on ``features.lock`` and first load rows
+    appended by other processes, so row numbers stay in step with the files.
+    Searches load them too, once the IDs file has grown.
+    """
+
+    def __init__(self, directory: str):
+        self._matrix_path = os.path.join(directory, "features.f32")
+        self._ids_path = os.path.join(directory, "features.ids")
+        self._lock_path = os.path.join(directory, "features.lock")
+        self._lock = threading.Lock()
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._ids_size = 0
+        with self._lock, self._file_lock():
+            self._load()
+
+    def _file_lock(self):
+        lock = open(self._lock_path, "a")
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return lock  # Closing the file releases the lock
+
+    def _load(self):
+        if not os.path.exists(self._ids_path):
+            return
+        with open(self._ids_path) as f:
+            text = f.read()
+        ids = text.splitlines()
+        if text and not text.endswith("\n"):
+            ids.pop()  # Torn write
+        row_count = 0
+        if os.path.exists(self._matrix_path):
+            row_count = os.path.getsize(self._matrix_path) // (4 * DIMENSIONS)
+
+        self._ids = ids[:row_count]
+        self._rows = {composition_id: row for row, composition_id in enumerate(self._ids)}
+        # Drop rows or IDs an interrupted append left without their counterpart
+        if len(self._ids) != row_count or len(self._ids) != len(text.splitlines()):
+            with open(self._matrix_path, "r+b") as f:
+                f.truncate(len(self._ids) * 4 * DIMENSIONS)
+            with open(self._ids_path, "w") as f:
+                f.write("".join(f"{composition_id}\n" for composition_id in self._ids))
+        self._ids_size = os.path.getsize(self._ids_path)
+        self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _refresh(self):
+        """Load rows other processes, such as an import, appended since the last load"""
+        try:
+            ids_size = os.path.getsize(self._ids_path)
+        except FileNotFoundError:
+            return
+        if ids_size != self._ids_size:
+            with self._lock, self._file_lock():
+                self._load()
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """Append vectors, one row per composition ID"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), DIMENSIONS)
+        if not len(ids):
+            return
+        with self._lock, self._file_lock():
+            if os.path.exists(self._ids_path) and os.path.getsize(self._ids_path) != self._ids_size:
+                self._load()
+            with open(self._matrix_path, "ab") as f:
+                f.write(vectors.tobytes())
+            with open(self._ids_path, "a") as f:
+                f.write("".join(f"{composition_id}\n" for composition_id in ids))
+            self._ids_size = os.path.getsize(self._ids_path)
+            for composition_id in ids:
+                self._rows[composition_id] = len(self._ids)
+                self._ids.append(composition_id)
+            self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        """The feature matrix, memory-mapped"""
+        with self._lock:
+            if self._matrix is None:
+                if not self._ids:
+                    self._matrix = np.empty((0, DIMENSIONS), dtype=np.float32)
+                else:
+                    self._matrix = np.memmap(
+                        self._matrix_path, dtype=np.float32, mode="r", shape=(len(self._ids), DIMENSIONS)
+                    )
+            return self._matrix
+
+    def vector(self, composition_id: str) -> Optional[np.ndarray]:
+        row = self._rows.get(composition_id)
+        return None if row is None else np.array(self.matrix()[row])
+
+    def similar(
+        self, composition_id: str, k: int, exists: Optional[Callable[[str], bool]] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        The k compositions most similar to one in the index
+
+        Args:
+            composition_id: The composition to compare against
+            k: Number of results
+            exists: Predicate filtering out removed compositions
+
+        Returns:
+            (composition ID, cosine similarity) pairs, most similar first
+        """
+        self._refresh()
+        query = self.vector(composition_id)
+        if query is None:
+            raise KeyError(composition_id)
+        matrix = self.matrix()
+        results: List[Tuple[str, float]] = []
+        # Shadowed rows and removed compositions are skipped; widen the search until enough remain
+        wanted = k + 1
+        while True:
+            rows, scores = top_k(matrix, query, min(wanted, len(matrix)))
+            results = [
+                (self._ids[row], float(score))
+                for row, score in zip(rows[0].tolist(), scores[0].tolist())
+                if self._ids[row] != composition_id and self._rows[self._ids[row]] == row
+                and (exists is None or exists(self._ids[row]))
+            ]
+            if len(results) >= k or wanted >= len(matrix):
+                return results[:k]
+            wanted *= 4
+
+
+_indexes: Dict[str, FeatureIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def feature_index(directory) -> FeatureIndex:
+    """The shared feature index of a library directory"""
+    directory = str(directory)
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = _indexes[directory] = FeatureIndex(directory)
+        return index
@@ -0,0 +1,506 @@
+"""
+Vectorized Standard MIDI File (SMF) encoding
+
+Note times are quarter-note beats. For a single tempo, files are the same
+bytes pretty_midi's ``PrettyMIDI.write`` produces for the notes timed in
+seconds (220 ticks per quarter note, running status, note-offs encoded as
+velocity-0 note-ons), but note tracks are built with NumPy instead of one
+mido message object per event. Track chunks are self-contained, so they can be
+cached, spliced and concatenated without re-encoding.
+"""
+import io
+import struct
+from collections import defaultdict, deque
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import mido
+import numpy as np
+
+# Ticks per quarter note, matching pretty_midi's default resolution
+RESOLUTION = 220
+
+# pretty_midi assigns melodic channels round-robin, skipping the drum channel
+CHANNELS = [channel for channel in range(16) if channel != 9]
+
+# End-of-track meta event, one tick after the last event
+END_OF_TRACK = b"\x01\xff\x2f\x00"
+
+
+def tick_scale(tempo: float) -> float:
+    """Seconds per tick at the given tempo"""
+    return 60.0 / (tempo * RESOLUTION)
+
+
+def beats_to_ticks(beats: np.ndarray, resolution: int = RESOLUTION) -> np.ndarray:
+    """Convert times in quarter-note beats to absolute ticks"""
+    ticks = np.rint(np.asarray(beats, dtype=np.float64) * resolution).astype(np.int64)
+    return np.maximum(ticks, 0)
+
+
+def parse_time_signature(time_signature: str) -> Tuple[int, int]:
+    """Parse 'N/D' into a MIDI-representable time signature, defaulting to 4/4"""
+    numerator, _, denominator = time_signature.partition("/")
+    try:
+        numerator, denominator = int(numerator), int(denominator)
+    except ValueError:
+        return 4, 4
+    if not 0 < numerator < 256 or denominator <= 0 or denominator & (denominator - 1):
+        return 4, 4
+    return numerator, denominator
+
+
+def encode_vlq(value: int) -> bytes:
+    """Encode a single variable-length quantity"""
+    data = [value & 0x7F]
+    value >>= 7
+    while value:
+        data.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(data))
+
+
+def vlq_lengths(values: np.ndarray) -> np.ndarray:
+    """Number of bytes each value takes as a variable-length quantity"""
+    return (
+        1
+        + (values >= 1 << 7).astype(np.int64)
+        + (values >= 1 << 14)
+        + (values >= 1 << 21)
+        + (values >= 1 << 28)
+    )
+
+
+def write_vlq(buffer: np.ndarray, offsets: np.ndarray, values: np.ndarray, lengths: np.ndarray):
+    """Write variable-length quantities into buffer at the given offsets"""
+    for k in range(int(lengths.max(initial=1))):
+        # Byte k of each value that is at least k + 1 bytes long
+        mask = lengths > k
+        shift = 7 * (lengths[mask] - 1 - k)
+        byte = (values[mask] >> shift) & 0x7F
+        byte |= np.where(k < lengths[mask] - 1, 0x80, 0)
+        buffer[offsets[mask] + k] = byte
+
+
+def header_chunk(track_count: int, resolution: int = RESOLUTION) -> bytes:
+    """MThd chunk for a format 1 file"""
+    return b"MThd" + struct.pack(">IHHH", 6, 1, track_count, resolution)
+
+
+def track_chunk_header(size: int) -> bytes:
+    """MTrk chunk header for a chunk of ``size`` data bytes"""
+    return b"MTrk" + struct.pack(">I", size)
+
+
+def track_chunk(data: bytes) -> bytes:
+    """Wrap encoded events in an MTrk chunk"""
+    return track_chunk_header(len(data)) + data
+
+
+def microseconds_per_beat(tempo: float) -> int:
+    """The set_tempo value written for a tempo in beats per minute"""
+    return int(6e7 / (60.0 / (tick_scale(tempo) * RESOLUTION)))
+
+
+def seconds_per_tick(microseconds: float, resolution: int = RESOLUTION) -> float:
+    """Seconds per tick under a set_tempo value, computed the way pretty_midi reads it"""
+    return 60.0 / (6e7 / microseconds * resolution)
+
+
+def tempo_track(tempo: float, time_signature: Tuple[int, int] = (4, 4)) -> bytes:
+    """Track 0 with the tempo and time signature, as an MTrk chunk"""
+    return meta_track(microseconds_per_beat(tempo), time_signature)
+
+
+def meta_track(microseconds_per_beat: int, time_signature: Tuple[int, int] = (4, 4)) -> bytes:
+    """Track 0 with a tempo given in microseconds per beat, as an MTrk chunk"""
+    numerator, denominator = time_signature
+    data = (
+        b"\x00\xff\x51\x03" + microseconds_per_beat.to_bytes(3, "big")
+        + b"\x00\xff\x58\x04" + bytes([numerator, denominator.bit_length() - 1, 24, 8])
+        + END_OF_TRACK
+    )
+    return track_chunk(data)
+
+
+def note_events(
+    pitch: np.ndarray, start_ticks: np.ndarray, end_ticks: np.ndarray, velocity: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the sorted note-on/note-off event columns of a track
+
+    Returns:
+        (ticks, pitches, velocities) of all events in file order; note-offs
+        are velocity-0 note-ons and precede note-ons of the same pitch and tick
+    """
+    count = len(pitch)
+    ticks = np.empty(2 * count, dtype=np.int64)
+    pitches = np.empty(2 * count, dtype=np.int64)
+    velocities = np.zeros(2 * count, dtype=np.int64)
+    # Interleave on/off per note so equal keys keep insertion order
+    ticks[0::2] = start_ticks
+    ticks[1::2] = end_ticks
+    pitches[0::2] = pitch
+    pitches[1::2] = pitch
+    velocities[0::2] = velocity
+
+    order = np.lexsort((velocities, pitches, ticks))
+    return ticks[order], pitches[order], velocities[order]
+
+
+def encode_running_events(
+    ticks: np.ndarray, pitches: np.ndarray, velocities: np.ndarray, previous_tick: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode sorted note events as running-status messages (no status bytes)
+
+    Returns:
+        (buffer, sizes): the encoded bytes and the byte size of each event
+    """
+    deltas = np.diff(ticks, prepend=previous_tick)
+    lengths = vlq_lengths(deltas)
+    sizes = lengths + 2
+    ends = np.cumsum(sizes)
+    offsets = ends - sizes
+
+    buffer = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+    write_vlq(buffer, offsets, deltas, lengths)
+    data_offsets = offsets + lengths
+    buffer[data_offsets] = pitches
+    buffer[data_offsets + 1] = velocities
+    return buffer, sizes
+
+
+def encode_note_events(
+    ticks: np.ndarray, pitches: np.ndarray, velocities: np.ndarray, channel: int, previous_tick: int = 0
+) -> bytes:
+    """
+    Encode sorted note events with running status
+
+    The first event carries the note-on status byte; the rest rely on running status.
+    """
+    if not len(ticks):
+        return b""
+    buffer, _ = encode_running_events(ticks, pitches, velocities, previous_tick)
+    return with_status(buffer, int(ticks[0]) - previous_tick, channel)
+
+
+def with_status(events, first_delta: int, channel: int) -> bytes:
+    """Insert the note-on status byte after the first event's delta time"""
+    split = len(encode_vlq(first_delta))
+    return bytes(events[:split]) + bytes([0x90 | channel]) + bytes(events[split:])
+
+
+def track_header(name: str, program: int, channel: int) -> bytes:
+    """Track name and program change events that open an instrument track"""
+    data = b""
+    if name:
+        encoded_name = name.encode("latin1", errors="replace")
+        data += b"\x00\xff\x03" + encode_vlq(len(encoded_name)) + encoded_name
+    return data + bytes([0x00, 0xC0 | channel, program])
+
+
+def note_track(
+    name: str,
+    program: int,
+    channel: int,
+    pitch: np.ndarray,
+    start_ticks: np.ndarray,
+    end_ticks: np.ndarray,
+    velocity: np.ndarray
+) -> bytes:
+    """Encode an instrument track as an MTrk chunk"""
+    ticks, pitches, velocities = note_events(pitch, start_ticks, end_ticks, velocity)
+    return track_chunk(note_track_data(name, program, channel, ticks, pitches, velocities))
+
+
+def note_track_data(
+    name: str, program: int, channel: int, ticks: np.ndarray, pitches: np.ndarray, velocities: np.ndarray
+) -> bytes:
+    """Encode the events of an instrument track (without the chunk header)"""
+    return (
+        track_header(name, program, channel)
+        + encode_note_events(ticks, pitches, velocities, channel)
+        + END_OF_TRACK
+    )
+
+
+def midi_file(track_chunks: Sequence[bytes], resolution: int = RESOLUTION) -> bytes:
+    """Assemble a format 1 file from already encoded track chunks"""
+    return header_chunk(len(track_chunks), resolution) + b"".join(track_chunks)
+
+
+class NoteTrack(NamedTuple):
+    """Notes of a decoded track, with times in ticks"""
+    name: str
+    program: int
+    channel: int
+    pitch: np.ndarray
+    start_ticks: np.ndarray
+    end_ticks: np.ndarray
+    velocity: np.ndarray
+
+
+class DecodedMidi(NamedTuple):
+    resolution: int
+    microseconds_per_beat: int
+    time_signature: Tuple[int, int]
+    tracks: List[NoteTrack]
+    tempo_changes: List[Tuple[int, int]] = []  # (tick, microseconds per beat), in tick order
+
+    def ticks_to_seconds(self, ticks) -> np.ndarray:
+        """Convert ticks to playback seconds, following every tempo change"""
+        ticks = np.asarray(ticks, dtype=np.float64)
+        changes = self.tempo_changes or [(0, self.microseconds_per_beat)]
+        if changes[0][0] != 0:
+            changes = [(0, 500000)] + list(changes)
+        change_ticks = np.array([tick for tick, _ in changes], dtype=np.float64)
+        scales = np.array([seconds_per_tick(tempo, self.resolution) for _, tempo in changes])
+        # Seconds elapsed at each tempo change
+        change_seconds = np.concatenate(([0.0], np.cumsum(np.diff(change_ticks) * scales[:-1])))
+        segment = np.searchsorted(change_ticks, ticks, side="right") - 1
+        return change_seconds[segment] + (ticks - change_ticks[segment]) * scales[segment]
+
+
+def read_midi(data: bytes) -> DecodedMidi:
+    """
+    Decode the notes of a MIDI file, track by track
+
+    Note-offs close the earliest open note of the same pitch and channel; notes
+    that are never closed are dropped. Only the first time signature is kept.
+    """
+    midi = mido.MidiFile(file=io.BytesIO(data))
+    microseconds_per_beat = None
+    time_signature = None
+    tempo_changes = []
+    tracks = []
+    for track in midi.tracks:
+        tick = 0
+        name = ""
+        program = 0
+        channel = None
+        open_notes = defaultdict(deque)
+        columns = ([], [], [], [])
+        for message in track:
+            tick += message.time
+            kind = message.type
+            if kind == "note_on" and message.velocity:
+                open_notes[message.channel, message.note].append((tick, message.velocity))
+                if channel is None:
+                    channel = message.channel
+            elif kind == "note_off" or kind == "note_on":
+                pending = open_notes.get((message.channel, message.note))
+                if pending:
+                    start, velocity = pending.popleft()
+                    for column, value in zip(columns, (message.note, start, tick, velocity)):
+                        column.append(value)
+            elif kind == "program_change":
+                program = message.program
+                if channel is None:
+                    channel = message.channel
+            elif kind == "track_name" and not name:
+                name = message.name
+            elif kind == "set_tempo":
+                tempo_changes.append((tick, message.tempo))
+                if microseconds_per_beat is None:
+                    microseconds_per_beat = message.tempo
+            elif kind == "time_signature" and time_signature is None:
+                time_signature = (message.numerator, message.denominator)
+        if columns[0]:
+            tracks.append(NoteTrack(
+                name=name,
+                program=program,
+                channel=channel or 0,
+                pitch=np.asarray(columns[0], dtype=np.uint8),
+                start_ticks=np.asarray(columns[1], dtype=np.int64),
+                end_ticks=np.asarray(columns[2], dtype=np.int64),
+                velocity=np.asarray(columns[3], dtype=np.uint8)
+            ))
+    return DecodedMidi(
+        resolution=midi.ticks_per_beat,
+        microseconds_per_beat=microseconds_per_beat or 500000,
+        time_signature=time_signature or (4, 4),
+        tracks=tracks,
+        tempo_changes=sorted(tempo_changes)
+    )
+
+
+class EncodedNoteTrack(NamedTuple):
+    """
+    A note track in the layout this module writes, kept in encoded form
+
+    ``events`` holds the note events as running-status messages without any
+    status byte, so they can be spliced after other events on any channel.
+    """
+    name: str
+    program: int
+    events: bytes
+    first_delta: int
+    ticks: np.ndarray       # absolute tick of each event
+    pitches: np.ndarray
+    velocities: np.ndarray
+
+    @property
+    def end_tick(self) -> int:
+        return int(self.ticks[-1]) if len(self.ticks) else 0
+
+
+def read_vlq(data: bytes, position: int) -> Tuple[int, int]:
+    """Read a variable-length quantity, returning it and the position after it"""
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, position
+
+
+def split_chunks(data: bytes) -> Tuple[int, List[bytes]]:
+    """
+    Split a format 0/1 file into its track chunk payloads
+
+    Returns:
+        (resolution, track data) with chunk headers removed
+
+    Raises:
+        ValueError: If the file is not a metrical-time Standard MIDI File
+    """
+    if data[:4] != b"MThd" or len(data) < 14:
+        raise ValueError("Not a Standard MIDI File")
+    header_length, _, track_count, resolution = struct.unpack(">IHHH", data[4:14])
+    if resolution & 0x8000:
+        raise ValueError("SMPTE time division is not supported")
+    position = 8 + header_length
+    tracks = []
+    while position + 8 <= len(data) and len(tracks) < track_count:
+        kind, length = data[position:position + 4], struct.unpack(">I", data[position + 4:position + 8])[0]
+        if kind == b"MTrk":
+            tracks.append(data[position + 8:position + 8 + length])
+        position += 8 + length
+    return resolution, tracks
+
+
+def parse_meta_track(data: bytes) -> Optional[Tuple[int, Tuple[int, int]]]:
+    """
+    Read the tempo and time signature from a track holding only meta events
+
+    Returns:
+        (microseconds per beat, time signature), or None if the track has other
+        events or more than one tempo or time signature
+    """
+    microseconds_per_beat = time_signature = None
+    position = 0
+    try:
+        while position < len(data):
+            delta, position = read_vlq(data, position)
+            if data[position] != 0xFF:
+                return None
+            kind = data[position + 1]
+            length, position = read_vlq(data, position + 2)
+            payload = data[position:position + length]
+            position += length
+            if kind == 0x2F:
+                break
+            if delta and kind in (0x51, 0x58):
+                return None
+            if kind == 0x51:
+                if microseconds_per_beat is not None:
+                    return None
+                microseconds_per_beat = int.from_bytes(payload, "big")
+            elif kind == 0x58:
+                if time_signature is not None:
+                    return None
+                time_signature = (payload[0], 2 ** payload[1])
+    except IndexError:
+        return None
+    return microseconds_per_beat or 500000, time_signature or (4, 4)
+
+
+def parse_note_track(data: bytes) -> Optional[EncodedNoteTrack]:
+    """
+    Recognise a note track written by ``note_track_data`` and decode its events
+
+    The event deltas are decoded with array operations: in running-status note
+    data every byte below 0x80 is either the last byte of a delta or a data
+    byte, so they come in (delta end, pitch, velocity) triples.
+
+    Returns:
+        The track, or None if it uses any other layout (other events, status
+        changes, meta events between notes)
+    """
+    position = 0
+    name = ""
+    if data.startswith(b"\x00\xff\x03"):
+        length, position = read_vlq(data, 3)
+        name = data[position:position + length].decode("latin1")
+        position += length
+    if len(data) < position + 3 or data[position] != 0 or data[position + 1] & 0xF0 != 0xC0:
+        return None
+    channel, program = data[position + 1] & 0x0F, data[position + 2]
+    position += 3
+    if not data.endswith(b"\xff\x2f\x00"):
+        return None
+
+    body = np.frombuffer(data, dtype=np.uint8)[position:len(data) - 3]
+    # Drop the end-of-track delta: the high bytes after the last low byte before it
+    low = np.flatnonzero(body < 0x80)
+    if not len(low):
+        return None
+    body = body[:low[-2] + 1] if len(low) > 1 else body[:0]
+    low = low[:-1]
+    if not len(body):
+        return EncodedNoteTrack(name, program, b"", 0, np.empty(0, np.int64), np.empty(0, np.uint8), np.empty(0, np.uint8))
+
+    # The first event carries the only status byte
+    first_end = int(low[0])
+    if first_end + 1 >= len(body) or body[first_end + 1] != 0x90 | channel:
+        return None
+    body = np.delete(body, first_end + 1)
+    low = np.flatnonzero(body < 0x80)
+
+    if len(low) % 3:
+        return None
+    delta_ends, pitch_at, velocity_at = low[0::3], low[1::3], low[2::3]
+    if not (np.array_equal(pitch_at, delta_ends + 1) and np.array_equal(velocity_at, delta_ends + 2)):
+        return None
+    delta_starts = np.concatenate(([0], velocity_at[:-1] + 1))
+    lengths = delta_ends - delta_starts + 1
+    if lengths.max() > 4:
+        return None
+    deltas = np.zeros(len(delta_ends), dtype=np.int64)
+    for k in range(int(lengths.max())):
+        mask = lengths > k
+        deltas[mask] = (deltas[mask] << 7) | (body[delta_starts[mask] + k] & 0x7F)
+
+    return EncodedNoteTrack(
+        name=name,
+        program=program,
+        events=body.tobytes(),
+        first_delta=int(deltas[0]),
+        ticks=np.cumsum(deltas),
+        pitches=body[pitch_at],
+        velocities=body[velocity_at]
+    )
+
+
+def conductor_track(changes: Sequence[Tuple[int, int, Tuple[int, int]]]) -> bytes:
+    """
+    Track 0 with a tempo map, as an MTrk chunk
+
+    Args:
+        changes: (tick, microseconds per beat, time signature) in tick order; only
+            values that differ from the previous change are written
+    """
+    data = bytearray()
+    previous_tick = 0
+    tempo = signature = None
+    for tick, microseconds_per_beat, time_signature in changes:
+        if microseconds_per_beat != tempo:
+            data += encode_vlq(tick - previous_tick) + b"\xff\x51\x03" + microseconds_per_beat.to_bytes(3, "big")
+            previous_tick, tempo = tick, microseconds_per_beat
+        if time_signature != signature:
+            numerator, denominator = time_signature
+            data += encode_vlq(tick - previous_tick) + b"\xff\x58\x04"
+            data += bytes([numerator, denominator.bit_length() - 1, 24, 8])
+            previous_tick, signature = tick, time_signature
+    return track_chunk(bytes(data) + END_OF_TRACK)
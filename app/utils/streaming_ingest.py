@@ -0,0 +1,342 @@
+import asyncio
+import math
+from array import array
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+import ijson
+from pydantic import ValidationError
+
+from app.core.admission import RequestTooLarge
+from app.models.composition import (
+    Chord, CompositionData, HumanizeOptions, QuantizeOptions, RenderWindow, ScaleDegreeNote, Section, Track
+)
+from app.utils import harmony
+from app.utils.groove import apply_render_options
+from app.utils.note_arrays import (
+    PackedComposition, PackedSection, TrackArrays, beats_per_bar, track_arrays, with_harmony
+)
+from app.utils.note_validation import NoteValidator
+
+_COMPOSITION = "composition"
+# Top-level render options, applied after parsing
+_OPTIONS = {"window": RenderWindow, "quantize": QuantizeOptions, "humanize": HumanizeOptions}
+_SECTION = "composition.sections.item"
+_TRACK = _SECTION + ".tracks.item"
+_NOTE = _TRACK + ".notes.item"
+_NOTE_FIELDS = ("pitch", "start_time", "duration", "velocity")
+_NOTE_FIELD_INDEX = {f"{_NOTE}.{name}": index for index, name in enumerate(_NOTE_FIELDS)}
+# Harmonic shorthand items, validated with their models; they are far fewer than notes
+_HARMONY = {_TRACK + ".chords.item": ("chords", Chord), _TRACK + ".degrees.item": ("degrees", ScaleDegreeNote)}
+_SCALAR_EVENTS = {"string", "number", "boolean", "null"}
+
+
+class IngestError(Exception):
+    """Raised with pydantic-style error dicts when the streamed body is invalid"""
+
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _event_batches(chunks: Iterable[bytes]) -> Iterator[List[tuple]]:
+    """Push body chunks through ijson, yielding the parse events produced by each chunk"""
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    for chunk in chunks:
+        if chunk:
+            parser.send(chunk)
+            yield events
+            del events[:]
+    parser.close()
+    yield events
+
+
+def _prefixed(error: ValidationError, loc: tuple) -> List[Dict[str, Any]]:
+    return [
+        {"type": e["type"], "loc": loc + tuple(e["loc"]), "msg": e["msg"], "input": e.get("input")}
+        for e in error.errors(include_url=False)
+    ]
+
+
+def _validate(model, data: Dict[str, Any], loc: tuple, ignore_missing: bool = False):
+    """Validate a note-less header with the regular model, prefixing error locations"""
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        errors = _prefixed(e, loc)
+        if ignore_missing:
+            errors = [error for error in errors if error["type"] != "missing"]
+            if not errors:
+                return None
+        raise IngestError(errors)
+
+
+def _not_an_object(loc: tuple, value: Any):
+    return IngestError([{
+        "type": "model_attributes_type",
+        "loc": loc,
+        "msg": "Input should be a valid dictionary or object to extract fields from",
+        "input": value
+    }])
+
+
+def _check_note(values: List[Any], loc: tuple):
+    """Apply Note's field constraints without building a model per note"""
+    errors = []
+    for name, value in zip(_NOTE_FIELDS, values):
+        field_loc = loc + (name,)
+        if value is None:
+            errors.append({"type": "missing", "loc": field_loc, "msg": "Field required", "input": None})
+        elif name in ("pitch", "velocity"):
+            if isinstance(value, float) and not math.isfinite(value):
+                # Reported as a string, since JSON has no NaN or infinity
+                errors.append({"type": "finite_number", "loc": field_loc, "msg": "Input should be a finite number", "input": str(value)})
+            elif isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                errors.append({"type": "int_type", "loc": field_loc, "msg": "Input should be a valid integer", "input": value})
+            elif not 0 <= value <= 127:
+                errors.append({
+                    "type": "less_than_equal" if value > 127 else "greater_than_equal",
+                    "loc": field_loc,
+                    "msg": "Input should be less than or equal to 127" if value > 127 else "Input should be greater than or equal to 0",
+                    "input": value
+                })
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            errors.append({"type": "float_type", "loc": field_loc, "msg": "Input should be a valid number", "input": value})
+    if errors:
+        raise IngestError(errors)
+
+
+def _pulled_from_loop(chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop) -> Iterator[bytes]:
+    """Iterate an async iterator from a worker thread, one item at a time, on the event loop that owns it"""
+    iterator = chunks.__aiter__()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(iterator.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+async def parse_composition_stream(
+    chunks: AsyncIterator[bytes],
+    max_notes: Optional[int] = None,
+    check_overlaps: bool = False,
+    max_errors: int = 20
+) -> PackedComposition:
+    """
+    Parse a streamed CompositionRequest body in a worker thread, see parse_composition_chunks
+
+    The thread pulls body chunks from the event loop as it needs them, so parsing
+    and validating a large body never blocks other requests.
+    """
+    return await asyncio.to_thread(
+        parse_composition_chunks,
+        _pulled_from_loop(chunks, asyncio.get_running_loop()),
+        max_notes=max_notes,
+        check_overlaps=check_overlaps,
+        max_errors=max_errors
+    )
+
+
+def parse_composition_chunks(
+    chunks: Iterable[bytes],
+    max_notes: Optional[int] = None,
+    check_overlaps: bool = False,
+    max_errors: int = 20
+) -> PackedComposition:
+    """
+    Incrementally parse a CompositionRequest body into packed per-track arrays
+
+    Notes are validated and appended to compact columns as the body streams in,
+    so neither the full JSON document nor a tree of note objects is ever held.
+    Chord events and scale-degree notes are expanded once the key and scale are known.
+    Render options in the body (window, quantize, humanize) are applied to the result.
+
+    Args:
+        chunks: The raw request body, in chunks
+        max_notes: Reject the request as soon as more notes than this arrive
+        check_overlaps: Also reject overlapping notes of the same pitch
+        max_errors: Semantic errors reported with their positions
+
+    Returns:
+        The parsed composition
+
+    Raises:
+        IngestError: On malformed JSON or invalid fields (at the first offending element)
+        NoteValidationError: If notes fail the semantic checks, with a summary of all errors
+        RequestTooLarge: If max_notes is exceeded
+    """
+    header: Dict[str, Any] = {}
+    options: Dict[str, Optional[Dict[str, Any]]] = {}
+    sections: List[PackedSection] = []
+    section: Dict[str, Any] = {}
+    section_tracks: List[TrackArrays] = []
+    track: Dict[str, Any] = {}
+    columns = None
+    track_harmony: Dict[str, list] = {}
+    # (section index, section tracks, track index, chords, degrees) of tracks to expand once the key and scale are known
+    harmonic_tracks: List[tuple] = []
+    item: Dict[str, Any] = {}
+    note: List[Any] = [None] * 4
+    note_count = 0
+    section_index = track_index = note_index = -1
+    composition_seen = tracks_seen = notes_seen = False
+
+    try:
+        for events in _event_batches(chunks):
+            for prefix, event, value in events:
+                # Hot path: fields of the current note
+                field_index = _NOTE_FIELD_INDEX.get(prefix)
+                if field_index is not None:
+                    note[field_index] = value if event in _SCALAR_EVENTS else event
+                    continue
+                if prefix.startswith(_NOTE):
+                    if prefix == _NOTE:
+                        if event == "start_map":
+                            note_index += 1
+                            note = [None] * 4
+                        elif event == "end_map":
+                            loc = ("body", "composition", "sections", section_index, "tracks", track_index, "notes", note_index)
+                            _check_note(note, loc)
+                            columns[0].append(int(note[0]))
+                            columns[1].append(note[1])
+                            columns[2].append(note[2])
+                            columns[3].append(int(note[3]))
+                            note_count += 1
+                            if max_notes is not None and note_count > max_notes:
+                                raise RequestTooLarge(f"Composition has more than {max_notes} notes")
+                        elif event in _SCALAR_EVENTS:
+                            loc = ("body", "composition", "sections", section_index, "tracks", track_index, "notes", note_index + 1)
+                            raise _not_an_object(loc, value)
+                    continue
+                item_prefix = prefix if prefix in _HARMONY else prefix.rpartition(".")[0]
+                harmonic = _HARMONY.get(item_prefix)
+                if harmonic is not None:
+                    name, model = harmonic
+                    items = track_harmony[name]
+                    if prefix in _HARMONY:
+                        loc = ("body", "composition", "sections", section_index, "tracks", track_index, name, len(items))
+                        if event == "start_map":
+                            item = {}
+                        elif event == "end_map":
+                            parsed = _validate(model, item, loc)
+                            items.append(parsed)
+                            # Counted as they arrive, by the most notes each can expand into
+                            note_count += harmony.chord_note_count(parsed.symbol) if name == "chords" else 1
+                            if max_notes is not None and note_count > max_notes:
+                                raise RequestTooLarge(f"Composition has more than {max_notes} notes")
+                        elif event in _SCALAR_EVENTS:
+                            raise _not_an_object(loc, value)
+                    elif event in _SCALAR_EVENTS:
+                        item[prefix.rpartition(".")[2]] = value
+                    continue
+
+                if prefix == _TRACK:
+                    if event == "start_map":
+                        track_index += 1
+                        note_index = -1
+                        track = {}
+                        track_harmony = {"chords": [], "degrees": []}
+                        notes_seen = False
+                        columns = (array("B"), array("d"), array("d"), array("B"))
+                    elif event == "end_map":
+                        loc = ("body", "composition", "sections", section_index, "tracks", track_index)
+                        validated = _validate(Track, {**track, "notes": []} if notes_seen else track, loc)
+                        if track_harmony["chords"] or track_harmony["degrees"]:
+                            harmonic_tracks.append((
+                                section_index, section_tracks, track_index,
+                                track_harmony["chords"], track_harmony["degrees"]
+                            ))
+                        section_tracks.append(track_arrays(validated.instrument, validated.midi_program, *columns))
+                    elif event in _SCALAR_EVENTS:
+                        raise _not_an_object(("body", "composition", "sections", section_index, "tracks", track_index + 1), value)
+                elif prefix == _TRACK + ".notes" and event == "start_array":
+                    notes_seen = True
+                elif prefix.startswith(_TRACK + ".") and event in _SCALAR_EVENTS:
+                    track[prefix[len(_TRACK) + 1:]] = value
+                elif prefix == _SECTION:
+                    if event == "start_map":
+                        section_index += 1
+                        track_index = -1
+                        section = {}
+                        section_tracks = []
+                        tracks_seen = False
+                    elif event == "end_map":
+                        loc = ("body", "composition", "sections", section_index)
+                        validated = _validate(Section, {**section, "tracks": []} if tracks_seen else section, loc)
+                        sections.append(PackedSection(name=validated.name, bars=validated.bars, tracks=section_tracks))
+                    elif event in _SCALAR_EVENTS:
+                        raise _not_an_object(("body", "composition", "sections", section_index + 1), value)
+                elif prefix == _SECTION + ".tracks" and event == "start_array":
+                    tracks_seen = True
+                elif prefix.startswith(_SECTION + ".") and event in _SCALAR_EVENTS:
+                    section[prefix[len(_SECTION) + 1:]] = value
+                elif prefix == _COMPOSITION + ".sections" and event == "start_array":
+                    # Reject bad header fields that arrived before the (large) sections array
+                    _validate(CompositionData, {**header, "sections": []}, ("body", "composition"), ignore_missing=True)
+                    header["sections"] = []
+                elif prefix == _COMPOSITION and event == "start_map":
+                    composition_seen = True
+                elif prefix.startswith(_COMPOSITION + ".") and prefix.count(".") == 1 and event in _SCALAR_EVENTS:
+                    header[prefix[len(_COMPOSITION) + 1:]] = value
+                elif prefix in _OPTIONS:
+                    if event == "start_map":
+                        options[prefix] = {}
+                    elif event == "null":
+                        options[prefix] = None
+                    elif event in _SCALAR_EVENTS or event == "start_array":
+                        raise _not_an_object(("body", prefix), value)
+                elif prefix.count(".") == 1 and event in _SCALAR_EVENTS and prefix.partition(".")[0] in _OPTIONS:
+                    name, _, field_name = prefix.partition(".")
+                    options[name][field_name] = value
+    except ijson.JSONError as e:
+        raise IngestError([{"type": "json_invalid", "loc": ("body",), "msg": "JSON decode error", "input": {}, "ctx": {"error": str(e)}}])
+
+    if not composition_seen:
+        raise IngestError([{"type": "missing", "loc": ("body", "composition"), "msg": "Field required", "input": None}])
+    validated = _validate(CompositionData, header, ("body", "composition"))
+    # Semantic checks run over whole tracks, once the composition's length is known
+    validator = NoteValidator(
+        validated.length_bars * beats_per_bar(validated.time_signature),
+        check_overlaps=check_overlaps,
+        max_errors=max_errors,
+        loc=("body", "composition")
+    )
+    for section_index, section in enumerate(sections):
+        for track_index, track in enumerate(section.tracks):
+            loc = ("sections", section_index, "tracks", track_index, "notes")
+            validator.check(loc, track.start, track.duration, track.pitch)
+    for section_index, _, track_index, chords, degrees in harmonic_tracks:
+        validator.check_items(("sections", section_index, "tracks", track_index, "chords"), chords)
+        validator.check_items(("sections", section_index, "tracks", track_index, "degrees"), degrees)
+    validator.raise_if_invalid()
+
+    if any(degrees for *_, degrees in harmonic_tracks):
+        for name, check in (("key", harmony.key_pitch_class), ("scale", harmony.scale_steps)):
+            try:
+                check(getattr(validated, name))
+            except ValueError as e:
+                loc = ("body", "composition", name)
+                raise IngestError([{"type": "value_error", "loc": loc, "msg": str(e), "input": getattr(validated, name)}])
+    for _, tracks, index, chords, degrees in harmonic_tracks:
+        tracks[index] = with_harmony(tracks[index], chords, degrees, validated.key, validated.scale)
+    packed = PackedComposition(
+        title=validated.title,
+        tempo=validated.tempo,
+        time_signature=validated.time_signature,
+        key=validated.key,
+        scale=validated.scale,
+        length_bars=validated.length_bars,
+        sections=sections
+    )
+    validated_options = {
+        name: _validate(_OPTIONS[name], data, ("body", name))
+        for name, data in options.items() if data is not None
+    }
+    if validated_options:
+        packed = apply_render_options(
+            packed,
+            validated_options.get("window"),
+            validated_options.get("quantize"),
+            validated_options.get("humanize")
+        )
+    return packed
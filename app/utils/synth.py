@@ -0,0 +1,162 @@
+import struct
+from functools import lru_cache
+from typing import Iterator, NamedTuple
+
+import numpy as np
+
+from app.utils import smf
+from app.utils.note_arrays import StartIndex
+
+TABLE_SIZE = 2048
+ATTACK_SECONDS = 0.005
+RELEASE_SECONDS = 0.08
+# Program rendered for drum channel notes (the percussive family)
+DRUM_PROGRAM = 112
+# Notes rendered together per block, bounding the (notes x samples) work arrays
+NOTE_BATCH = 256
+
+
+class Voice(NamedTuple):
+    partials: tuple   # amplitudes of harmonics 1, 2, 3, ...
+    decay: float      # exponential decay rate towards the sustain level, per second
+    sustain: float    # level held after the decay
+
+
+# One voice per General MIDI program family (program // 8)
+VOICES = [
+    Voice((1.0, 0.5, 0.25, 0.12, 0.06), 3.0, 0.2),         # piano
+    Voice((1.0, 0.0, 0.3, 0.0, 0.1), 6.0, 0.0),            # chromatic percussion
+    Voice((1.0, 0.8, 0.6, 0.4, 0.2, 0.1), 0.0, 1.0),       # organ
+    Voice((1.0, 0.6, 0.3, 0.2, 0.1), 2.5, 0.1),            # guitar
+    Voice((1.0, 0.3, 0.1), 1.5, 0.4),                      # bass
+    Voice((1.0, 0.5, 0.33, 0.25, 0.2, 0.16), 0.5, 0.8),    # strings
+    Voice((1.0, 0.5, 0.33, 0.25, 0.2), 0.3, 0.8),          # ensemble
+    Voice((1.0, 0.7, 0.5, 0.35, 0.25, 0.15), 0.5, 0.9),    # brass
+    Voice((1.0, 0.1, 0.4, 0.05, 0.2), 0.5, 0.9),           # reed
+    Voice((1.0, 0.2, 0.05), 0.5, 0.9),                     # pipe
+    Voice((1.0, 0.5, 0.33, 0.25, 0.2, 0.16, 0.14), 0.2, 0.9),  # synth lead
+    Voice((1.0, 0.3, 0.2, 0.1), 0.1, 0.9),                 # synth pad
+    Voice((1.0, 0.0, 0.5, 0.0, 0.3), 1.0, 0.5),            # synth effects
+    Voice((1.0, 0.4, 0.3, 0.1), 4.0, 0.0),                 # ethnic
+    Voice((1.0, 0.7, 0.6, 0.5, 0.4), 12.0, 0.0),           # percussive
+    Voice((1.0, 0.9, 0.8, 0.7, 0.6), 8.0, 0.0),            # sound effects
+]
+
+
+class PreviewNotes(NamedTuple):
+    """Notes to synthesize, with times in seconds"""
+    pitch: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    velocity: np.ndarray
+    program: np.ndarray
+
+
+def preview_notes(decoded: smf.DecodedMidi) -> PreviewNotes:
+    """Collect the notes of every track of a decoded file, timed by its tempo map"""
+    tracks = [track for track in decoded.tracks if len(track.pitch)]
+    if not tracks:
+        empty = np.empty(0)
+        return PreviewNotes(empty.astype(np.uint8), empty, empty, empty.astype(np.uint8), empty.astype(np.int64))
+    programs = [
+        np.full(len(track.pitch), DRUM_PROGRAM if track.channel == 9 else track.program, dtype=np.int64)
+        for track in tracks
+    ]
+    return PreviewNotes(
+        pitch=np.concatenate([track.pitch for track in tracks]),
+        start=decoded.ticks_to_seconds(np.concatenate([track.start_ticks for track in tracks])),
+        end=decoded.ticks_to_seconds(np.concatenate([track.end_ticks for track in tracks])),
+        velocity=np.concatenate([track.velocity for track in tracks]),
+        program=np.concatenate(programs)
+    )
+
+
+@lru_cache(maxsize=None)
+def wavetables() -> np.ndarray:
+    """One normalised single-cycle waveform per program family, shape (16, TABLE_SIZE)"""
+    phase = np.arange(TABLE_SIZE) / TABLE_SIZE
+    tables = np.zeros((len(VOICES), TABLE_SIZE))
+    for family, voice in enumerate(VOICES):
+        for harmonic, amplitude in enumerate(voice.partials, start=1):
+            tables[family] += amplitude * np.sin(2 * np.pi * harmonic * phase)
+        tables[family] /= np.abs(tables[family]).max()
+    return tables
+
+
+def duration_seconds(notes: PreviewNotes) -> float:
+    """Length of the rendered audio, including the release of the last note"""
+    return float(notes.end.max()) + RELEASE_SECONDS if len(notes.pitch) else 0.0
+
+
+def render_blocks(notes: PreviewNotes, sample_rate: int, block_seconds: float = 0.25) -> Iterator[np.ndarray]:
+    """
+    Synthesize notes into consecutive blocks of 16-bit mono samples
+
+    Each note reads the wavetable of its program family at its own pitch; the
+    notes sounding in a block are rendered together as (notes x samples)
+    arrays and mixed with one matrix product, so blocks can be streamed as soon
+    as they are ready.
+
+    Args:
+        notes: The notes to render
+        sample_rate: Samples per second
+        block_seconds: Length of each block
+
+    Yields:
+        int16 sample blocks, in order, covering duration_seconds(notes)
+    """
+    total = int(np.ceil(duration_seconds(notes) * sample_rate))
+    block = max(1, int(block_seconds * sample_rate))
+    tables = wavetables().astype(np.float32).ravel()
+    family = np.minimum(notes.program.astype(np.int64) // 8, len(VOICES) - 1)
+    decay = np.array([voice.decay for voice in VOICES], dtype=np.float32)[family]
+    sustain = np.array([voice.sustain for voice in VOICES], dtype=np.float32)[family]
+    # Wavetable positions advanced per second
+    frequency = 440.0 * 2.0 ** ((notes.pitch.astype(np.float64) - 69) / 12) * TABLE_SIZE
+    amplitude = (notes.velocity / 127.0 * 0.2).astype(np.float32)
+    sounding_end = notes.end + RELEASE_SECONDS
+    release_end = sounding_end.astype(np.float32)
+    index = StartIndex.build(notes.start, sounding_end)
+
+    for first in range(0, total, block):
+        count = min(block, total - first)
+        time = (first + np.arange(count)) / sample_rate
+        mix = np.zeros(count, dtype=np.float32)
+        active = index.overlapping(notes.start, sounding_end, time[0], time[-1] + 1.0 / sample_rate)
+        for batch in range(0, len(active), NOTE_BATCH):
+            ids = active[batch:batch + NOTE_BATCH, None]
+            elapsed = time - notes.start[ids]
+            np.maximum(elapsed, 0.0, out=elapsed)
+            # Phases are computed in float64 so long notes stay in tune
+            position = (elapsed * frequency[ids]).astype(np.int64)
+            position &= TABLE_SIZE - 1
+            position += family[ids] * TABLE_SIZE
+            wave = tables[position]
+
+            elapsed = elapsed.astype(np.float32)
+            envelope = np.exp(elapsed * -decay[ids])
+            envelope *= 1.0 - sustain[ids]
+            envelope += sustain[ids]
+            envelope *= np.minimum(elapsed * (1.0 / ATTACK_SECONDS), 1.0)
+            envelope *= np.clip((release_end[ids] - time.astype(np.float32)) * (1.0 / RELEASE_SECONDS), 0.0, 1.0)
+            envelope *= wave
+            mix += amplitude[ids[:, 0]] @ envelope
+        # Soft limiting keeps dense passages from clipping harshly
+        yield (np.tanh(mix) * 32767).astype(np.int16)
+
+
+def wav_header(sample_count: int, sample_rate: int) -> bytes:
+    """RIFF header for 16-bit mono PCM"""
+    data_size = sample_count * 2
+    return (
+        b"RIFF" + struct.pack("<I", 36 + data_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
+
+
+def iter_wav(notes: PreviewNotes, sample_rate: int, block_seconds: float = 0.25) -> Iterator[bytes]:
+    """Stream a WAV file: the header first, then each block as it is rendered"""
+    yield wav_header(int(np.ceil(duration_seconds(notes) * sample_rate)), sample_rate)
+    for samples in render_blocks(notes, sample_rate, block_seconds):
+        yield samples.astype("<i2").tobytes()
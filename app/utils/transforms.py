@@ -0,0 +1,89 @@
+from dataclasses import replace
+from typing import List
+
+import numpy as np
+
+from app.models.composition import (
+    StretchOperation, TempoOperation, TrackFilterOperation, TransformOperation, TransposeOperation,
+    VelocityOperation
+)
+from app.utils.note_arrays import PackedComposition, PackedSection, TrackArrays
+
+
+def _select(track: TrackArrays, keep: np.ndarray) -> TrackArrays:
+    return replace(
+        track,
+        pitch=track.pitch[keep],
+        start=track.start[keep],
+        duration=track.duration[keep],
+        velocity=track.velocity[keep]
+    )
+
+
+def transpose(track: TrackArrays, semitones: int) -> TrackArrays:
+    """Shift pitches, dropping notes that leave the MIDI range"""
+    pitch = track.pitch.astype(np.int16) + semitones
+    keep = (pitch >= 0) & (pitch <= 127)
+    shifted = _select(track, keep)
+    shifted.pitch = pitch[keep].astype(np.uint8)
+    return shifted
+
+
+def velocity_curve(track: TrackArrays, gamma: float, scale: float, offset: int) -> TrackArrays:
+    """Map velocities through 127 * (v / 127) ** gamma * scale + offset, clipped to 0-127"""
+    curved = np.power(track.velocity / 127.0, gamma) * (127.0 * scale) + offset
+    return replace(track, velocity=np.clip(np.rint(curved), 0, 127).astype(np.uint8))
+
+
+def stretch(track: TrackArrays, factor: float) -> TrackArrays:
+    """Scale note start times and durations"""
+    return replace(track, start=track.start * factor, duration=track.duration * factor)
+
+
+def _matches(track: TrackArrays, operation: TrackFilterOperation) -> bool:
+    return (
+        (operation.instruments is not None and track.instrument in operation.instruments)
+        or (operation.programs is not None and track.midi_program in operation.programs)
+    )
+
+
+def apply_transforms(composition: PackedComposition, operations: List[TransformOperation]) -> PackedComposition:
+    """
+    Apply a chain of operations to a packed composition
+
+    Every operation works on whole note columns at once; the input is not modified.
+
+    Args:
+        composition: The source composition
+        operations: Operations, applied in order
+
+    Returns:
+        The transformed composition
+    """
+    result = replace(composition, sections=[
+        PackedSection(name=section.name, bars=section.bars, tracks=list(section.tracks))
+        for section in composition.sections
+    ])
+    for operation in operations:
+        if isinstance(operation, TempoOperation):
+            result.tempo = operation.tempo
+            continue
+        if isinstance(operation, StretchOperation):
+            # Keep the nominal length in step with the notes
+            result.length_bars = max(1, round(result.length_bars * operation.factor))
+        for section in result.sections:
+            if isinstance(operation, StretchOperation):
+                section.bars = max(1, round(section.bars * operation.factor))
+                section.tracks = [stretch(track, operation.factor) for track in section.tracks]
+            elif isinstance(operation, TransposeOperation):
+                section.tracks = [transpose(track, operation.semitones) for track in section.tracks]
+            elif isinstance(operation, VelocityOperation):
+                section.tracks = [
+                    velocity_curve(track, operation.gamma, operation.scale, operation.offset)
+                    for track in section.tracks
+                ]
+            elif isinstance(operation, TrackFilterOperation):
+                section.tracks = [
+                    track for track in section.tracks if _matches(track, operation) != operation.exclude
+                ]
+    return result
@@ -0,0 +1,55 @@
+import time
+import zipfile
+from typing import Iterable, Iterator, List
+
+
+class _ChunkSink:
+    """Write-only, unseekable file object that collects what zipfile writes"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Build a ZIP archive on the fly, yielding its bytes as members are added
+
+    Because the sink is unseekable, zipfile writes sizes and CRCs in data
+    descriptors after each member, so nothing but the current chunk and the
+    central directory entries is held in memory.
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_DEFLATED):
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, mode="w", compression=compression)
+
+    def add(self, arcname: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Add a member from an iterable of chunks, yielding archive bytes as they are produced"""
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+        info.compress_type = self._zip.compression
+        with self._zip.open(info, mode="w") as member:
+            for chunk in chunks:
+                member.write(chunk)
+                data = self._sink.drain()
+                if data:
+                    yield data
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def close(self) -> bytes:
+        """Finish the archive and return the central directory bytes"""
+        self._zip.close()
+        return self._sink.drain()
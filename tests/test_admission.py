@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import (
+    AdmissionController, OverCapacity, RequestTooLarge, check_limits, estimate_cost
+)
+from app.core.config import settings
+
+
+def test_estimate_cost():
+    """Test cost grows with notes, tracks and sections"""
+    assert estimate_cost(10, 1, 1) < estimate_cost(1000, 1, 1)
+    assert estimate_cost(10, 1, 1) < estimate_cost(10, 5, 1)
+
+
+def test_check_limits(monkeypatch):
+    """Test per-request maximums"""
+    monkeypatch.setattr(settings, "ADMISSION_MAX_NOTES", 100)
+    check_limits(100, 1, 1)
+    with pytest.raises(RequestTooLarge):
+        check_limits(101, 1, 1)
+
+
+def test_inflight_budget(monkeypatch):
+    """Test the global in-flight budget admits, queues and rejects work"""
+    monkeypatch.setattr(settings, "ADMISSION_MAX_INFLIGHT_COST", 100)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", 0.05)
+    controller = AdmissionController()
+
+    # A lone request is admitted even if it exceeds the budget on its own
+    assert controller.try_acquire(150)
+    assert not controller.try_acquire(1)
+    controller.release(150)
+
+    assert controller.try_acquire(60)
+    assert controller.try_acquire(40)
+    assert not controller.try_acquire(1)
+
+    # Queued requests give up with a Retry-After hint
+    with pytest.raises(OverCapacity) as exc_info:
+        asyncio.run(controller.acquire(10))
+    assert exc_info.value.retry_after >= 1
+
+    # ...or are admitted once budget is released
+    async def release_later():
+        await asyncio.sleep(0.01)
+        controller.release(40)
+
+    async def acquire_while_releasing():
+        await asyncio.gather(controller.acquire(10), release_later())
+
+    asyncio.run(acquire_while_releasing())
+    assert controller.inflight_cost == 70
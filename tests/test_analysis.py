@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.utils import smf
+from app.utils.analysis import analyze, polyphony
+from app.utils.midi_generator import MidiGenerator
+from app.utils.note_arrays import PackedComposition, PackedSection, pack_composition, track_arrays
+
+
+def test_polyphony_sweep():
+    """Test back-to-back notes do not overlap and gaps are not averaged in"""
+    start = np.array([0.0, 1.0, 1.0, 5.0])
+    end = np.array([1.0, 3.0, 2.0, 6.0])
+    max_polyphony, mean_polyphony = polyphony(start, end)
+    assert max_polyphony == 2
+    # 1 note for 1 beat, 2 notes for 1 beat, 1 note for 2 beats
+    assert mean_polyphony == 5 / 4
+
+    assert polyphony(np.array([1.0]), np.array([1.0])) == (0, 0.0)
+
+
+def test_analyze_composition(complex_composition_data):
+    """Test statistics of a composition with several sections and tracks"""
+    analysis = analyze(pack_composition(complex_composition_data))
+
+    assert analysis["note_count"] == 9
+    assert analysis["duration_beats"] == 4.0
+    assert analysis["notes_per_beat"] == 9 / 4
+    # 3/4 time: everything but the last piano note starts in the first bar
+    assert analysis["notes_per_bar"] == [8, 1]
+    assert (analysis["pitch_min"], analysis["pitch_max"]) == (41, 72)
+    assert analysis["pitch_histogram"][41] == 2
+    assert sum(analysis["pitch_histogram"]) == 9
+    assert analysis["pitch_class_histogram"][0] == 3  # 60, 60, 72
+    assert (analysis["max_polyphony"], analysis["mean_polyphony"]) == (2, 2.0)
+
+    # Tracks are grouped per instrument, like the encoded file
+    piano, bass, strings = analysis["tracks"]
+    assert (piano["instrument"], piano["note_count"]) == ("piano", 6)
+    assert (piano["start"], piano["end"]) == (0.0, 4.0)
+    assert piano["max_polyphony"] == 1
+    assert (bass["midi_program"], bass["velocity_mean"]) == (32, 100.0)
+    assert strings["duration_mean"] == 2.0
+
+
+@pytest.mark.parametrize("tempo", [60, 140, 240])
+def test_analysis_times_are_beats(complex_composition_data, tempo):
+    """Test times match the encoded file in beats, whatever the tempo"""
+    composition = pack_composition(complex_composition_data.model_copy(update={"tempo": tempo}))
+    analysis = analyze(composition)
+    decoded = smf.read_midi(MidiGenerator.encode_midi(composition))
+    end_ticks = max(int(track.end_ticks.max()) for track in decoded.tracks)
+
+    assert analysis["duration_beats"] == end_ticks / decoded.resolution == 4.0
+    assert analysis["notes_per_beat"] == 9 / 4
+    assert analysis["notes_per_bar"] == [8, 1]
+    piano = analysis["tracks"][0]
+    [piano_track] = [track for track in decoded.tracks if track.program == piano["midi_program"]]
+    assert piano["start"] == piano_track.start_ticks.min() / decoded.resolution
+    assert piano["end"] == piano_track.end_ticks.max() / decoded.resolution
+
+
+def test_analyze_empty_composition():
+    """Test a composition without notes"""
+    composition = PackedComposition("Empty", 120, "4/4", "C", "major", 1, [
+        PackedSection("Main", 1, [track_arrays("piano", 0, [], [], [], [])])
+    ])
+    analysis = analyze(composition)
+    assert analysis["note_count"] == 0
+    assert analysis["tracks"] == []
+    assert analysis["pitch_min"] is None
@@ -1,5 +1,6 @@
 import os
 import json
+import time
 from pathlib import Path
 from fastapi.testclient import TestClient
 
@@ -120,4 +121,795 @@ def test_download_midi_file(temp_midi_dir, sample_composition_request):
 def test_download_nonexistent_midi_file(temp_midi_dir):
     """Test downloading a MIDI file that doesn't exist"""
     response = client.get("/api/v1/compositions/nonexistent-id/download")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+def test_delete_composition(temp_midi_dir, sample_composition_request):
+    """Test deleting a composition and its MIDI file"""
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+    created_data = response.json()
+    composition_id = created_data["id"]
+
+    response = client.delete(f"/api/v1/compositions/{composition_id}")
+    assert response.status_code == 204
+    assert not os.path.exists(created_data["file_path"])
+
+    response = client.get(f"/api/v1/compositions/{composition_id}")
+    assert response.status_code == 404
+
+    response = client.delete(f"/api/v1/compositions/{composition_id}")
+    assert response.status_code == 404
+
+
+def test_bulk_delete_compositions(temp_midi_dir, sample_composition_request):
+    """Test bulk deleting compositions by ID list"""
+    created = []
+    for i in range(3):
+        response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+        assert response.status_code == 201
+        created.append(response.json())
+
+    ids = [c["id"] for c in created[:2]] + ["nonexistent-id"]
+    response = client.post("/api/v1/compositions/delete/bulk", json={"ids": ids})
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 2, "missing": ["nonexistent-id"]}
+
+    for composition in created[:2]:
+        assert not os.path.exists(composition["file_path"])
+        assert client.get(f"/api/v1/compositions/{composition['id']}").status_code == 404
+    assert client.get(f"/api/v1/compositions/{created[2]['id']}").status_code == 200
+
+    # An empty selection is rejected rather than deleting everything
+    response = client.post("/api/v1/compositions/delete/bulk", json={})
+    assert response.status_code == 422
+
+
+def test_download_conditional_and_range_requests(temp_midi_dir, sample_composition_request):
+    """Test ETag revalidation and byte range downloads"""
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+    composition_id = response.json()["id"]
+    url = f"/api/v1/compositions/{composition_id}/download"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "immutable" in response.headers["cache-control"]
+    content = response.content
+
+    # Revalidation with the stored content hash
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    response = client.get(url, headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+    # Byte ranges
+    response = client.get(url, headers={"Range": "bytes=0-3"})
+    assert response.status_code == 206
+    assert response.content == content[:4] == b"MThd"
+    assert response.headers["content-range"] == f"bytes 0-3/{len(content)}"
+
+    response = client.get(url, headers={"Range": "bytes=-4"})
+    assert response.status_code == 206
+    assert response.content == content[-4:]
+
+    response = client.get(url, headers={"Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+
+    # A stale If-Range falls back to the full body
+    response = client.get(url, headers={"Range": "bytes=0-3", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_download_served_from_cache(temp_midi_dir, sample_composition_request):
+    """Test freshly generated files are downloaded from the in-memory cache"""
+    from app.core.cache import midi_cache
+
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+    created_data = response.json()
+
+    hits = midi_cache.stats()["hits"]
+    with open(created_data["file_path"], "rb") as f:
+        content = f.read()
+    os.remove(created_data["file_path"])
+
+    # Served from memory even though the file is gone
+    response = client.get(f"/api/v1/compositions/{created_data['id']}/download")
+    assert response.status_code == 200
+    assert response.content == content
+    assert midi_cache.stats()["hits"] == hits + 1
+
+
+def test_bulk_download_zip(temp_midi_dir, sample_composition_request):
+    """Test streaming several compositions as a ZIP archive with a manifest"""
+    import io
+    import zipfile
+
+    created = []
+    for i in range(3):
+        response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+        assert response.status_code == 201
+        created.append(response.json())
+
+    # One composition loses its file, one ID doesn't exist at all
+    os.remove(created[2]["file_path"])
+    ids = [c["id"] for c in created] + ["nonexistent-id"]
+
+    response = client.post("/api/v1/compositions/download/bulk", json={"ids": ids})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    for composition in created[:2]:
+        filename = os.path.basename(composition["file_path"])
+        assert filename in names
+        with open(composition["file_path"], "rb") as f:
+            assert archive.read(filename) == f.read()
+
+    manifest = json.loads(archive.read("manifest.json"))
+    assert [entry["id"] for entry in manifest["included"]] == [c["id"] for c in created[:2]]
+    assert {entry["id"] for entry in manifest["missing"]} == {created[2]["id"], "nonexistent-id"}
+
+
+def test_list_compositions_sparse_fields_and_compression(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test sparse fieldsets and compression of the list endpoint"""
+    from app.core.config import settings
+
+    for i in range(2):
+        response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+        assert response.status_code == 201
+
+    response = client.get("/api/v1/compositions?fields=id,title&limit=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["compositions"]) == 2
+    for composition in data["compositions"]:
+        assert set(composition) == {"id", "title"}
+
+    response = client.get("/api/v1/compositions?fields=id,secret")
+    assert response.status_code == 422
+
+    # Pages past the size threshold are compressed when the client accepts it (httpx decodes transparently)
+    monkeypatch.setattr(settings, "COMPRESSION_MIN_SIZE", 64)
+    response = client.get("/api/v1/compositions?limit=1000", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json()["total"] >= 2
+
+    response = client.get("/api/v1/compositions?limit=1000", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+def test_export_ndjson(temp_midi_dir, sample_composition_request):
+    """Test streaming the metadata catalog as NDJSON"""
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+    created_data = response.json()
+
+    response = client.get("/api/v1/compositions/export.ndjson")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert records[-1]["id"] == created_data["id"]
+    assert [r["created_at"] for r in records] == sorted(r["created_at"] for r in records)
+
+    # Incremental sync only returns newer records
+    response = client.get("/api/v1/compositions/export.ndjson", params={"since": created_data["created_at"]})
+    assert response.status_code == 200
+    assert response.text == ""
+
+    # Records sharing the last created_at are kept unless already seen
+    response = client.get(
+        "/api/v1/compositions/export.ndjson", params={"since": created_data["created_at"], "seen_ids": ["other-id"]}
+    )
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [created_data["id"]]
+    response = client.get(
+        "/api/v1/compositions/export.ndjson",
+        params={"since": created_data["created_at"], "seen_ids": [created_data["id"]]}
+    )
+    assert response.text == ""
+
+
+def test_generate_admission_control(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test oversized requests get 413 and over-capacity requests get 429"""
+    from app.core.admission import admission
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ADMISSION_MAX_NOTES", 3)
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 413
+    monkeypatch.undo()
+
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_TIMEOUT", 0)
+    assert admission.try_acquire(settings.ADMISSION_MAX_INFLIGHT_COST)
+    try:
+        response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+    finally:
+        admission.release(settings.ADMISSION_MAX_INFLIGHT_COST)
+
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+
+
+def test_generate_stream_endpoint(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test the incremental ingest path, directly and via /generate routing"""
+    response = client.post("/api/v1/compositions/generate/stream", json=sample_composition_request)
+    assert response.status_code == 201
+    assert response.json()["title"] == "Test Composition"
+
+    response = client.post(
+        "/api/v1/compositions/generate/stream",
+        headers={"Content-Type": "application/json"},
+        content="invalid json"
+    )
+    assert response.status_code == 422
+
+    # Large /generate bodies are routed to the incremental parser
+    from app.core.config import settings
+    from app.api.v1.endpoints import compositions
+
+    parsed = []
+    original = compositions.parse_composition_stream
+
+    async def tracking_parse(*args, **kwargs):
+        result = await original(*args, **kwargs)
+        parsed.append(result)
+        return result
+
+    monkeypatch.setattr(compositions, "parse_composition_stream", tracking_parse)
+    monkeypatch.setattr(settings, "STREAMING_INGEST_MIN_BYTES", 1)
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+    assert len(parsed) == 1
+
+    assert client.get("/openapi.json").status_code == 200
+
+
+def test_generate_progress_stream(temp_midi_dir, sample_composition_request):
+    """Test render progress is streamed as Server-Sent Events"""
+    response = client.post("/api/v1/compositions/generate/progress", json=sample_composition_request)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+
+    progress = [data for event, data in events if event == "progress"]
+    assert progress[-1]["stage"] == "done"
+    assert progress[-1]["notes_encoded"] == 4
+    assert progress[-1]["bytes_written"] > 0
+
+    event, data = events[-1]
+    assert event == "complete"
+    assert data["title"] == "Test Composition"
+    assert os.path.exists(data["file_path"])
+
+
+def test_live_session(temp_midi_dir):
+    """Test streaming notes into a live session over a WebSocket"""
+    with client.websocket_connect("/api/v1/compositions/live") as websocket:
+        websocket.send_json({"type": "start", "title": "Jam", "tempo": 100})
+        started = websocket.receive_json()
+        assert started["type"] == "started"
+        assert started["time_signature"] == "4/4"
+
+        websocket.send_json({
+            "type": "notes",
+            "instrument": "piano",
+            "midi_program": 0,
+            "notes": [{"pitch": 60, "start_time": 0.0, "duration": 1.0, "velocity": 80}]
+        })
+        ack = websocket.receive_json()
+        assert ack["type"] == "ack"
+        assert ack["notes"] == 1
+
+        # Invalid batches are reported without ending the session
+        websocket.send_json({"type": "notes", "instrument": "piano", "midi_program": 0, "notes": [{"pitch": 200}]})
+        error = websocket.receive_json()
+        assert error["type"] == "error"
+        assert error["detail"][0]["loc"][0] == "notes"
+
+        # So are binary frames
+        websocket.send_bytes(b"\x00\x01")
+        assert websocket.receive_json() == {"type": "error", "detail": "Messages must be text frames"}
+
+        websocket.send_json({"type": "snapshot"})
+        meta = websocket.receive_json()
+        midi_bytes = websocket.receive_bytes()
+        assert meta["size"] == len(midi_bytes)
+        assert midi_bytes.startswith(b"MThd")
+
+        websocket.send_json({"type": "save"})
+        saved = websocket.receive_json()
+        assert saved["type"] == "saved"
+        assert saved["composition"]["title"] == "Jam"
+
+        websocket.send_json({"type": "close"})
+
+    response = client.get(f"/api/v1/compositions/{saved['composition']['id']}/download")
+    assert response.status_code == 200
+    assert response.content == midi_bytes
+
+
+def test_live_session_requires_start():
+    """Test a live session must open with a start message"""
+    with client.websocket_connect("/api/v1/compositions/live") as websocket:
+        websocket.send_json({"type": "notes"})
+        error = websocket.receive_json()
+        assert error["type"] == "error"
+
+
+def test_generate_window_and_slice(temp_midi_dir, complex_composition_data):
+    """Test windowed rendering and slicing a stored composition give the same notes, to within a tick"""
+    import numpy as np
+    from app.utils import smf
+
+    payload = {"composition": complex_composition_data.model_dump()}
+    full = client.post("/api/v1/compositions/generate", json=payload).json()
+
+    # The second window leaves out the middle (bass) track
+    for window in ({"start": 1.5, "end": 3.5, "unit": "beat"}, {"start": 2.5, "end": 3.5, "unit": "beat"}):
+        payload["window"] = window
+        windowed = client.post("/api/v1/compositions/generate", json=payload)
+        assert windowed.status_code == 201
+        with open(windowed.json()["file_path"], "rb") as f:
+            windowed_tracks = smf.read_midi(f.read()).tracks
+
+        response = client.get(f"/api/v1/compositions/{full['id']}/slice", params=window)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "audio/midi"
+        # Slicing rounds clipped edges from the encoded ticks rather than from the source times
+        sliced_tracks = smf.read_midi(response.content).tracks
+        assert len(sliced_tracks) == len(windowed_tracks)
+        for sliced, expected in zip(sliced_tracks, windowed_tracks):
+            assert (sliced.program, sliced.pitch.tolist(), sliced.velocity.tolist()) == (
+                expected.program, expected.pitch.tolist(), expected.velocity.tolist()
+            )
+            assert np.abs(sliced.start_ticks - expected.start_ticks).max() <= 1
+            assert np.abs(sliced.end_ticks - expected.end_ticks).max() <= 1
+    assert len(windowed_tracks) == 2
+
+    cached = client.get(
+        f"/api/v1/compositions/{full['id']}/slice",
+        params={"start": 2.5, "end": 3.5, "unit": "beat"},
+        headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert cached.status_code == 304
+
+    assert client.get(f"/api/v1/compositions/{full['id']}/slice", params={"start": 2, "end": 1}).status_code == 422
+    assert client.get("/api/v1/compositions/missing/slice", params={"start": 0, "end": 1}).status_code == 404
+
+
+def test_bar_window_selects_the_bar(temp_midi_dir, sample_composition_request):
+    """Test bar windows select notes by their beats, whatever the tempo"""
+    from app.utils import smf
+
+    payload = sample_composition_request
+    payload["composition"]["length_bars"] = 2
+    payload["composition"]["sections"][0]["bars"] = 2
+    # One note per bar, at 120 bpm
+    payload["composition"]["sections"][0]["tracks"][0]["notes"] = [
+        {"pitch": 60, "start_time": 0.0, "duration": 1.0, "velocity": 80},
+        {"pitch": 62, "start_time": 4.0, "duration": 1.0, "velocity": 80}
+    ]
+    full = client.post("/api/v1/compositions/generate", json=payload).json()
+
+    window = {"start": 1, "end": 2, "unit": "bar"}
+    sliced = client.get(f"/api/v1/compositions/{full['id']}/slice", params=window)
+    payload["window"] = window
+    windowed = client.post("/api/v1/compositions/generate", json=payload).json()
+    with open(windowed["file_path"], "rb") as f:
+        rendered = f.read()
+    for content in (sliced.content, rendered):
+        [track] = smf.read_midi(content).tracks
+        assert (track.pitch.tolist(), track.start_ticks.tolist(), track.end_ticks.tolist()) == ([62], [0], [220])
+
+
+def test_get_notes_window(temp_midi_dir, complex_composition_data):
+    """Test querying stored source notes by time window and track"""
+    payload = {"composition": complex_composition_data.model_dump()}
+    composition = client.post("/api/v1/compositions/generate", json=payload).json()
+    url = f"/api/v1/compositions/{composition['id']}/notes"
+
+    everything = client.get(url).json()
+    assert sum(len(track["notes"]) for track in everything["tracks"]) == 9
+
+    response = client.get(url, params={"from": 1.75, "to": 2.5})
+    assert response.status_code == 200
+    tracks = {(track["section"], track["instrument"]): track["notes"] for track in response.json()["tracks"]}
+    assert [note["pitch"] for note in tracks["Intro", "piano"]] == [65]
+    assert [note["pitch"] for note in tracks["Intro", "bass"]] == [41]
+    assert [note["pitch"] for note in tracks["Chorus", "strings"]] == [72]
+    # Notes keep their original, unclipped times
+    assert tracks["Intro", "bass"][0]["start_time"] == 1.0
+
+    by_name = client.get(url, params={"track": "piano"}).json()
+    assert [track["index"] for track in by_name["tracks"]] == [0, 2]
+    by_index = client.get(url, params={"track": "3"}).json()
+    assert by_index["tracks"][0]["instrument"] == "strings"
+
+    assert client.get(url, params={"track": "drums"}).status_code == 404
+    assert client.get(url, params={"from": 2, "to": 1}).status_code == 422
+
+    # The note store is removed with the composition
+    notes_path = CompositionStorage().get_composition(composition["id"])["notes_path"]
+    assert os.path.exists(notes_path)
+    client.delete(f"/api/v1/compositions/{composition['id']}")
+    assert not os.path.exists(notes_path)
+
+
+def test_generate_with_chords_and_degrees(temp_midi_dir, sample_composition_request):
+    """Test chord events and scale degrees are expanded into the stored notes"""
+    track = sample_composition_request["composition"]["sections"][0]["tracks"][0]
+    track["notes"] = []
+    track["chords"] = [{"symbol": "Am7", "start_time": 0, "duration": 4, "velocity": 70, "octave": 3}]
+    track["degrees"] = [{"degree": 3, "start_time": 0, "duration": 1, "velocity": 90}]
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.status_code == 201
+
+    notes = client.get(f"/api/v1/compositions/{response.json()['id']}/notes").json()["tracks"][0]["notes"]
+    assert sorted(note["pitch"] for note in notes) == [57, 60, 64, 64, 67]
+
+    track["chords"][0]["symbol"] = "Am7/Q"
+    assert client.post("/api/v1/compositions/generate", json=sample_composition_request).status_code == 422
+
+
+def test_generate_rejects_semantic_errors(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test invalid note timing is answered with a capped, indexed error summary"""
+    from app.core.config import settings
+
+    track = sample_composition_request["composition"]["sections"][0]["tracks"][0]
+    track["notes"] += [{"pitch": 60, "start_time": 0.5, "duration": -1, "velocity": 80}] * 30
+    track["chords"] = [{"symbol": "C", "start_time": 20, "duration": 1, "velocity": 80}]
+    monkeypatch.setattr(settings, "VALIDATION_MAX_ERRORS", 5)
+
+    for path in ("/api/v1/compositions/generate", "/api/v1/compositions/generate/stream"):
+        response = client.post(path, json=sample_composition_request)
+        assert response.status_code == 422
+        detail = response.json()["detail"]
+        assert detail["counts"] == {"non_positive_duration": 30, "past_end": 1}
+        assert detail["truncated"]
+        assert [error["loc"][-1] for error in detail["errors"]] == [4, 5, 6, 7, 8]
+
+    # Non-finite times are reported as their own kind, echoed as strings since JSON has no NaN
+    track["notes"] = track["notes"][:4] + [
+        {"pitch": 60, "start_time": 0.5, "duration": float("nan"), "velocity": 80},
+        {"pitch": 60, "start_time": float("inf"), "duration": 1, "velocity": 80},
+        {"pitch": 60, "start_time": float("nan"), "duration": 1, "velocity": 80}
+    ]
+    del track["chords"]
+    response = client.post(
+        "/api/v1/compositions/generate",
+        content=json.dumps(sample_composition_request),
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["counts"] == {"non_finite": 3}
+    assert [error["input"] for error in detail["errors"]] == [
+        {"start_time": 0.5, "duration": "nan"},
+        {"start_time": "inf", "duration": 1.0},
+        {"start_time": "nan", "duration": 1.0}
+    ]
+
+    # Overlapping notes of the same pitch are only rejected when enabled
+    track["notes"] = track["notes"][:4] + [{"pitch": 60, "start_time": 0.5, "duration": 1, "velocity": 80}]
+    assert client.post("/api/v1/compositions/generate", json=sample_composition_request).status_code == 201
+    monkeypatch.setattr(settings, "VALIDATE_NOTE_OVERLAPS", True)
+    response = client.post("/api/v1/compositions/generate", json=sample_composition_request)
+    assert response.json()["detail"]["counts"] == {"overlap": 1}
+
+
+def test_transform_composition(temp_midi_dir, sample_composition_request):
+    """Test a transformed composition renders like the equivalent request"""
+    source = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+
+    response = client.post(f"/api/v1/compositions/{source['id']}/transform", json={
+        "title": "Variation",
+        "operations": [
+            {"op": "transpose", "semitones": 2},
+            {"op": "stretch", "factor": 0.5},
+            {"op": "tempo", "tempo": 90}
+        ]
+    })
+    assert response.status_code == 201
+    variation = response.json()
+    assert variation["title"] == "Variation"
+    assert variation["id"] != source["id"]
+
+    expected = json.loads(json.dumps(sample_composition_request))
+    expected["composition"].update(title="Variation", tempo=90, length_bars=2)
+    expected["composition"]["sections"][0]["bars"] = 2
+    for note in expected["composition"]["sections"][0]["tracks"][0]["notes"]:
+        note.update(pitch=note["pitch"] + 2, start_time=note["start_time"] / 2, duration=note["duration"] / 2)
+    reference = client.post("/api/v1/compositions/generate", json=expected).json()
+
+    with open(variation["file_path"], "rb") as f, open(reference["file_path"], "rb") as g:
+        assert f.read() == g.read()
+
+    # Transformed compositions can be transformed again
+    notes = client.get(f"/api/v1/compositions/{variation['id']}/notes").json()
+    assert [note["pitch"] for note in notes["tracks"][0]["notes"]] == [62, 66, 69, 74]
+
+    bad = client.post(f"/api/v1/compositions/{source['id']}/transform", json={"operations": [{"op": "reverse"}]})
+    assert bad.status_code == 422
+    # Filtering out every track would leave nothing to render
+    empty = client.post(f"/api/v1/compositions/{source['id']}/transform", json={
+        "operations": [{"op": "filter_tracks", "programs": [0], "exclude": True}]
+    })
+    assert empty.status_code == 422
+    assert empty.json()["detail"] == "The operations leave no tracks"
+    missing = client.post("/api/v1/compositions/missing/transform", json={"operations": [{"op": "tempo", "tempo": 90}]})
+    assert missing.status_code == 404
+
+
+def test_generate_with_quantize_and_humanize(temp_midi_dir, sample_composition_request):
+    """Test groove options are applied and seeded humanize is reproducible"""
+    payload = json.loads(json.dumps(sample_composition_request))
+    for note in payload["composition"]["sections"][0]["tracks"][0]["notes"]:
+        note["start_time"] += 0.1
+    payload["quantize"] = {"grid": 1.0}
+    quantized = client.post("/api/v1/compositions/generate", json=payload).json()
+    straight = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    with open(quantized["file_path"], "rb") as f, open(straight["file_path"], "rb") as g:
+        assert f.read() == g.read()
+
+    payload["humanize"] = {"timing": 0.05, "velocity": 10, "seed": 42}
+    first = client.post("/api/v1/compositions/generate", json=payload).json()
+    second = client.post("/api/v1/compositions/generate", json=payload).json()
+    with open(first["file_path"], "rb") as f, open(second["file_path"], "rb") as g:
+        assert f.read() == g.read()
+
+    payload["quantize"] = {"grid": 0}
+    assert client.post("/api/v1/compositions/generate", json=payload).status_code == 422
+
+
+def test_merge_compositions(temp_midi_dir, sample_composition_request):
+    """Test layering and concatenating stored compositions"""
+    first = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    second = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+
+    response = client.post("/api/v1/compositions/merge", json={
+        "ids": [first["id"], second["id"], first["id"]], "mode": "concat", "title": "Medley"
+    })
+    assert response.status_code == 201
+    merged = response.json()
+    assert merged["title"] == "Medley"
+
+    download = client.get(f"/api/v1/compositions/{merged['id']}/download")
+    assert download.status_code == 200
+    from app.utils import smf
+    (piano,) = smf.read_midi(download.content).tracks
+    assert len(piano.pitch) == 12
+
+    layered = client.post("/api/v1/compositions/merge", json={"ids": [first["id"], second["id"]], "mode": "layer"})
+    assert layered.status_code == 201
+
+    missing = client.post("/api/v1/compositions/merge", json={"ids": [first["id"], "missing"]})
+    assert missing.status_code == 404
+    assert "missing" in missing.json()["detail"]
+    assert client.post("/api/v1/compositions/merge", json={"ids": []}).status_code == 422
+
+
+def test_preview_audio(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test streaming and caching a WAV preview of a stored composition"""
+    import io
+    import wave
+    from app.core.cache import audio_cache
+    from app.core.config import settings
+
+    composition = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    url = f"/api/v1/compositions/{composition['id']}/preview.wav"
+
+    response = client.get(url, params={"sample_rate": 8000})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/wav"
+    with wave.open(io.BytesIO(response.content)) as wav:
+        assert wav.getframerate() == 8000
+        assert wav.getnframes() > 8000
+
+    # The second request is answered from the audio cache with the same bytes
+    assert client.get(url, params={"sample_rate": 8000}).content == response.content
+
+    cached = client.get(url, params={"sample_rate": 8000}, headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get(url, params={"sample_rate": 100}).status_code == 422
+    assert client.get("/api/v1/compositions/missing/preview.wav").status_code == 404
+
+    # Previews larger than the cache are streamed without being kept
+    audio_cache.clear()
+    monkeypatch.setattr(audio_cache, "max_bytes", 1000)
+    assert client.get(url, params={"sample_rate": 8001}).content[:4] == b"RIFF"
+    assert audio_cache.stats()["entries"] == 0
+
+    monkeypatch.setattr(settings, "PREVIEW_MAX_SECONDS", 1)
+    assert client.get(url, params={"sample_rate": 8002}).status_code == 422
+
+
+def test_get_analysis(temp_midi_dir, sample_composition_request):
+    """Test analytics are stored at generation time and served without the MIDI file"""
+    composition = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    os.remove(composition["file_path"])
+
+    response = client.get(f"/api/v1/compositions/{composition['id']}/analysis")
+    assert response.status_code == 200
+    analysis = response.json()
+    assert analysis["id"] == composition["id"]
+    assert analysis["note_count"] == 4
+    assert (analysis["pitch_min"], analysis["pitch_max"]) == (60, 72)
+    assert analysis["tracks"][0]["instrument"] == "piano"
+
+    # The statistics are kept next to the MIDI file, out of the metadata store
+    record = CompositionStorage().get_composition(composition["id"])
+    assert "analysis" not in record
+    assert os.path.exists(record["analysis_path"])
+
+    # Listings are unaffected by the stored statistics
+    listed = client.get("/api/v1/compositions").json()["compositions"][0]
+    assert "analysis" not in listed
+
+    client.delete(f"/api/v1/compositions/{composition['id']}")
+    assert not os.path.exists(record["analysis_path"])
+
+    assert client.get("/api/v1/compositions/missing/analysis").status_code == 404
+
+
+def test_piano_roll(temp_midi_dir, sample_composition_request):
+    """Test single and bulk piano-roll downloads"""
+    import io
+    import zipfile
+    import numpy as np
+
+    composition = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    url = f"/api/v1/compositions/{composition['id']}/pianoroll"
+
+    response = client.get(url, params={"fs": 10, "dtype": "uint8"}, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    roll = np.load(io.BytesIO(response.content))
+    assert roll.dtype == np.uint8
+    # Four beats at 120 bpm last two seconds
+    assert roll.shape == (128, 20)
+    assert roll[60, :5].tolist() == [80] * 5
+    assert roll[60, 5] == 0
+
+    archive = np.load(io.BytesIO(client.get(url, params={"fs": 10, "dtype": "uint8", "format": "npz"}).content))
+    np.testing.assert_array_equal(archive["piano_roll"], roll)
+    assert archive["fs"] == 10
+
+    cached = client.get(url, params={"fs": 10, "dtype": "uint8"}, headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get(url, params={"fs": 1000000}).status_code == 422
+
+    bulk = client.post("/api/v1/compositions/pianoroll/bulk", json={
+        "ids": [composition["id"], "missing"], "fs": 10, "dtype": "uint8"
+    })
+    assert bulk.status_code == 200
+    rolls = np.load(io.BytesIO(bulk.content))
+    np.testing.assert_array_equal(rolls[composition["id"]], roll)
+    manifest = json.loads(zipfile.ZipFile(io.BytesIO(bulk.content)).read("manifest.json"))
+    assert [entry["id"] for entry in manifest["missing"]] == ["missing"]
+
+
+def test_export_note_dataset(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test streaming the note dataset and exporting incrementally"""
+    import io
+    import zipfile
+    import numpy as np
+    from app.core.admission import admission
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "EXPORT_PROCESSES", 1)
+    composition = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+
+    response = client.get("/api/v1/compositions/export/notes", params={"shard_size": 1})
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["last_created_at"] == composition["created_at"]
+    last = np.load(io.BytesIO(archive.read(manifest["shards"][-1]["file"])))
+    assert last["composition_id"].tolist() == [composition["id"]]
+    assert last["pitch"].tolist() == [60, 64, 67, 72]
+
+    newer = client.get("/api/v1/compositions/export/notes", params={"since": manifest["last_created_at"]})
+    assert json.loads(zipfile.ZipFile(io.BytesIO(newer.content)).read("manifest.json"))["shards"] == []
+    # The export's admission budget is returned once the stream ends
+    assert admission.inflight_requests == 0
+
+
+def test_export_released_when_client_disconnects_first(temp_midi_dir, sample_composition_request):
+    """Test an export's admission budget is returned if the client leaves before the stream starts"""
+    import asyncio
+    from app.core.admission import admission
+
+    client.post("/api/v1/compositions/generate", json=sample_composition_request)
+
+    async def disconnect():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/v1/compositions/export/notes", "raw_path": b"/api/v1/compositions/export/notes",
+        "root_path": "", "query_string": b"", "headers": [], "client": ("test", 1), "server": ("test", 80)
+    }
+    for _ in range(3):
+        asyncio.run(app(dict(scope), disconnect, send))
+    assert (admission.inflight_requests, admission.inflight_cost) == (0, 0)
+
+
+def test_similar_compositions(temp_midi_dir, sample_composition_request, complex_composition_data):
+    """Test finding similar compositions, skipping deleted ones"""
+    first = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    twin = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    other = client.post(
+        "/api/v1/compositions/generate", json={"composition": complex_composition_data.model_dump()}
+    ).json()
+
+    response = client.get(f"/api/v1/compositions/{first['id']}/similar", params={"k": 2})
+    assert response.status_code == 200
+    similar = response.json()["similar"]
+    assert [match["id"] for match in similar] == [twin["id"], other["id"]]
+    assert similar[0]["score"] > 0.999
+    assert similar[0]["title"] == "Test Composition"
+
+    client.delete(f"/api/v1/compositions/{twin['id']}")
+    similar = client.get(f"/api/v1/compositions/{first['id']}/similar", params={"k": 2}).json()["similar"]
+    assert [match["id"] for match in similar] == [other["id"]]
+
+    assert client.get("/api/v1/compositions/missing/similar").status_code == 404
+
+
+def test_metrics_endpoint(temp_midi_dir, sample_composition_request):
+    """Test stage timings, counters and gauges are exposed in the Prometheus text format"""
+    composition = client.post("/api/v1/compositions/generate", json=sample_composition_request).json()
+    client.get(f"/api/v1/compositions/{composition['id']}/download")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.text.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    for stage in ("parse", "build", "encode", "write", "add_composition", "save_metadata", "download"):
+        assert samples[f'notemint_stage_duration_seconds_count{{stage="{stage}"}}'] >= 1
+    assert samples["notemint_notes_rendered_total"] >= 4
+    assert samples["notemint_midi_bytes_written_total"] > 0
+    # Generated files are put in the download cache, so the download was a hit
+    assert samples['notemint_cache_hits_total{cache="midi"}'] >= 1
+    assert samples["notemint_storage_compositions"] >= 1
+
+
+
+def test_parse_stage_includes_request_validation(temp_midi_dir, sample_composition_request, monkeypatch):
+    """Test the parse stage is timed from when the body arrived, before FastAPI parsed and validated it"""
+    from app.api.v1.endpoints import compositions
+
+    starts = []
+    original = compositions.time_stage
+
+    def recording_time_stage(stage, since=None):
+        if stage == "parse":
+            starts.append((since, time.perf_counter()))
+        return original(stage, since)
+
+    monkeypatch.setattr(compositions, "time_stage", recording_time_stage)
+    before = time.perf_counter()
+    assert client.post("/api/v1/compositions/generate", json=sample_composition_request).status_code == 201
+
+    [(since, entered)] = starts
+    assert since is not None
+    assert before < since < entered
@@ -0,0 +1,50 @@
+from app.core.cache import ByteLRUCache
+
+
+def test_cache_hits_and_misses():
+    """Test cache lookups update hit and miss counters"""
+    cache = ByteLRUCache(max_bytes=100)
+
+    assert cache.get("a") is None
+    assert cache.put("a", b"x" * 10)
+    assert cache.get("a") == b"x" * 10
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 10
+
+
+def test_cache_evicts_least_recently_used():
+    """Test the byte budget is enforced by evicting the oldest entries"""
+    cache = ByteLRUCache(max_bytes=30)
+    cache.put("a", b"a" * 10)
+    cache.put("b", b"b" * 10)
+    cache.put("c", b"c" * 10)
+
+    # Touch "a" so that "b" becomes the least recently used entry
+    cache.get("a")
+    cache.put("d", b"d" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 30
+
+    # Payloads larger than the budget are never cached
+    assert not cache.put("huge", b"x" * 31)
+    assert cache.get("huge") is None
+
+
+def test_cache_invalidate_and_replace():
+    """Test invalidation and replacement keep the byte count accurate"""
+    cache = ByteLRUCache(max_bytes=100)
+    cache.put("a", b"a" * 10)
+    cache.put("a", b"a" * 20)
+    assert cache.stats()["bytes"] == 20
+
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
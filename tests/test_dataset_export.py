@@ -0,0 +1,112 @@
+import io
+import os
+
+import numpy as np
+import pytest
+
+from app.cli import main
+from app.core.storage import CompositionStorage
+from app.utils.dataset_export import build_shard, export_dataset, map_shards, process_pool, read_manifest
+from app.utils.midi_generator import MidiGenerator
+
+
+@pytest.fixture
+def records(temp_midi_dir, sample_composition_data, complex_composition_data):
+    generated = [
+        MidiGenerator.generate_midi_file(sample_composition_data),
+        MidiGenerator.generate_midi_file(complex_composition_data)
+    ]
+    # A composition without stored notes, like a merge result
+    with open(generated[0]["file_path"], "rb") as f:
+        generated.append(MidiGenerator.save_midi_bytes("Copy", f.read()))
+    return generated
+
+
+def _since(records):
+    # Creation times are distinct, so the IDs seen at `since` never matter
+    return lambda since, seen=None: [record for record in records if since is None or record["created_at"] > since]
+
+
+def test_build_shard_columns(records):
+    """Test every note becomes one row, from the note store or the MIDI file"""
+    data, stats = build_shard(records + [{"id": "gone", "file_path": "/missing.mid", "created_at": "x"}])
+    assert stats["compositions"] == 3
+    assert stats["notes"] == 4 + 9 + 4
+    assert [skipped["id"] for skipped in stats["skipped"]] == ["gone"]
+
+    shard = np.load(io.BytesIO(data))
+    assert shard["composition_id"].tolist() == [record["id"] for record in records]
+    first = shard["composition"] == 0
+    assert shard["pitch"][first].tolist() == [60, 64, 67, 72]
+    assert shard["start"][first].tolist() == [0.0, 1.0, 2.0, 3.0]
+    # Complex composition: track indexes and programs follow the note store
+    second = shard["composition"] == 1
+    assert sorted(set(zip(shard["track"][second].tolist(), shard["program"][second].tolist()))) == [
+        (0, 0), (1, 32), (2, 0), (3, 48)
+    ]
+    # Decoded notes come back with the times written to the file
+    third = shard["composition"] == 2
+    np.testing.assert_allclose(shard["duration"][third], 1.0, atol=1e-3)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_export_dataset_incremental(records, tmp_path, processes):
+    """Test sharded exports, in and out of process, and appending newer compositions"""
+    output_dir = str(tmp_path / "dataset")
+    manifest = export_dataset(_since(records[:2]), output_dir, shard_size=1, processes=processes)
+    assert [shard["file"] for shard in manifest["shards"]] == ["part-00000.npz", "part-00001.npz"]
+    assert manifest["last_created_at"] == records[1]["created_at"]
+    assert manifest["stats"]["notes"] == 13
+
+    manifest = export_dataset(_since(records), output_dir, shard_size=1, processes=processes, incremental=True)
+    assert [shard["file"] for shard in manifest["shards"]] == ["part-00000.npz", "part-00001.npz", "part-00002.npz"]
+    assert manifest["stats"]["compositions"] == 1
+    assert read_manifest(output_dir) == manifest
+    latest = np.load(os.path.join(output_dir, "part-00002.npz"))
+    assert latest["composition_id"].tolist() == [records[2]["id"]]
+
+
+def test_export_dataset_resumes_within_a_timestamp(records, tmp_path, temp_midi_dir):
+    """Test an incremental export picks up compositions created at the previous export's last created_at"""
+    for record in records:
+        record["created_at"] = "2024-01-01T00:00:00"
+    CompositionStorage._instance = None
+    storage = CompositionStorage(metadata_file=os.path.join(temp_midi_dir, "metadata.json"))
+    storage.add_compositions(records[:2])
+    output_dir = str(tmp_path / "dataset")
+    manifest = export_dataset(storage.iter_compositions, output_dir, shard_size=1, processes=1)
+    assert manifest["last_ids"] == [records[0]["id"], records[1]["id"]]
+
+    storage.add_compositions(records[2:])
+    manifest = export_dataset(storage.iter_compositions, output_dir, shard_size=1, processes=1, incremental=True)
+    assert manifest["stats"]["compositions"] == 1
+    assert manifest["last_ids"] == [record["id"] for record in records]
+    latest = np.load(os.path.join(output_dir, "part-00002.npz"))
+    assert latest["composition_id"].tolist() == [records[2]["id"]]
+    CompositionStorage._instance = None
+
+
+def test_map_shards_bounded_window():
+    """Test arguments are pulled at most two per process ahead of the consumer"""
+    pulled = []
+
+    def arguments():
+        for number in range(100):
+            pulled.append(number)
+            yield (-number,)
+
+    results = map_shards(abs, arguments(), processes=2)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    assert len(pulled) == 6
+    results.close()
+    assert list(map_shards(abs, ((-number,) for number in range(10)), processes=2)) == list(range(10))
+    # Worker processes are started once and shared by later exports
+    assert process_pool(2) is process_pool(2)
+
+
+def test_export_command(records, tmp_path, capsys):
+    """Test the export command reports throughput"""
+    output_dir = str(tmp_path / "dataset")
+    assert main(["export-notes", output_dir, "--processes", "1"]) == 0
+    assert "notes/s" in capsys.readouterr().err
+    assert "last_created_at" in read_manifest(output_dir)
@@ -241,11 +241,11 @@ def test_overlapping_notes(temp_midi_dir):
     assert len(midi.instruments) == 1
     assert len(midi.instruments[0].notes) == 3
     
-    # Check that the notes have the correct durations
+    # Check that the notes have the correct durations; a beat lasts 0.5 seconds at 120 bpm
     notes = sorted(midi.instruments[0].notes, key=lambda n: n.start)
-    assert notes[0].end - notes[0].start == 2.0
-    assert notes[1].end - notes[1].start == 1.0
-    assert notes[2].end - notes[2].start == 1.5
+    assert notes[0].end - notes[0].start == 1.0
+    assert notes[1].end - notes[1].start == 0.5
+    assert notes[2].end - notes[2].start == 0.75
 
 
 def test_extreme_values(temp_midi_dir):
@@ -0,0 +1,84 @@
+import numpy as np
+
+from app.models.composition import HumanizeOptions, QuantizeOptions, RenderWindow
+from app.utils.groove import apply_render_options, humanize, quantize
+from app.utils.note_arrays import pack_composition, track_arrays
+
+
+def make_track(start, duration=None, velocity=None):
+    count = len(start)
+    return track_arrays(
+        "piano", 0, [60] * count, start,
+        duration if duration is not None else [0.5] * count,
+        velocity if velocity is not None else [80] * count
+    )
+
+
+def test_quantize_strength_and_swing():
+    """Test starts move towards (swung) grid positions by the given strength"""
+    track = make_track([0.1, 0.6, 0.9, 1.4])
+
+    assert np.allclose(quantize(track, 0.5).start, [0.0, 0.5, 1.0, 1.5])
+    assert np.allclose(quantize(track, 0.5, strength=0.5).start, [0.05, 0.55, 0.95, 1.45])
+    # Odd grid positions are delayed by swing * grid
+    assert np.allclose(quantize(track, 0.5, swing=0.2).start, [0.0, 0.6, 1.0, 1.6])
+
+
+def test_quantize_durations():
+    """Test durations round to whole grid steps, never below one"""
+    track = make_track([0.0, 1.0, 2.0], duration=[0.1, 0.6, 1.3])
+    assert np.allclose(quantize(track, 0.5, durations=True).duration, [0.5, 0.5, 1.5])
+    assert np.allclose(quantize(track, 0.5).duration, [0.1, 0.6, 1.3])
+
+
+def test_humanize_is_seeded_and_bounded():
+    """Test humanize stays within its ranges and repeats for the same seed"""
+    track = make_track(np.arange(1000) * 0.25, velocity=[0] + [120] * 999)
+
+    first = humanize(track, np.random.default_rng(5), timing=0.02, velocity=10)
+    second = humanize(track, np.random.default_rng(5), timing=0.02, velocity=10)
+    assert np.array_equal(first.start, second.start)
+    assert np.array_equal(first.velocity, second.velocity)
+
+    assert np.all(np.abs(first.start[1:] - track.start[1:]) <= 0.02)
+    assert np.all(first.start >= 0)
+    assert first.velocity[0] == 0
+    assert first.velocity[1:].min() >= 110 and first.velocity.max() <= 127
+
+
+def test_apply_render_options_order(sample_composition_data):
+    """Test quantize and humanize run before the window is cut"""
+    packed = pack_composition(sample_composition_data)
+    result = apply_render_options(
+        packed,
+        window=RenderWindow(start=1, end=3, unit="beat"),
+        quantize_options=QuantizeOptions(grid=1.0, swing=0.5),
+        humanize_options=HumanizeOptions(velocity=5, seed=1)
+    )
+    track = result.sections[0].tracks[0]
+    # Swing moves the notes at beats 1 and 3 to 1.5 and 3.5, pushing the last one out
+    assert list(track.pitch) == [64, 67]
+    assert np.allclose(track.start, [0.5, 1.0])
+    assert np.all(np.abs(track.velocity.astype(int) - 80) <= 5)
+    assert result is not packed
+
+
+def test_quantized_render_lands_on_grid_ticks(sample_composition_data):
+    """Test the grid and timing offsets are in beats in the rendered file too, whatever the tempo"""
+    from app.utils import smf
+    from app.utils.midi_generator import MidiGenerator
+
+    sample_composition_data.tempo = 120
+    for note, start in zip(sample_composition_data.sections[0].tracks[0].notes, [0.1, 0.3, 1.05, 1.2]):
+        note.start_time, note.duration = start, 0.1
+    packed = pack_composition(sample_composition_data)
+
+    quantized = apply_render_options(packed, quantize_options=QuantizeOptions(grid=0.25, swing=0.2))
+    [track] = smf.read_midi(MidiGenerator.encode_midi(quantized)).tracks
+    # Sixteenths are 55 ticks apart and swing delays every second one by 11 ticks
+    assert track.start_ticks.tolist() == [0, 66, 220, 286]
+
+    humanized = apply_render_options(packed, humanize_options=HumanizeOptions(timing=0.05, seed=3))
+    [track] = smf.read_midi(MidiGenerator.encode_midi(humanized)).tracks
+    # Offsets of up to 0.05 beats move notes by at most 11 ticks
+    assert np.all(np.abs(np.sort(track.start_ticks) - [22, 66, 231, 264]) <= 11)
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.models.composition import Chord, CompositionData, ScaleDegreeNote, Section, Track
+from app.utils.harmony import chord_notes, degree_notes, key_pitch_class, parse_chord, scale_steps
+from app.utils.note_arrays import pack_composition
+
+
+def chords(*specs):
+    """Expand (symbol, octave, inversion, voicing) chords one beat apart, returning pitches per chord"""
+    pitch, start, _, _ = chord_notes(*zip(*specs), range(len(specs)), [1.0] * len(specs), [90] * len(specs))
+    return [sorted(pitch[start == index].tolist()) for index in range(len(specs))]
+
+
+def test_parse_chord():
+    """Test roots, qualities and slash bass notes are recognised"""
+    assert chords(("C", 4, 0, "close")) == chords(("Cmaj", 4, 0, "close")) == [[60, 64, 67]]
+    assert parse_chord("F#m7b5")[0] == 6
+    assert parse_chord("Bbmaj7")[0] == 10
+    assert parse_chord("G7/B")[2] == 11
+    for symbol in ("H7", "Cfoo", "C/X", ""):
+        with pytest.raises(ValueError):
+            parse_chord(symbol)
+
+
+def test_chord_voicings_and_inversions():
+    """Test chord tones are stacked, inverted and spread as requested"""
+    assert chords(
+        ("Cmaj7", 4, 0, "close"),
+        ("C", 4, 1, "close"),
+        ("C", 4, 3, "close"),
+        ("Cmaj7", 4, 0, "drop2"),
+        ("Cmaj7", 4, 0, "drop3"),
+        ("Am", 4, 0, "open"),
+        ("G7/B", 3, 0, "close"),
+    ) == [
+        [60, 64, 67, 71],
+        [64, 67, 72],
+        [72, 76, 79],
+        [55, 60, 64, 71],
+        [52, 60, 67, 71],
+        [69, 76, 84],
+        [47, 55, 59, 62, 65],
+    ]
+
+
+def test_chord_notes_drop_out_of_range_tones():
+    """Test tones outside 0-127 are dropped and the other columns follow the kept tones"""
+    pitch, start, duration, velocity = chord_notes(["C13"], [9], [0], ["close"], [2.0], [0.5], [70])
+    assert pitch.tolist() == [120, 124, 127]
+    assert start.tolist() == [2.0] * 3
+    assert (duration.dtype, velocity.dtype) == (np.float64, np.uint8)
+
+
+def test_degree_notes():
+    """Test scale degrees resolve against the key and continue into higher octaves"""
+    pitch, *_ = degree_notes("D", "major", [1, 3, 5, 8, 2], [4] * 5, [0, 0, 0, 0, -1], range(5), [1] * 5, [80] * 5)
+    assert pitch.tolist() == [62, 66, 69, 74, 63]
+    pitch, *_ = degree_notes("A minor", "Harmonic Minor", [7, 6], [3, 3], [0, 0], [0, 1], [1, 1], [80, 80])
+    assert pitch.tolist() == [68, 65]
+    assert key_pitch_class("F#m") == 6
+    assert len(scale_steps("minor-pentatonic")) == 5
+    with pytest.raises(ValueError):
+        scale_steps("klingon")
+
+
+def test_models_validate_harmony():
+    """Test chord symbols are validated, and the key and scale once degrees are used"""
+    with pytest.raises(ValidationError):
+        Chord(symbol="Xm7", start_time=0, duration=1, velocity=80)
+    with pytest.raises(ValidationError):
+        Chord(symbol="C", start_time=0, duration=1, velocity=80, voicing="spread")
+
+    track = Track(instrument="piano", midi_program=0, degrees=[
+        ScaleDegreeNote(degree=1, start_time=0, duration=1, velocity=80)
+    ])
+    section = Section(name="A", bars=1, tracks=[track])
+    fields = dict(title="T", tempo=120, time_signature="4/4", length_bars=1, sections=[section])
+    with pytest.raises(ValidationError):
+        CompositionData(key="C", scale="klingon", **fields)
+    # Without scale degrees the key and scale stay free-form
+    CompositionData(key="whatever", scale="klingon", **dict(fields, sections=[]))
+
+
+def test_pack_composition_expands_harmony():
+    """Test packing appends chord and degree notes after a track's explicit notes"""
+    composition = CompositionData.model_validate({
+        "title": "Shorthand", "tempo": 120, "time_signature": "4/4", "key": "G", "scale": "major", "length_bars": 2,
+        "sections": [{"name": "A", "bars": 2, "tracks": [{
+            "instrument": "piano",
+            "midi_program": 0,
+            "notes": [{"pitch": 43, "start_time": 0, "duration": 4, "velocity": 100}],
+            "chords": [
+                {"symbol": "G", "start_time": 0, "duration": 4, "velocity": 70},
+                {"symbol": "D7/F#", "start_time": 4, "duration": 4, "velocity": 70, "octave": 3}
+            ],
+            "degrees": [{"degree": 7, "start_time": 7, "duration": 1, "velocity": 90}]
+        }]}]
+    })
+    track = pack_composition(composition).sections[0].tracks[0]
+    assert track.pitch.tolist() == [43, 67, 71, 74, 42, 50, 54, 57, 60, 78]
+    assert track.start.tolist() == [0, 0, 0, 0, 4, 4, 4, 4, 4, 7]
+    assert track.velocity.tolist() == [100, 70, 70, 70, 70, 70, 70, 70, 70, 90]
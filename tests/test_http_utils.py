@@ -0,0 +1,45 @@
+import gzip
+
+import pytest
+
+from app.utils.compression import compress_body
+from app.utils.http_cache import RangeNotSatisfiable, etag_matches, parse_range
+
+
+def test_etag_matches():
+    """Test If-None-Match comparison"""
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"x"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_parse_range():
+    """Test parsing single byte ranges"""
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+
+    # Unsupported or malformed ranges fall back to the full body
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=a-b", 100) is None
+
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_compress_body():
+    """Test content negotiation for response compression"""
+    body = b"x" * 1000
+
+    compressed, encoding = compress_body(body, "gzip, deflate", min_size=100)
+    assert encoding == "gzip"
+    assert gzip.decompress(compressed) == body
+
+    assert compress_body(body, "gzip", min_size=10000) == (body, None)
+    assert compress_body(body, "identity", min_size=100) == (body, None)
+    assert compress_body(body, "gzip;q=0", min_size=100) == (body, None)
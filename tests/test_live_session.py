@@ -0,0 +1,91 @@
+import numpy as np
+
+from app.utils.live_session import LiveSession
+from app.utils.midi_generator import MidiGenerator
+from app.utils.note_arrays import PackedComposition, PackedSection, track_arrays
+
+
+def encode_batches(tempo, time_signature, batches):
+    """Encode all batches at once with the regular generator"""
+    tracks = {}
+    for instrument, program, *columns in batches:
+        tracks.setdefault((instrument, program), []).append(columns)
+    section = PackedSection(name="All", bars=1, tracks=[
+        track_arrays(instrument, program, *[np.concatenate(column) for column in zip(*columns)])
+        for (instrument, program), columns in tracks.items()
+    ])
+    return MidiGenerator.encode_midi(
+        PackedComposition("Live", tempo, time_signature, "C", "major", 1, [section])
+    )
+
+
+def test_snapshot_matches_full_encode():
+    """Test incremental snapshots equal encoding every note at once"""
+    rng = np.random.default_rng(7)
+    session = LiveSession("Live", 96, "3/4")
+    batches = []
+    for index in range(40):
+        instrument, program = [("piano", 0), ("bass", 33), ("pad", 89)][index % 3]
+        count = int(rng.integers(1, 20))
+        # Mostly moving forward in time, sometimes filling in earlier bars
+        offset = index * 2 if rng.random() < 0.8 else 0
+        batch = (
+            instrument,
+            program,
+            rng.integers(30, 90, count),
+            offset + np.round(rng.random(count) * 4, 2),
+            np.round(rng.random(count), 2) + 0.05,
+            rng.integers(1, 128, count)
+        )
+        session.add_notes(*batch)
+        batches.append(batch)
+        if index % 4 == 0:
+            assert session.snapshot() == encode_batches(96, "3/4", batches)
+
+    assert session.note_count == sum(len(batch[2]) for batch in batches)
+    assert session.track_count == 3
+    assert session.snapshot() == encode_batches(96, "3/4", batches)
+
+
+def test_snapshot_reuses_unchanged_bytes():
+    """Test snapshots are cached until new notes arrive"""
+    session = LiveSession("Live", 120, "4/4")
+    session.add_notes("piano", 0, [60], [0.0], [1.0], [80])
+    first = session.snapshot()
+    assert session.snapshot() is first
+
+    session.add_notes("piano", 0, [], [], [], [])
+    assert session.snapshot() is first
+
+    session.add_notes("piano", 0, [64], [1.0], [1.0], [80])
+    assert session.snapshot() != first
+    assert session.has_track("piano", 0)
+    assert not session.has_track("piano", 1)
+
+
+def test_appended_notes_extend_the_encoded_buffer():
+    """Test later notes are encoded onto the existing buffer, which snapshots join without re-encoding"""
+    session = LiveSession("Live", 120, "4/4")
+    track = session.add_notes("piano", 0, [60, 64], [0.0, 1.0], [1.0, 1.0], [80, 80])
+    session.snapshot()
+    [_, encoded, _] = track.chunk(0)
+    prefix = bytes(encoded)
+
+    session.add_notes("piano", 0, [67], [2.5], [1.0], [80])
+    notes = ("piano", 0, np.array([60, 64, 67]), np.array([0.0, 1.0, 2.5]), np.ones(3), np.full(3, 80))
+    assert session.snapshot() == encode_batches(120, "4/4", [notes])
+    assert track.chunk(0)[1] is encoded
+    assert bytes(encoded).startswith(prefix) and len(encoded) > len(prefix)
+
+
+def test_snapshot_follows_channel_changes():
+    """Test a track moves to the next channel when an earlier, empty track gets notes"""
+    session = LiveSession("Live", 120, "4/4")
+    session.add_notes("pad", 89, [], [], [], [])
+    piano = ("piano", 0, np.array([60]), np.array([0.0]), np.array([1.0]), np.array([80]))
+    pad = ("pad", 89, np.array([48]), np.array([0.5]), np.array([2.0]), np.array([70]))
+    session.add_notes(*piano)
+    assert session.snapshot() == encode_batches(120, "4/4", [piano])
+
+    session.add_notes(*pad)
+    assert session.snapshot() == encode_batches(120, "4/4", [pad, piano])
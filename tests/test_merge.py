@@ -0,0 +1,98 @@
+import io
+
+import mido
+import numpy as np
+import pytest
+
+from app.utils import smf
+from app.utils.merge import MergeError, merge_midi
+from app.utils.midi_generator import MidiGenerator
+from app.utils.note_arrays import PackedComposition, PackedSection, track_arrays
+
+
+def render(tracks, tempo=120, time_signature="4/4"):
+    """Encode (instrument, program, pitch, start, duration, velocity) tracks"""
+    section = PackedSection("Main", 4, [track_arrays(*track) for track in tracks])
+    return MidiGenerator.encode_midi(PackedComposition("Test", tempo, time_signature, "C", "major", 4, [section]))
+
+
+def random_track(rng, instrument, program, count=40, offset=0.0):
+    return (
+        instrument, program,
+        rng.integers(30, 90, count),
+        np.round(rng.random(count) * 4, 2) + offset,
+        np.round(rng.random(count), 2) + 0.05,
+        rng.integers(1, 128, count)
+    )
+
+
+def test_layer_matches_rendering_all_notes():
+    """Test layering gives the file a single render of every note would"""
+    rng = np.random.default_rng(1)
+    first = [random_track(rng, "piano", 0), random_track(rng, "bass", 33)]
+    second = [random_track(rng, "keys", 0), random_track(rng, "strings", 48)]
+
+    merged = merge_midi([render(first), render(second)], mode="layer")
+
+    combined = [
+        ("piano", 0, *[np.concatenate((a, b)) for a, b in zip(first[0][2:], second[0][2:])]),
+        first[1],
+        second[1],
+    ]
+    assert merged == render(combined)
+
+
+def test_concat_offsets_by_whole_bars():
+    """Test concatenated files start on the bar after the previous one ends"""
+    rng = np.random.default_rng(2)
+    first = render([random_track(rng, "piano", 0)])
+    second = render([random_track(rng, "piano", 0), random_track(rng, "bass", 33)], tempo=90)
+
+    merged = merge_midi([first, second], mode="concat")
+    decoded = smf.read_midi(merged)
+    piano, bass = decoded.tracks
+    assert (piano.program, bass.program) == (0, 33)
+
+    first_piano = smf.read_midi(first).tracks[0]
+    second_tracks = smf.read_midi(second).tracks
+    bar = 4 * smf.RESOLUTION
+    offset = -(-first_piano.end_ticks.max() // bar) * bar
+    expected = np.concatenate((first_piano.start_ticks, second_tracks[0].start_ticks + offset))
+    assert np.array_equal(np.sort(piano.start_ticks), np.sort(expected))
+    assert bass.start_ticks.min() >= offset
+
+    # The tempo changes where the second file starts
+    tempos = [(message.time, message.tempo) for message in mido.MidiFile(file=io.BytesIO(merged)).tracks[0]
+              if message.type == "set_tempo"]
+    assert [tempo for _, tempo in tempos] == [500000, 666666]
+    assert sum(time for time, _ in tempos) == offset
+
+
+def test_parse_note_track_rejects_other_layouts():
+    """Test files in another layout are decoded instead of spliced"""
+    midi = mido.MidiFile(ticks_per_beat=smf.RESOLUTION)
+    conductor, notes = mido.MidiTrack(), mido.MidiTrack()
+    conductor.append(mido.MetaMessage("set_tempo", tempo=500000))
+    notes.append(mido.Message("program_change", program=0, channel=0))
+    notes.append(mido.Message("note_on", note=60, velocity=90, time=0))
+    notes.append(mido.Message("note_off", note=60, velocity=0, time=220))
+    midi.tracks.extend([conductor, notes])
+    buffer = io.BytesIO()
+    midi.save(file=buffer)
+    foreign = buffer.getvalue()
+
+    _, chunks = smf.split_chunks(foreign)
+    assert smf.parse_note_track(chunks[1]) is None
+
+    merged = merge_midi([foreign, render([("piano", 0, [64], [0.0], [0.5], [80])])], mode="layer")
+    piano = smf.read_midi(merged).tracks[0]
+    assert sorted(piano.pitch.tolist()) == [60, 64]
+
+
+def test_layer_rejects_mismatched_tempos():
+    """Test layering requires a shared tempo"""
+    track = ("piano", 0, [60], [0.0], [1.0], [80])
+    with pytest.raises(MergeError):
+        merge_midi([render([track]), render([track], tempo=100)], mode="layer")
+    with pytest.raises(MergeError):
+        merge_midi([b"not midi"])
@@ -0,0 +1,36 @@
+import time
+
+from app.core.metrics import CallbackMetric, Counter, Histogram, Registry
+
+
+def test_render_text_format():
+    """Test metrics are rendered as Prometheus text, one HELP and TYPE per family"""
+    registry = Registry()
+    fast = registry.register(Histogram("stage_seconds", "Stage time", labels={"stage": "a"}, buckets=(0.1, 1.0)))
+    slow = registry.register(Histogram("stage_seconds", "Stage time", labels={"stage": "b"}, buckets=(0.1, 1.0)))
+    total = registry.register(Counter("things_total", "Things"))
+    registry.register(CallbackMetric("size", "Current size", "gauge", lambda: [({"name": 'say "hi"\n'}, 3)]))
+
+    fast.observe(0.05)
+    fast.observe(0.1)
+    slow.observe(0.5)
+    slow.observe(7.25)
+    with fast.time():
+        pass
+    # Measured from an earlier start, e.g. when the request body arrived
+    with slow.time(since=time.perf_counter() - 5):
+        pass
+    total.inc()
+    total.inc(2.5)
+
+    lines = registry.render().splitlines()
+    assert lines.count("# TYPE stage_seconds histogram") == 1
+    assert 'stage_seconds_bucket{stage="a",le="0.1"} 3' in lines
+    assert 'stage_seconds_bucket{stage="b",le="0.1"} 0' in lines
+    assert 'stage_seconds_bucket{stage="b",le="1"} 1' in lines
+    assert 'stage_seconds_bucket{stage="b",le="+Inf"} 3' in lines
+    assert 'stage_seconds_count{stage="b"} 3' in lines
+    assert float(next(line for line in lines if line.startswith('stage_seconds_sum{stage="b"}')).split()[-1]) >= 12.75
+    assert "# TYPE things_total counter" in lines
+    assert "things_total 3.5" in lines
+    assert 'size{name="say \\"hi\\"\\n"} 3' in lines
@@ -73,4 +73,69 @@ def test_generate_midi_file_error_handling(temp_midi_dir, sample_composition_dat
     # Load the MIDI file to confirm it was created correctly
     midi = pretty_midi.PrettyMIDI(result["file_path"])
     # With empty notes, no instruments should be added (our implementation skips empty instruments)
-    assert len(midi.instruments) == 0
\ No newline at end of file
+    assert len(midi.instruments) == 0
+
+def test_generate_midi_file_content_hash(temp_midi_dir, sample_composition_data):
+    """Test that the content hash and size are recorded at generation time"""
+    import hashlib
+
+    result = MidiGenerator.generate_midi_file(sample_composition_data)
+
+    with open(result["file_path"], "rb") as f:
+        content = f.read()
+    assert result["etag"] == hashlib.sha256(content).hexdigest()
+    assert result["size"] == len(content)
+
+
+def test_encode_midi_matches_pretty_midi(complex_composition_data):
+    """Test the vectorized encoder writes the same bytes as pretty_midi"""
+    import io
+
+    from app.utils.note_arrays import pack_composition
+
+    midi = pretty_midi.PrettyMIDI(initial_tempo=complex_composition_data.tempo)
+    instruments = {}
+    for section in complex_composition_data.sections:
+        for track in section.tracks:
+            key = (track.instrument, track.midi_program)
+            if key not in instruments:
+                instruments[key] = pretty_midi.Instrument(program=track.midi_program, name=track.instrument)
+                midi.instruments.append(instruments[key])
+            # pretty_midi takes seconds, notes are in beats
+            seconds_per_beat = 60.0 / complex_composition_data.tempo
+            for note in track.notes:
+                instruments[key].notes.append(pretty_midi.Note(
+                    velocity=note.velocity, pitch=note.pitch,
+                    start=note.start_time * seconds_per_beat,
+                    end=(note.start_time + note.duration) * seconds_per_beat
+                ))
+    # pretty_midi always writes 4/4
+    midi.time_signature_changes.append(pretty_midi.TimeSignature(3, 4, 0))
+    buffer = io.BytesIO()
+    midi.write(buffer)
+
+    progress = []
+    encoded = MidiGenerator.encode_midi(
+        pack_composition(complex_composition_data), progress=lambda p: progress.append(p.as_dict())
+    )
+    assert encoded == buffer.getvalue()
+
+    assert progress[-1]["stage"] == "done"
+    assert progress[-1]["sections_done"] == 2
+    assert progress[-1]["instruments_encoded"] == 3
+    assert progress[-1]["bytes_written"] == len(encoded)
+
+
+@pytest.mark.parametrize("tempo", [60, 120, 90])
+def test_note_times_are_beats(tempo, sample_composition_data):
+    """Test notes land on their beats whatever the tempo, so the last one ends on the last beat"""
+    from app.utils import smf
+    from app.utils.note_arrays import pack_composition
+
+    sample_composition_data.tempo = tempo
+    sample_composition_data.length_bars = 1
+    decoded = smf.read_midi(MidiGenerator.encode_midi(pack_composition(sample_composition_data)))
+    [track] = decoded.tracks
+    assert track.start_ticks.tolist() == [0, 220, 440, 660]
+    assert track.end_ticks.max() == smf.RESOLUTION * 4
+    assert decoded.ticks_to_seconds(track.end_ticks.max()) == pytest.approx(4 * 60 / tempo, abs=1e-3)
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.cli import main
+from app.core.storage import CompositionStorage
+from app.utils.midi_generator import MidiGenerator
+from app.utils.midi_import import composition_id_for, find_midi_files, import_directory, import_file
+from app.utils.note_arrays import pack_composition
+from app.utils.similarity import feature_index
+
+
+@pytest.fixture
+def corpus(tmp_path, sample_composition_data, complex_composition_data):
+    """A directory tree with three MIDI files, a corrupt one and an unrelated file"""
+    root = tmp_path / "corpus"
+    (root / "b").mkdir(parents=True)
+    (root / "a.mid").write_bytes(MidiGenerator.encode_midi(pack_composition(sample_composition_data)))
+    (root / "b" / "c.MIDI").write_bytes(MidiGenerator.encode_midi(pack_composition(complex_composition_data)))
+    (root / "b" / "d.mid").write_bytes(MidiGenerator.encode_midi(pack_composition(sample_composition_data)))
+    (root / "b" / "broken.mid").write_bytes(b"MThd not really")
+    (root / "notes.txt").write_text("not a MIDI file")
+    return str(root)
+
+
+@pytest.fixture
+def storage(temp_midi_dir):
+    CompositionStorage._instance = None
+    yield CompositionStorage(metadata_file=os.path.join(temp_midi_dir, "metadata.json"))
+    CompositionStorage._instance = None
+
+
+def test_find_midi_files(corpus):
+    """Test files are found by extension, in a stable order"""
+    found = [os.path.relpath(path, corpus) for path in find_midi_files(corpus)]
+    assert found == ["a.mid", os.path.join("b", "broken.mid"), os.path.join("b", "c.MIDI"), os.path.join("b", "d.mid")]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_import_directory(corpus, storage, temp_midi_dir, processes):
+    """Test files are described, linked into the library and committed in batches"""
+    batches = []
+    stats = import_directory(
+        corpus, storage, temp_midi_dir, processes=processes, batch_size=2,
+        on_batch=lambda stats: batches.append(stats.imported)
+    )
+    assert (stats.found, stats.imported) == (4, 3)
+    assert [failure["source_path"] for failure in stats.failed] == [os.path.join(corpus, "b", "broken.mid")]
+    assert batches == [2, 3]
+
+    source = os.path.join(corpus, "b", "c.MIDI")
+    record = storage.get_composition(composition_id_for(source))
+    assert record["title"] == "c"
+    assert record["source_path"] == source
+    assert (record["tempo"], record["time_signature"]) == (140, "3/4")
+    assert (record["note_count"], record["track_count"]) == (9, 3)
+    # Four beats at 140 bpm
+    assert record["duration_seconds"] == pytest.approx(4 * 60 / 140, abs=1e-3)
+    assert os.path.samefile(record["file_path"], source)
+    assert "features" not in record
+    assert feature_index(temp_midi_dir).vector(record["id"]) is not None
+
+    # A second run finds everything already imported
+    again = import_directory(corpus, storage, temp_midi_dir, processes=processes)
+    assert (again.already_imported, again.imported) == (3, 0)
+
+
+def test_interrupted_import_resumes(corpus, storage, temp_midi_dir):
+    """Test committed batches survive an interruption and the rest is imported on the next run"""
+    def interrupt(stats):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        import_directory(corpus, storage, temp_midi_dir, link=False, batch_size=1, on_batch=interrupt)
+    assert len(list(storage.iter_compositions())) == 1
+
+    CompositionStorage._instance = None
+    reloaded = CompositionStorage(metadata_file=os.path.join(temp_midi_dir, "metadata.json"))
+    stats = import_directory(corpus, reloaded, temp_midi_dir, link=False)
+    assert (stats.already_imported, stats.imported) == (1, 2)
+    copied = reloaded.get_composition(composition_id_for(os.path.join(corpus, "a.mid")))["file_path"]
+    assert not os.path.samefile(copied, os.path.join(corpus, "a.mid"))
+
+
+def test_import_command(corpus, storage, temp_midi_dir, capsys):
+    """Test the import command reports files per second and fails on unreadable files"""
+    assert main(["import", corpus, "--processes", "1"]) == 1
+    err = capsys.readouterr().err
+    assert "files/s" in err
+    assert "broken.mid" in err
+    assert len(list(storage.iter_compositions())) == 3
+
+
+@pytest.mark.parametrize("tempo", [60, 120, 140])
+def test_imported_features_match_generated(tempo, temp_midi_dir, tmp_path, complex_composition_data):
+    """Test a generated composition and the import of its file get the same feature vector"""
+    complex_composition_data.tempo = tempo
+    generated = MidiGenerator.generate_midi_file(complex_composition_data)
+    imported = import_file(generated["file_path"], str(tmp_path), link=False)
+    similarity = feature_index(temp_midi_dir).vector(generated["id"]) @ np.array(imported["features"])
+    assert similarity == pytest.approx(1.0, abs=1e-5)
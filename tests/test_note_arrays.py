@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.models.composition import RenderWindow
+from app.utils.note_arrays import StartIndex, pack_composition, window_beats
+
+
+def test_start_index_matches_linear_scan():
+    """Test binary-searched window queries find exactly the overlapping notes"""
+    rng = np.random.default_rng(3)
+    start = np.round(rng.random(500) * 100, 1)
+    end = start + np.round(rng.random(500) * 8, 1)
+    index = StartIndex.build(start, end)
+
+    for window_start, window_end in [(0, 5), (10, 10.5), (42.3, 60), (99, 120), (200, 300)]:
+        expected = np.flatnonzero(
+            (start < window_end) & ((end > window_start) | (start >= window_start))
+        )
+        found = index.overlapping(start, end, window_start, window_end)
+        assert np.array_equal(np.sort(found), expected)
+        # Results come back in start order
+        assert np.all(np.diff(start[found]) >= 0)
+
+
+def test_window_clips_and_shifts(complex_composition_data):
+    """Test notes crossing the window edges are clipped and times start at zero"""
+    packed = pack_composition(complex_composition_data)
+    window = packed.window(*window_beats(RenderWindow(start=1.5, end=3.5, unit="beat"), packed.time_signature))
+
+    intro_piano, bass = window.sections[0].tracks
+    assert list(intro_piano.pitch) == [65]
+    assert list(intro_piano.start) == [0.0]
+    assert list(bass.start) == [0.0] and list(bass.duration) == [0.5]
+
+    chorus_piano, strings = window.sections[1].tracks
+    assert list(chorus_piano.start) == [0.5, 1.5]
+    assert list(chorus_piano.duration) == [1.0, 0.5]
+    assert list(strings.start) == [0.5] and list(strings.duration) == [1.5]
+    assert window.note_count == 5
+
+
+def test_window_beats_in_bars():
+    """Test bar windows follow the time signature"""
+    assert window_beats(RenderWindow(start=1, end=2), "3/4") == (3.0, 6.0)
+    assert window_beats(RenderWindow(start=1, end=2), "6/8") == (3.0, 6.0)
+    assert window_beats(RenderWindow(start=1, end=2, unit="beat"), "3/4") == (1.0, 2.0)
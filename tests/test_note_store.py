@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from app.utils.interval_index import IntervalIndex
+from app.utils.note_arrays import pack_composition
+from app.utils.note_store import load_notes, notes_path_for, save_notes
+
+
+@pytest.mark.parametrize("count", [0, 1, 50, 3000])
+def test_interval_index_matches_linear_scan(count):
+    """Test window queries return exactly the overlapping notes, in start order"""
+    rng = np.random.default_rng(count)
+    start = np.sort(np.round(rng.random(count) * 100, 1))
+    end = start + np.round(rng.exponential(2, count), 1)
+    # A few long notes spanning many windows
+    end[::97] += 50
+    index = IntervalIndex.build(start, end)
+
+    for window_start, window_end in [(0, 1), (5, 7), (50, 50.5), (99.9, 200), (-1, 0), (3.3, 3.4)]:
+        expected = np.flatnonzero((start < window_end) & ((end > window_start) | (start >= window_start)))
+        assert np.array_equal(index.overlapping(start, end, window_start, window_end), expected)
+
+
+def test_save_and_load_round_trip(temp_midi_dir, complex_composition_data):
+    """Test stored notes load back with their metadata and a working index"""
+    packed = pack_composition(complex_composition_data)
+    path = save_notes(notes_path_for(f"{temp_midi_dir}/song.mid"), packed)
+    assert path.endswith("song.notes.npz")
+
+    stored = load_notes(path)
+    assert stored.header["title"] == "Complex Test Composition"
+    assert [track.section for track in stored.tracks] == ["Intro", "Intro", "Chorus", "Chorus"]
+
+    restored = stored.to_packed()
+    assert restored.note_count == packed.note_count
+    for original, loaded in zip(packed.sections[0].tracks, restored.sections[0].tracks):
+        assert original.instrument == loaded.instrument
+        assert np.array_equal(original.pitch, loaded.pitch)
+
+    chorus_piano = stored.tracks[2]
+    selected = chorus_piano.window(2.5, 3.5)
+    assert list(chorus_piano.notes.pitch[selected]) == [60, 64]
+    assert len(chorus_piano.window(None, None)) == 2
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from app.utils.note_validation import NoteValidationError, NoteValidator, _overlaps
+
+
+def test_counts_every_error_and_caps_positions():
+    """Test all errors are counted per kind but only the first ones are listed, in position order"""
+    validator = NoteValidator(16.0, max_errors=3, loc=("body", "composition"))
+    start = np.array([0.0, -1.0, 4.0, 15.5, 2.0, 8.0])
+    duration = np.array([1.0, 1.0, 0.0, 1.0, -0.5, 1.0])
+    validator.check(("sections", 0, "tracks", 0, "notes"), start, duration)
+    validator.check(("sections", 0, "tracks", 1, "notes"), np.full(1000, 20.0), np.ones(1000))
+
+    summary = validator.summary()
+    assert summary["counts"] == {"negative_start": 1, "non_positive_duration": 2, "past_end": 1001}
+    assert summary["truncated"]
+    assert [(error["type"], error["loc"][-1]) for error in summary["errors"]] == [
+        ("negative_start", 1), ("non_positive_duration", 2), ("past_end", 3)
+    ]
+    assert summary["errors"][0]["loc"] == ("body", "composition", "sections", 0, "tracks", 0, "notes", 1)
+    assert summary["errors"][2]["input"] == {"start_time": 15.5, "duration": 1.0}
+    with pytest.raises(NoteValidationError) as exc_info:
+        validator.raise_if_invalid()
+    assert exc_info.value.summary is not None
+
+
+def test_non_finite_times():
+    """Test NaN and infinite times are reported once, as strings, and kept out of the other checks"""
+    validator = NoteValidator(16.0, check_overlaps=True)
+    start = np.array([0.0, np.nan, np.inf, 1.0, 0.5])
+    duration = np.array([np.nan, 1.0, 1.0, -np.inf, 1.0])
+    validator.check(("notes",), start, duration, [60, 60, 60, 60, 60])
+    assert validator.counts["non_finite"] == 4
+    assert validator.total == 4
+    assert [error["input"] for error in validator.errors] == [
+        {"start_time": 0.0, "duration": "nan"},
+        {"start_time": "nan", "duration": 1.0},
+        {"start_time": "inf", "duration": 1.0},
+        {"start_time": 1.0, "duration": "-inf"}
+    ]
+
+
+def test_valid_notes_pass():
+    """Test notes ending exactly on the last bar line are accepted"""
+    validator = NoteValidator(4.0, check_overlaps=True)
+    validator.check(("notes",), [0.0, 1.0, 3.0], [1.0, 2.0, 1.0], [60, 60, 60])
+    validator.check(("chords",), [], [])
+    assert validator.summary() is None
+    validator.raise_if_invalid()
+
+
+def test_overlaps_match_pairwise_check():
+    """Test the sorted running-maximum overlap check agrees with comparing every pair"""
+    rng = np.random.default_rng(5)
+    pitch = rng.integers(58, 62, 300)
+    start = np.round(rng.random(300) * 50, 2)
+    end = start + 0.01 + np.round(rng.random(300) * 2, 2)
+
+    expected = np.zeros(300, dtype=bool)
+    order = np.lexsort((start, pitch))
+    for position, note in enumerate(order):
+        earlier = order[:position]
+        expected[note] = np.any((pitch[earlier] == pitch[note]) & (end[earlier] > start[note]))
+    np.testing.assert_array_equal(_overlaps(pitch, start, end), expected)
+
+    # Overlaps are only checked when asked for
+    validator = NoteValidator(100.0)
+    validator.check(("notes",), start, end - start, pitch)
+    assert validator.summary() is None
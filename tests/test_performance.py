@@ -191,4 +191,44 @@ def test_file_size(temp_midi_dir):
     assert size_ratio < note_ratio, "File size scaling worse than expected"
     
     # Even large compositions should produce reasonably sized MIDI files
-    assert large_file_size < 1000, "Large composition produced unexpectedly large MIDI file"
\ No newline at end of file
+    assert large_file_size < 1000, "Large composition produced unexpectedly large MIDI file"
+
+def test_groove_cost_at_one_million_notes():
+    """Benchmark quantize + humanize against encoding for 1M notes"""
+    import numpy as np
+
+    from app.models.composition import HumanizeOptions, QuantizeOptions
+    from app.utils.groove import apply_render_options
+    from app.utils.midi_generator import MidiGenerator
+    from app.utils.note_arrays import PackedComposition, PackedSection, track_arrays
+
+    rng = np.random.default_rng(0)
+    tracks = []
+    for program in range(8):
+        count = 125_000
+        tracks.append(track_arrays(
+            f"track {program}", program,
+            rng.integers(36, 96, count),
+            np.sort(rng.random(count) * 20_000),
+            rng.random(count) + 0.05,
+            rng.integers(40, 120, count)
+        ))
+    packed = PackedComposition("Benchmark", 120, "4/4", "C", "major", 5000, [PackedSection("Main", 5000, tracks)])
+
+    start_time = time.perf_counter()
+    grooved = apply_render_options(
+        packed,
+        quantize_options=QuantizeOptions(grid=0.25, strength=0.8, swing=0.1, durations=True),
+        humanize_options=HumanizeOptions(timing=0.01, velocity=8, seed=1)
+    )
+    groove_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    MidiGenerator.encode_midi(grooved)
+    encode_time = time.perf_counter() - start_time
+
+    print(f"Quantize + humanize for 1M notes: {groove_time:.3f} seconds")
+    print(f"Encoding 1M notes: {encode_time:.3f} seconds")
+
+    # Grooving should be a small fraction of encoding
+    assert groove_time < encode_time * 0.25
@@ -0,0 +1,46 @@
+import numpy as np
+import pretty_midi
+import pytest
+
+from app.utils import smf
+from app.utils.midi_generator import MidiGenerator
+from app.utils.note_store import load_notes
+from app.utils.piano_roll import RollNotes, decoded_roll_notes, piano_roll, stored_roll_notes
+
+
+@pytest.mark.parametrize("fs", [100, 37.5])
+def test_matches_pretty_midi(temp_midi_dir, complex_composition_data, fs):
+    """Test rolls from stored notes and from the file equal pretty_midi's get_piano_roll"""
+    result = MidiGenerator.generate_midi_file(complex_composition_data)
+    expected = pretty_midi.PrettyMIDI(result["file_path"]).get_piano_roll(fs=fs)
+
+    from_store = piano_roll(stored_roll_notes(load_notes(result["notes_path"])), fs)
+    with open(result["file_path"], "rb") as f:
+        from_file = piano_roll(decoded_roll_notes(smf.read_midi(f.read())), fs)
+
+    np.testing.assert_array_equal(from_store, expected)
+    np.testing.assert_array_equal(from_file, expected)
+
+
+def test_overlaps_add_up_and_dtypes_clip():
+    """Test overlapping notes sum their velocities and integer rolls saturate"""
+    notes = RollNotes(
+        pitch=np.array([60, 60, 60], dtype=np.uint8),
+        start=np.array([0.0, 0.0, 0.05]),
+        end=np.array([0.1, 0.1, 0.06]),
+        velocity=np.array([100, 100, 100], dtype=np.uint8)
+    )
+    roll = piano_roll(notes, 100, "int16")
+    assert roll.shape == (128, 10)
+    assert roll[60, 0] == 200
+    assert roll[60, 5] == 300
+    assert piano_roll(notes, 100, "uint8")[60, 5] == 255
+    assert piano_roll(notes, 100, "bool")[60].all()
+    assert not piano_roll(notes, 100, "bool")[61].any()
+
+
+def test_empty_roll():
+    """Test a composition without notes gives zero frames"""
+    empty = np.empty(0)
+    notes = RollNotes(empty.astype(np.uint8), empty, empty, empty.astype(np.uint8))
+    assert piano_roll(notes, 100).shape == (128, 0)
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.utils import similarity
+from app.utils.similarity import DIMENSIONS, FeatureIndex, feature_vector, top_k
+
+
+def _tracks(pitch, start, duration):
+    return [(np.array(pitch), np.array(start, dtype=float), np.array(duration, dtype=float))]
+
+
+def test_feature_vector():
+    """Test vectors are unit length and compare like the music they describe"""
+    melody = feature_vector(_tracks([60, 64, 67, 72], [0, 1, 2, 3], [1, 1, 1, 1]))
+    assert melody.shape == (DIMENSIONS,)
+    assert melody.dtype == np.float32
+    assert np.linalg.norm(melody) == pytest.approx(1.0)
+
+    # Same intervals and rhythm in another key: close, but not identical
+    transposed = feature_vector(_tracks([62, 66, 69, 74], [0, 1, 2, 3], [1, 1, 1, 1]))
+    # Same pitches on off-beat sixteenths
+    syncopated = feature_vector(_tracks([60, 64, 67, 72], [0.25, 1.75, 2.25, 3.75], [0.5, 0.5, 0.5, 0.5]))
+    assert 0.5 < melody @ transposed < 0.99
+    assert melody @ syncopated < 0.99
+    assert not feature_vector([]).any()
+
+
+def test_top_k_matches_brute_force(monkeypatch):
+    """Test the blocked scan returns the exact best rows for several queries at once"""
+    monkeypatch.setattr(similarity, "SCAN_BLOCK", 7)
+    rng = np.random.default_rng(3)
+    matrix = rng.normal(size=(50, DIMENSIONS)).astype(np.float32)
+    queries = rng.normal(size=(3, DIMENSIONS)).astype(np.float32)
+
+    rows, scores = top_k(matrix, queries, 5)
+    expected = np.argsort(-(queries @ matrix.T), axis=1)[:, :5]
+    np.testing.assert_array_equal(rows, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(queries @ matrix.T, expected, axis=1), rtol=1e-6)
+    assert top_k(matrix[:2], queries, 5)[0].shape == (3, 2)
+
+
+def test_feature_index_persistence(tmp_path):
+    """Test vectors are appended, memory-mapped, shadowed by re-adds and survive torn writes"""
+    index = FeatureIndex(str(tmp_path))
+    vectors = np.eye(DIMENSIONS, dtype=np.float32)
+    index.add(["a", "b", "c"], vectors[:3] + vectors[3])
+    index.add(["b"], vectors[5])
+    assert isinstance(index.matrix(), np.memmap)
+    # "b" now points away from "a"; its first row is ignored
+    assert index.similar("a", 2) == [("c", 1.0), ("b", 0.0)]
+    assert index.similar("a", 3, exists=lambda composition_id: composition_id != "c") == [("b", 0.0)]
+    with pytest.raises(KeyError):
+        index.similar("missing", 1)
+
+    # An append torn between the matrix and the ID list is rolled back on load
+    with open(os.path.join(tmp_path, "features.f32"), "ab") as f:
+        f.write(vectors[7].tobytes()[:10])
+    with open(os.path.join(tmp_path, "features.ids"), "a") as f:
+        f.write("d")
+    reloaded = FeatureIndex(str(tmp_path))
+    assert len(reloaded) == 4
+    np.testing.assert_array_equal(reloaded.vector("b"), vectors[5])
+    reloaded.add(["e"], vectors[9])
+    assert FeatureIndex(str(tmp_path)).vector("e").tolist() == vectors[9].tolist()
+
+
+def test_feature_index_shared_between_processes(tmp_path):
+    """Test an index appending after another writer loads that writer's rows first"""
+    server = FeatureIndex(str(tmp_path))
+    importer = FeatureIndex(str(tmp_path))
+    vectors = np.eye(DIMENSIONS, dtype=np.float32)
+    server.add(["a"], vectors[0])
+    importer.add(["b", "c"], vectors[1:3])
+    server.add(["d"], vectors[3])
+    for index in (server, FeatureIndex(str(tmp_path))):
+        assert len(index) == 4
+        for row, composition_id in enumerate("abcd"):
+            np.testing.assert_array_equal(index.vector(composition_id), vectors[row])
+
+
+def test_similar_sees_rows_appended_by_other_processes(tmp_path):
+    """Test a loaded index finds rows another writer appended after it loaded"""
+    server = FeatureIndex(str(tmp_path))
+    importer = FeatureIndex(str(tmp_path))
+    vectors = np.eye(DIMENSIONS, dtype=np.float32)
+    server.add(["a"], vectors[0])
+    importer.add(["b", "c"], vectors[0:2])
+    assert [composition_id for composition_id, _ in server.similar("b", 2)] == ["a", "c"]
@@ -0,0 +1,107 @@
+import io
+
+import numpy as np
+import pretty_midi
+import pytest
+
+from app.utils import smf
+
+
+def _pretty_midi_bytes(tempo, time_signature, instruments):
+    """Write instruments of (name, program, pitch, start, end, velocity) columns with pretty_midi"""
+    midi = pretty_midi.PrettyMIDI(initial_tempo=tempo)
+    # pretty_midi takes seconds, the columns are in beats
+    seconds_per_beat = 60.0 / tempo
+    for name, program, pitch, start, end, velocity in instruments:
+        instrument = pretty_midi.Instrument(program=program, name=name)
+        instrument.notes = [
+            pretty_midi.Note(velocity=int(v), pitch=int(p), start=s * seconds_per_beat, end=e * seconds_per_beat)
+            for p, s, e, v in zip(pitch, start, end, velocity)
+        ]
+        midi.instruments.append(instrument)
+    midi.time_signature_changes.append(pretty_midi.TimeSignature(*time_signature, 0))
+    buffer = io.BytesIO()
+    midi.write(buffer)
+    return buffer.getvalue()
+
+
+def _encode(tempo, time_signature, instruments):
+    chunks = [smf.tempo_track(tempo, time_signature)]
+    for index, (name, program, pitch, start, end, velocity) in enumerate(instruments):
+        chunks.append(smf.note_track(
+            name,
+            program,
+            smf.CHANNELS[index % len(smf.CHANNELS)],
+            pitch,
+            smf.beats_to_ticks(start),
+            smf.beats_to_ticks(end),
+            velocity
+        ))
+    return smf.midi_file(chunks)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_encoder_matches_pretty_midi(seed):
+    """Test random files encode to the same bytes as pretty_midi writes"""
+    rng = np.random.default_rng(seed)
+    tempo = int(rng.integers(30, 300))
+    time_signature = (int(rng.integers(1, 13)), int(2 ** rng.integers(0, 4)))
+    instruments = []
+    # More instruments than channels, so channel assignment wraps around
+    for index in range(int(rng.integers(1, 18))):
+        count = int(rng.integers(0, 200))
+        start = rng.uniform(0, 120, count)
+        # Some notes end together or are shorter than a tick
+        end = start + np.where(rng.random(count) < 0.8, rng.uniform(0.001, 8, count), 1.0)
+        instruments.append((
+            f"Instrument {index}",
+            int(rng.integers(0, 128)),
+            rng.integers(0, 128, count).astype(np.uint8),
+            start,
+            end,
+            rng.integers(1, 128, count).astype(np.uint8)
+        ))
+
+    assert _encode(tempo, time_signature, instruments) == _pretty_midi_bytes(tempo, time_signature, instruments)
+
+
+def test_encode_vlq():
+    """Test variable-length quantities, one at a time and array-wise"""
+    values = np.array([0, 0x40, 0x7F, 0x80, 0x2000, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, 0x0FFFFFFF])
+    expected = [
+        b"\x00", b"\x40", b"\x7f", b"\x81\x00", b"\xc0\x00", b"\xff\x7f",
+        b"\x81\x80\x00", b"\xff\xff\x7f", b"\x81\x80\x80\x00", b"\xff\xff\xff\x7f"
+    ]
+    assert [smf.encode_vlq(int(value)) for value in values] == expected
+
+    lengths = smf.vlq_lengths(values)
+    assert lengths.tolist() == [len(data) for data in expected]
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    buffer = np.zeros(int(lengths.sum()), dtype=np.uint8)
+    smf.write_vlq(buffer, offsets, values, lengths)
+    assert buffer.tobytes() == b"".join(expected)
+
+
+def test_read_midi_round_trip():
+    """Test decoded notes match the encoded ticks"""
+    pitch = np.array([60, 64, 60, 67], dtype=np.uint8)
+    start_ticks = np.array([0, 0, 220, 440], dtype=np.int64)
+    end_ticks = np.array([220, 440, 440, 660], dtype=np.int64)
+    velocity = np.array([100, 90, 80, 70], dtype=np.uint8)
+    data = smf.midi_file([
+        smf.tempo_track(90, (3, 4)),
+        smf.note_track("Piano", 4, 0, pitch, start_ticks, end_ticks, velocity)
+    ])
+
+    decoded = smf.read_midi(data)
+    assert decoded.resolution == smf.RESOLUTION
+    assert decoded.microseconds_per_beat == smf.microseconds_per_beat(90)
+    assert decoded.time_signature == (3, 4)
+    [track] = decoded.tracks
+    assert (track.name, track.program, track.channel) == ("Piano", 4, 0)
+    order = np.lexsort((track.pitch, track.start_ticks))
+    expected = np.lexsort((pitch, start_ticks))
+    assert track.pitch[order].tolist() == pitch[expected].tolist()
+    assert track.start_ticks[order].tolist() == start_ticks[expected].tolist()
+    assert track.end_ticks[order].tolist() == end_ticks[expected].tolist()
+    assert track.velocity[order].tolist() == velocity[expected].tolist()
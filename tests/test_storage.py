@@ -33,14 +33,13 @@ def test_add_composition(temp_midi_dir):
     assert "test-id-1" in storage._compositions
     assert storage._compositions["test-id-1"] == composition_data
     
-    # Verify it was saved to file
-    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
-    assert os.path.exists(metadata_file)
+    # Verify it was saved to the journal
+    with open(metadata_file + ".journal", "r") as f:
+        assert json.loads(f.readline()) == {"added": [composition_data]}
     
-    with open(metadata_file, "r") as f:
-        saved_data = json.load(f)
-        assert "test-id-1" in saved_data
-        assert saved_data["test-id-1"] == composition_data
+    CompositionStorage._instance = None
+    reloaded = CompositionStorage(metadata_file=metadata_file)
+    assert reloaded.get_composition("test-id-1") == composition_data
 
 
 def test_get_composition(temp_midi_dir):
@@ -138,4 +137,188 @@ def test_storage_persistence(temp_midi_dir):
     
     # Verify composition is available in new instance
     result = storage2.get_composition("test-id-persistence")
-    assert result == composition_data
\ No newline at end of file
+    assert result == composition_data
+
+def test_snapshot_reads_are_isolated_from_writes(temp_midi_dir):
+    """Test that readers keep a consistent snapshot while writers publish new versions"""
+    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
+    # Reset the singleton for testing
+    CompositionStorage._instance = None
+    storage = CompositionStorage(metadata_file=metadata_file)
+
+    storage.add_composition({
+        "id": "test-id-old",
+        "title": "Old",
+        "file_path": "/path/to/midi/old.mid",
+        "created_at": "2023-01-01T12:00:00"
+    })
+    version = storage.version
+    snapshot = storage._snapshot
+
+    storage.add_composition({
+        "id": "test-id-new",
+        "title": "New",
+        "file_path": "/path/to/midi/new.mid",
+        "created_at": "2023-01-02T12:00:00"
+    })
+
+    # The earlier snapshot is untouched, the new one is visible to new readers
+    assert storage.version == version + 1
+    assert "test-id-new" not in snapshot.compositions
+    assert len(snapshot.ordered) == 1
+    assert storage.get_composition("test-id-new")["title"] == "New"
+    assert [c["id"] for c in storage.list_compositions()["compositions"]] == ["test-id-new", "test-id-old"]
+
+    # Published mappings are read-only
+    with pytest.raises(TypeError):
+        storage._compositions["test-id-x"] = {}
+
+
+def test_delete_compositions(temp_midi_dir, monkeypatch):
+    """Test deleting compositions records tombstones and removes files"""
+    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
+    # Reset the singleton for testing
+    CompositionStorage._instance = None
+    storage = CompositionStorage(metadata_file=metadata_file)
+
+    for i in range(4):
+        file_path = os.path.join(temp_midi_dir, f"file{i}.mid")
+        Path(file_path).write_bytes(b"MThd")
+        storage.add_composition({
+            "id": f"test-id-{i}",
+            "title": f"Test Composition {i}",
+            "file_path": file_path,
+            "created_at": f"2023-01-0{i+1}T12:00:00"
+        })
+
+    # Select by created_at range
+    selected = storage.select_compositions(created_after="2023-01-02", created_before="2023-01-04")
+    assert [c["id"] for c in selected] == ["test-id-1", "test-id-2"]
+
+    removed = storage.delete_compositions([c["id"] for c in selected] + ["nonexistent-id"])
+    assert [c["id"] for c in removed] == ["test-id-1", "test-id-2"]
+    assert not os.path.exists(os.path.join(temp_midi_dir, "file1.mid"))
+    assert os.path.exists(os.path.join(temp_midi_dir, "file0.mid"))
+    assert storage.list_compositions()["total"] == 2
+
+    assert storage.delete_composition("test-id-3")["id"] == "test-id-3"
+    assert storage.delete_composition("test-id-3") is None
+
+    # Deletions are journaled rather than rewriting the metadata file
+    assert not os.path.exists(metadata_file)
+
+    # A new instance replays the journal
+    CompositionStorage._instance = None
+    reloaded = CompositionStorage(metadata_file=metadata_file)
+    assert list(reloaded._compositions) == ["test-id-0"]
+
+    # Growing the journal past its limit compacts it into the metadata file
+    monkeypatch.setattr(settings, "METADATA_JOURNAL_MAX_ENTRIES", 7)
+    reloaded.add_composition({
+        "id": "test-id-4",
+        "title": "Test Composition 4",
+        "file_path": "/path/to/midi/file4.mid",
+        "created_at": "2023-01-05T12:00:00"
+    })
+    assert os.path.getsize(metadata_file + ".journal") == 0
+    with open(metadata_file, "r") as f:
+        assert set(json.load(f)) == {"test-id-0", "test-id-4"}
+
+
+def test_iter_compositions_since(temp_midi_dir):
+    """Test iterating compositions oldest first from a timestamp"""
+    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
+    # Reset the singleton for testing
+    CompositionStorage._instance = None
+    storage = CompositionStorage(metadata_file=metadata_file)
+
+    for i in range(3):
+        storage.add_composition({
+            "id": f"test-id-{i}",
+            "title": f"Test Composition {i}",
+            "file_path": f"/path/to/midi/file{i}.mid",
+            "created_at": f"2023-01-0{i+1}T12:00:00"
+        })
+
+    assert [c["id"] for c in storage.iter_compositions()] == ["test-id-0", "test-id-1", "test-id-2"]
+    assert [c["id"] for c in storage.iter_compositions(since="2023-01-02T12:00:00")] == ["test-id-2"]
+
+    # Compositions sharing the last created_at are resumed by passing the IDs already seen
+    storage.add_compositions([
+        {"id": f"tied-{i}", "title": "Tied", "file_path": f"/tied{i}.mid", "created_at": "2023-01-04T12:00:00"}
+        for i in range(3)
+    ])
+    resumed = storage.iter_compositions(since="2023-01-04T12:00:00", seen=["tied-0"])
+    assert [c["id"] for c in resumed] == ["tied-1", "tied-2"]
+    resumed = storage.iter_compositions(since="2023-01-02T12:00:00", seen=[])
+    assert [c["id"] for c in resumed][:2] == ["test-id-1", "test-id-2"]
+
+
+def test_add_compositions_batch(temp_midi_dir):
+    """Test adding many compositions with one save keeps creation order and replaces by ID"""
+    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
+    CompositionStorage._instance = None
+    storage = CompositionStorage(metadata_file=metadata_file)
+    storage.add_composition({"id": "a", "title": "A", "file_path": "/a.mid", "created_at": "2023-01-02T00:00:00"})
+    
+    added = storage.add_compositions([
+        {"id": "b", "title": "B", "file_path": "/b.mid", "created_at": "2023-01-03T00:00:00"},
+        {"id": "c", "title": "C", "file_path": "/c.mid", "created_at": "2023-01-01T00:00:00"},
+        {"id": "a", "title": "A2", "file_path": "/a.mid", "created_at": "2023-01-04T00:00:00"}
+    ])
+    assert added == 3
+    assert [c["id"] for c in storage.iter_compositions()] == ["c", "b", "a"]
+    assert storage.get_composition("a")["title"] == "A2"
+    assert [json.loads(f)["id"] for f in storage.list_composition_fragments()[0]] == ["a", "b", "c"]
+    
+    CompositionStorage._instance = None
+    reloaded = CompositionStorage(metadata_file=metadata_file)
+    assert len(reloaded.list_compositions()["compositions"]) == 3
+
+
+def test_writes_from_another_process_are_kept(temp_midi_dir):
+    """Test a store writing after another writer, such as an import, loads that writer's changes first"""
+    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
+    CompositionStorage._instance = None
+    server = CompositionStorage(metadata_file=metadata_file)
+    server.add_composition({"id": "a", "title": "A", "file_path": "/a.mid", "created_at": "2023-01-01T00:00:00"})
+
+    # A second instance stands in for the import command's process
+    CompositionStorage._instance = None
+    importer = CompositionStorage(metadata_file=metadata_file)
+    importer.add_compositions([
+        {"id": "b", "title": "B", "file_path": "/b.mid", "created_at": "2023-01-02T00:00:00"},
+        {"id": "c", "title": "C", "file_path": "/c.mid", "created_at": "2023-01-03T00:00:00"}
+    ])
+
+    server.add_composition({"id": "d", "title": "D", "file_path": "/d.mid", "created_at": "2023-01-04T00:00:00"})
+    assert [c["id"] for c in server.iter_compositions()] == ["a", "b", "c", "d"]
+    server.delete_compositions(["b"], remove_files=False)
+    CompositionStorage._instance = None
+    reloaded = CompositionStorage(metadata_file=metadata_file)
+    assert [c["id"] for c in reloaded.iter_compositions()] == ["a", "c", "d"]
+
+
+def test_reads_see_other_process_writes(temp_midi_dir):
+    """Test a running store picks up another process's writes on its next read"""
+    metadata_file = os.path.join(temp_midi_dir, "metadata.json")
+    CompositionStorage._instance = None
+    server = CompositionStorage(metadata_file=metadata_file)
+    assert server.list_compositions()["total"] == 0
+
+    CompositionStorage._instance = None
+    importer = CompositionStorage(metadata_file=metadata_file)
+    importer.add_compositions([
+        {"id": "a", "title": "A", "file_path": "/a.mid", "created_at": "2023-01-01T00:00:00"},
+        {"id": "b", "title": "B", "file_path": "/b.mid", "created_at": "2023-01-02T00:00:00"}
+    ])
+    assert server.get_composition("a")["title"] == "A"
+    assert [c["id"] for c in server.list_compositions()["compositions"]] == ["b", "a"]
+
+    importer.delete_compositions(["a"], remove_files=False)
+    assert server.get_composition("a") is None
+    assert [c["id"] for c in server.select_compositions()] == ["b"]
+    # Unchanged files are not loaded again
+    snapshot = server._snapshot
+    assert server.get_composition("b") is snapshot.compositions["b"]
+    assert server._snapshot is snapshot
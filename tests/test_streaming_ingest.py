@@ -0,0 +1,211 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from app.core.admission import RequestTooLarge
+from app.models.composition import CompositionRequest
+from app.utils.note_arrays import pack_composition
+from app.utils.note_validation import NoteValidationError
+from app.utils.streaming_ingest import IngestError, _check_note, parse_composition_stream
+
+
+def parse(body, chunk_size=7, **kwargs):
+    """Feed a body to the parser in small chunks"""
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    return asyncio.run(parse_composition_stream(chunks(), **kwargs))
+
+
+def test_parse_matches_packed_model(sample_composition_request):
+    """Test streamed parsing produces the same arrays as packing the validated model"""
+    packed = parse(sample_composition_request)
+    expected = pack_composition(CompositionRequest.model_validate(sample_composition_request).composition)
+
+    assert packed.title == expected.title
+    assert packed.tempo == expected.tempo
+    assert packed.note_count == 4
+    track, expected_track = packed.sections[0].tracks[0], expected.sections[0].tracks[0]
+    assert track.instrument == "piano"
+    for column in ("pitch", "start", "duration", "velocity"):
+        assert np.array_equal(getattr(track, column), getattr(expected_track, column))
+        assert getattr(track, column).dtype == getattr(expected_track, column).dtype
+
+
+def test_parse_runs_off_the_event_loop(sample_composition_request, monkeypatch):
+    """Test notes are checked in a worker thread while the event loop keeps serving other tasks"""
+    import threading
+    from app.utils import streaming_ingest
+
+    threads = set()
+    original = streaming_ingest._check_note
+
+    def recording_check_note(values, loc):
+        threads.add(threading.get_ident())
+        return original(values, loc)
+
+    monkeypatch.setattr(streaming_ingest, "_check_note", recording_check_note)
+    body = json.dumps(sample_composition_request).encode()
+    ticks = []
+
+    async def chunks():
+        for i in range(0, len(body), 7):
+            yield body[i:i + 7]
+
+    async def main():
+        async def ticker():
+            while True:
+                ticks.append(threading.get_ident())
+                await asyncio.sleep(0)
+
+        task = asyncio.ensure_future(ticker())
+        packed = await parse_composition_stream(chunks())
+        task.cancel()
+        return packed
+
+    assert asyncio.run(main()).note_count == 4
+    assert threads and ticks
+    assert not threads & set(ticks)
+
+
+def test_parse_rejects_invalid_note(sample_composition_request):
+    """Test an invalid note is reported with its position"""
+    sample_composition_request["composition"]["sections"][0]["tracks"][0]["notes"][2]["pitch"] = 200
+
+    with pytest.raises(IngestError) as exc_info:
+        parse(sample_composition_request)
+    error = exc_info.value.errors[0]
+    assert error["loc"] == ("body", "composition", "sections", 0, "tracks", 0, "notes", 2, "pitch")
+
+    del sample_composition_request["composition"]["sections"][0]["tracks"][0]["notes"][1]["velocity"]
+    with pytest.raises(IngestError) as exc_info:
+        parse(sample_composition_request)
+    assert exc_info.value.errors[0]["type"] == "missing"
+
+
+def test_check_note_rejects_non_finite_integers():
+    """Test overflowing or NaN pitches and velocities are reported rather than raised from int()"""
+    # The C backend rejects 1e400 while parsing, but other ijson backends yield infinity
+    for pitch, velocity in ((float("inf"), 80), (60, float("nan"))):
+        with pytest.raises(IngestError) as exc_info:
+            _check_note([pitch, 0.0, 1.0, velocity], ("body",))
+        error = exc_info.value.errors[0]
+        assert error["type"] == "finite_number"
+        assert error["input"] in ("inf", "nan")
+
+
+def test_parse_rejects_invalid_headers(sample_composition_request):
+    """Test header fields are validated with the regular models"""
+    body = json.loads(json.dumps(sample_composition_request))
+    body["composition"]["tempo"] = -1
+    with pytest.raises(IngestError) as exc_info:
+        parse(body)
+    assert exc_info.value.errors[0]["loc"] == ("body", "composition", "tempo")
+
+    body = json.loads(json.dumps(sample_composition_request))
+    del body["composition"]["sections"][0]["tracks"][0]["instrument"]
+    with pytest.raises(IngestError) as exc_info:
+        parse(body)
+    assert exc_info.value.errors[0]["loc"] == ("body", "composition", "sections", 0, "tracks", 0, "instrument")
+
+    with pytest.raises(IngestError):
+        parse({"title": "No composition"})
+
+
+def test_parse_rejects_malformed_json():
+    """Test malformed JSON is rejected"""
+    with pytest.raises(IngestError) as exc_info:
+        parse(b'{"composition": {"title": ')
+    assert exc_info.value.errors[0]["type"] == "json_invalid"
+
+
+def test_parse_enforces_note_limit(sample_composition_request):
+    """Test the note limit is enforced while streaming"""
+    with pytest.raises(RequestTooLarge):
+        parse(sample_composition_request, max_notes=3)
+
+
+def test_parse_applies_window(sample_composition_request):
+    """Test a render window in the streamed body is applied"""
+    body = dict(sample_composition_request, window={"start": 1.5, "end": 3, "unit": "beat"})
+    packed = parse(body)
+    track = packed.sections[0].tracks[0]
+    assert list(track.pitch) == [64, 67]
+    assert list(track.start) == [0.0, 0.5]
+    assert list(track.duration) == [0.5, 1.0]
+
+    with pytest.raises(IngestError) as e:
+        parse(dict(sample_composition_request, window={"start": 2, "end": 1}))
+    assert e.value.errors[0]["loc"][:2] == ("body", "window")
+
+
+def test_parse_applies_quantize(sample_composition_request):
+    """Test quantize options in the streamed body are applied"""
+    body = dict(sample_composition_request, quantize={"grid": 2.0})
+    track = parse(body).sections[0].tracks[0]
+    assert list(track.start) == [0.0, 2.0, 2.0, 4.0]
+
+    with pytest.raises(IngestError) as e:
+        parse(dict(sample_composition_request, humanize={"velocity": 500}))
+    assert e.value.errors[0]["loc"] == ("body", "humanize", "velocity")
+
+
+def test_parse_expands_harmony(sample_composition_request):
+    """Test chord events and scale degrees stream into the same arrays as packing the model"""
+    track = sample_composition_request["composition"]["sections"][0]["tracks"][0]
+    track["chords"] = [
+        {"symbol": "Cmaj7", "start_time": 0, "duration": 2, "velocity": 70, "voicing": "drop2"},
+        {"symbol": "Dm7/C", "start_time": 2, "duration": 2, "velocity": 70, "inversion": 1}
+    ]
+    track["degrees"] = [{"degree": 5, "start_time": 3, "duration": 1, "velocity": 90, "accidental": 1}]
+    packed = parse(sample_composition_request)
+    expected = pack_composition(CompositionRequest.model_validate(sample_composition_request).composition)
+    assert packed.note_count == expected.note_count == 4 + 4 + 5 + 1
+    for column in ("pitch", "start", "duration", "velocity"):
+        assert np.array_equal(getattr(packed.sections[0].tracks[0], column), getattr(expected.sections[0].tracks[0], column))
+
+    with pytest.raises(RequestTooLarge):
+        parse(sample_composition_request, max_notes=10)
+    # Chords count against the limit as they arrive, before the rest of the body
+    track["chords"] *= 1000
+    body = json.dumps(sample_composition_request).encode()
+    with pytest.raises(RequestTooLarge):
+        parse(body[:body.index(b'"degrees"')], max_notes=100)
+    track["chords"] = track["chords"][:2]
+
+    track["chords"][1]["symbol"] = "Dzz"
+    with pytest.raises(IngestError) as exc_info:
+        parse(sample_composition_request)
+    assert exc_info.value.errors[0]["loc"] == ("body", "composition", "sections", 0, "tracks", 0, "chords", 1, "symbol")
+
+    del track["chords"]
+    sample_composition_request["composition"]["scale"] = "klingon"
+    with pytest.raises(IngestError) as exc_info:
+        parse(sample_composition_request)
+    assert exc_info.value.errors[0]["loc"] == ("body", "composition", "scale")
+
+
+def test_parse_reports_semantic_errors(sample_composition_request):
+    """Test whole-track semantic checks run once the composition's length is known"""
+    body = json.loads(json.dumps(sample_composition_request))
+    notes = body["composition"]["sections"][0]["tracks"][0]["notes"]
+    notes[1]["duration"] = 0
+    notes[3]["start_time"] = 100
+    with pytest.raises(NoteValidationError) as exc_info:
+        parse(body)
+    summary = exc_info.value.summary
+    assert summary["counts"] == {"non_positive_duration": 1, "past_end": 1}
+    assert summary["errors"][1]["loc"] == ("body", "composition", "sections", 0, "tracks", 0, "notes", 3)
+
+    body = json.loads(json.dumps(sample_composition_request))
+    body["composition"]["sections"][0]["tracks"][0]["notes"][1].update(pitch=60, start_time=0.5)
+    assert parse(body).note_count == 4
+    with pytest.raises(NoteValidationError) as exc_info:
+        parse(body, check_overlaps=True)
+    assert exc_info.value.summary["counts"] == {"overlap": 1}
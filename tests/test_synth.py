@@ -0,0 +1,70 @@
+import io
+import wave
+
+import numpy as np
+
+from app.utils import smf
+from app.utils.synth import RELEASE_SECONDS, PreviewNotes, iter_wav, preview_notes, render_blocks, wav_header
+
+
+def _notes(pitch, start, end, velocity=100, program=0):
+    count = len(pitch)
+    return PreviewNotes(
+        pitch=np.asarray(pitch, dtype=np.uint8),
+        start=np.asarray(start, dtype=np.float64),
+        end=np.asarray(end, dtype=np.float64),
+        velocity=np.full(count, velocity, dtype=np.uint8),
+        program=np.full(count, program, dtype=np.int64)
+    )
+
+
+def test_wav_is_readable_and_sized_to_the_notes():
+    """Test the streamed WAV parses and covers the last note's release"""
+    notes = _notes([60, 64], [0.0, 0.5], [0.5, 1.0])
+    data = b"".join(iter_wav(notes, 8000, block_seconds=0.1))
+
+    with wave.open(io.BytesIO(data)) as wav:
+        assert wav.getnchannels() == 1
+        assert wav.getsampwidth() == 2
+        assert wav.getframerate() == 8000
+        assert wav.getnframes() == int(np.ceil((1.0 + RELEASE_SECONDS) * 8000))
+
+
+def test_render_is_deterministic_and_independent_of_block_size():
+    """Test blocks concatenate to the same audio however the render is split"""
+    notes = _notes([48, 60, 67, 72], [0.0, 0.1, 0.2, 0.9], [1.0, 0.4, 0.8, 1.2], program=40)
+    small = np.concatenate(list(render_blocks(notes, 8000, block_seconds=0.05)))
+    large = np.concatenate(list(render_blocks(notes, 8000, block_seconds=2.0)))
+    np.testing.assert_array_equal(small, large)
+
+
+def test_silence_outside_notes():
+    """Test nothing sounds before a note starts or after its release"""
+    notes = _notes([69], [0.5], [1.0])
+    samples = np.concatenate(list(render_blocks(notes, 8000)))
+    assert not samples[:4000].any()
+    assert np.abs(samples[4100:8000]).max() > 1000
+
+    rest = _notes([69, 69], [0.0, 2.0], [0.5, 2.5])
+    samples = np.concatenate(list(render_blocks(rest, 8000)))
+    gap = slice(int((0.5 + RELEASE_SECONDS) * 8000) + 1, 16000)
+    assert not samples[gap].any()
+
+
+def test_empty_preview():
+    """Test a file without notes gives an empty WAV"""
+    decoded = smf.read_midi(smf.midi_file([smf.tempo_track(120, (4, 4))]))
+    assert b"".join(iter_wav(preview_notes(decoded), 8000)) == wav_header(0, 8000)
+
+
+def test_preview_notes_follow_tempo_changes():
+    """Test note times are read through the file's tempo map"""
+    resolution = smf.RESOLUTION
+    conductor = smf.conductor_track([(0, 500000, (4, 4)), (resolution, 1000000, (4, 4))])
+    track = smf.note_track(
+        "piano", 0, 0, np.array([60, 62], dtype=np.uint8),
+        np.array([0, resolution]), np.array([resolution, 2 * resolution]), np.array([90, 90], dtype=np.uint8)
+    )
+    notes = preview_notes(smf.read_midi(smf.midi_file([conductor, track], resolution)))
+    np.testing.assert_allclose(notes.start, [0.0, 0.5])
+    np.testing.assert_allclose(notes.end, [0.5, 1.5])
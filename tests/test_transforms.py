@@ -0,0 +1,63 @@
+import numpy as np
+
+from app.models.composition import (
+    StretchOperation, TempoOperation, TrackFilterOperation, TransposeOperation, VelocityOperation
+)
+from app.utils.note_arrays import pack_composition
+from app.utils.transforms import apply_transforms
+
+
+def test_transpose_drops_out_of_range_notes(complex_composition_data):
+    """Test transposition shifts pitches and drops notes leaving 0-127"""
+    packed = pack_composition(complex_composition_data)
+    result = apply_transforms(packed, [TransposeOperation(op="transpose", semitones=60)])
+
+    assert list(result.sections[0].tracks[0].pitch) == [113, 117, 120, 125]
+    # 72 + 60 is out of range
+    assert len(result.sections[1].tracks[1]) == 0
+    # The source is left untouched
+    assert list(packed.sections[0].tracks[0].pitch) == [53, 57, 60, 65]
+
+
+def test_velocity_stretch_tempo_and_filter(complex_composition_data):
+    """Test chained operations apply in order"""
+    packed = pack_composition(complex_composition_data)
+    result = apply_transforms(packed, [
+        VelocityOperation(op="velocity", gamma=1.0, scale=0.5, offset=10),
+        StretchOperation(op="stretch", factor=2.0),
+        TempoOperation(op="tempo", tempo=90),
+        TrackFilterOperation(op="filter_tracks", instruments=["bass"], exclude=True),
+    ])
+
+    assert result.tempo == 90
+    assert result.length_bars == 16
+    piano = result.sections[0].tracks[0]
+    assert list(piano.velocity) == [55, 55, 55, 55]
+    assert np.array_equal(piano.start, [0.0, 1.0, 2.0, 3.0])
+    assert np.array_equal(piano.duration, [1.0, 1.0, 1.0, 1.0])
+    assert [track.instrument for track in result.sections[0].tracks] == ["piano"]
+    assert [track.instrument for track in result.sections[1].tracks] == ["piano", "strings"]
+
+
+def test_tempo_keeps_notes_and_bars(complex_composition_data):
+    """Test a tempo change keeps note times and bars, which are in beats, so only the playback speed changes"""
+    packed = pack_composition(complex_composition_data)
+    result = apply_transforms(packed, [TempoOperation(op="tempo", tempo=70)])
+
+    assert (result.tempo, result.length_bars) == (70, packed.length_bars)
+    for section, source in zip(result.sections, packed.sections):
+        assert section.bars == source.bars
+        for track, source_track in zip(section.tracks, source.tracks):
+            assert np.array_equal(track.start, source_track.start)
+            assert np.array_equal(track.duration, source_track.duration)
+
+
+def test_velocity_curve_clips():
+    """Test velocity curves stay within the MIDI range"""
+    from app.utils.note_arrays import track_arrays
+    from app.utils.transforms import velocity_curve
+
+    track = track_arrays("piano", 0, [60, 60, 60], [0, 1, 2], [1, 1, 1], [0, 64, 127])
+    assert list(velocity_curve(track, 2.0, 1.0, 0).velocity) == [0, 32, 127]
+    assert list(velocity_curve(track, 1.0, 2.0, 0).velocity) == [0, 127, 127]
+    assert list(velocity_curve(track, 1.0, 1.0, -100).velocity) == [0, 0, 27]